@@ -1,5 +1,8 @@
+from datetime import timedelta
+from django.conf import settings
 from django.contrib import admin
-from .models import User, PhoneOtp
+from django.utils import timezone
+from .models import User, PhoneOtp, SmsMessage
 
 
 @admin.register(User)
@@ -12,5 +15,28 @@ class UserAdmin(admin.ModelAdmin):
 
 @admin.register(PhoneOtp)
 class PhoneOtpAdmin(admin.ModelAdmin):
-    list_display = ("phone", "otp", "count", "verify")
-    search_fields = ("phone", "otp")
+    list_display = ("phone", "count", "verify", "updated")
+    search_fields = ("phone",)
+
+
+@admin.register(SmsMessage)
+class SmsMessageAdmin(admin.ModelAdmin):
+    list_display = ("phone", "status", "otp", "attempts", "provider", "create", "sent")
+    list_filter = ("status", "otp", "provider")
+    search_fields = ("phone",)
+    readonly_fields = ("phone", "body", "otp", "create", "sent")
+    actions = ("requeue",)
+
+    @admin.action(description="Requeue selected messages")
+    def requeue(self, request, queryset):
+        """
+        Retries unsent messages. A one-time code message gets a fresh OTP_TIMEOUT to be sent in, and is
+        still dropped by the worker if the phone has no live code by then.
+        """
+        now = timezone.now()
+        queryset = queryset.exclude(status=SmsMessage.SENT)
+        queryset.filter(otp=True).update(
+            status=SmsMessage.PENDING, attempts=0, next_attempt=now,
+            expires=now + timedelta(seconds=getattr(settings, "OTP_TIMEOUT", 300))
+        )
+        queryset.filter(otp=False).update(status=SmsMessage.PENDING, attempts=0, next_attempt=now)
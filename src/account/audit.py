@@ -0,0 +1,60 @@
+from django.conf import settings
+from extensions.writebehind import WriteBehind
+
+
+class OtpAuditLog(WriteBehind):
+    """
+    Buffers OTP events per phone in process memory and writes them behind to PhoneOtp, one upsert
+    per flush, so a flood of OTP requests never turns into row locks on the database.
+    Disabled with OTP_AUDIT_LOG = False. A daemon thread flushes every OTP_AUDIT_FLUSH_INTERVAL
+    seconds and the remaining events are flushed on interpreter exit.
+    """
+
+    name = "otp-audit-flush"
+    description = "the OTP audit log"
+    interval_setting = "OTP_AUDIT_FLUSH_INTERVAL"
+
+    def __init__(self):
+        super().__init__()
+        self._pending = {}
+
+    def record(self, phone: str, count: int, verify: bool = None):
+        """
+        Records the requests of the phone in the current window and, if given, whether it verified a code.
+        """
+        if not getattr(settings, "OTP_AUDIT_LOG", True):
+            return
+        with self._lock:
+            entry = self._pending.setdefault(phone, {})
+            entry["count"] = count
+            if verify is not None:
+                entry["verify"] = verify
+        self.start()
+
+    def flush(self) -> int:
+        """
+        Upserts the buffered events. Returns the number of phones written.
+        """
+        from account.models import PhoneOtp
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        existing = dict(PhoneOtp.objects.filter(phone__in=pending).values_list("phone", "verify"))
+        rows = [
+            PhoneOtp(phone=phone, count=entry["count"], verify=entry.get("verify", existing.get(phone, False)))
+            for phone, entry in pending.items()
+        ]
+        try:
+            PhoneOtp.objects.bulk_create(rows, update_conflicts=True, unique_fields=["phone"],
+                                         update_fields=["count", "verify", "updated"])
+        except Exception:
+            with self._lock:
+                for phone, entry in pending.items():
+                    self._pending[phone] = {**entry, **self._pending.get(phone, {})}
+            raise
+        return len(rows)
+
+
+otp_audit_log = OtpAuditLog()
@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from extensions.cache import MISSING, LocalTier
+from extensions.response_cache import Generations
+
+
+class UserCache:
+    """
+    Users resolved from access tokens, in a per process LRU in front of the default shared cache.
+    Entries are keyed by the user id and a per user generation, read from the shared cache on every lookup,
+    so a save bumping the generation reaches every worker with the next request. Generations live as long
+    as the shared entries, so the default cache culls them before its entries without a timeout.
+    """
+
+    prefix = "auth-user"
+    cache_alias = "default"
+
+    def __init__(self):
+        self._local = None
+
+    @property
+    def generations(self) -> Generations:
+        return Generations(self.cache_alias, timeout=getattr(settings, "AUTH_USER_CACHE_SHARED_TIMEOUT", 300))
+
+    @property
+    def local(self) -> LocalTier:
+        if self._local is None:
+            self._local = LocalTier(getattr(settings, "AUTH_USER_CACHE_SIZE", 1000))
+        return self._local
+
+    def get(self, user_id):
+        """
+        Returns (user or None, key to set() the user under once it is loaded).
+        """
+        version = self.generations.get_many([f"user:{user_id}"])[0]
+        key = f"{self.prefix}:{user_id}:{version}"
+        user = self.local.get(key)
+        if user is MISSING:
+            user = caches[self.cache_alias].get(key)
+            if user is not None:
+                self.local.set(key, user, getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 30))
+        return user, key
+
+    def set(self, key: str, user):
+        caches[self.cache_alias].set(key, user, getattr(settings, "AUTH_USER_CACHE_SHARED_TIMEOUT", 300))
+        self.local.set(key, user, getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 30))
+
+    def invalidate(self, user_id):
+        """
+        Bumps the generation of the user once the transaction commits.
+        """
+        transaction.on_commit(lambda: self.generations.bump(f"user:{user_id}"))
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication resolving the user from user_cache, so an authenticated request takes no query
+    for its user while the user is cached.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        user, key = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(key, user)
+            return user
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    target_class = "account.authentication.CachedJWTAuthentication"
@@ -0,0 +1,195 @@
+import logging
+from hashlib import blake2b
+from math import ceil, exp, log
+from threading import Lock
+from time import monotonic, time_ns
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Set of strings in a bit array, answering "definitely absent" or "maybe present".
+    Sized for capacity items at error_rate false positives, with k positions per item derived from one
+    blake2b digest by double hashing.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, ceil(-capacity * log(error_rate) / log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * log(2)))
+        self.bits = bytearray(ceil(self.size / 8))
+        self.count = 0
+
+    def positions(self, item: str):
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, item: str):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & 1 << (position & 7) for position in self.positions(item))
+
+    @property
+    def estimated_error_rate(self) -> float:
+        """
+        The false positive rate expected after count additions, duplicates included.
+        """
+        return (1 - exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class PhoneFilter:
+    """
+    Bloom filter of the phones in account_user, so Login and Register answer "not registered" without a query.
+    Built from a streaming scan on first use, or at worker start, see gunicorn.conf.py, and sized for
+    PHONE_FILTER_CAPACITY phones, or the registered ones if more, at PHONE_FILTER_ERROR_RATE.
+    Saved users are added at once. With PHONE_FILTER_SHARED every addition is also numbered by a
+    generation counter in the shared cache and kept there, so the other workers apply it before their
+    next lookup. Without it a worker only sees the phones saved in its own process.
+    Deleted users stay in the filter, they only cost the query a false positive would, until the next build.
+    """
+
+    prefix = "phone-filter"
+    cache_alias = "default"
+    # Workers further behind than this rebuild rather than fetch every addition.
+    max_delta = 1000
+    # Seconds an addition may stay missing from the cache, between its number and itself being written.
+    missing_grace = 5
+
+    def __init__(self):
+        self._bloom = None
+        self._generation = None
+        self._missing_since = None
+        self._own = set()
+        self._lock = Lock()
+        self.removed = 0
+        self.built = None
+
+    @property
+    def shared(self) -> bool:
+        return getattr(settings, "PHONE_FILTER_SHARED", True)
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def key(self, *parts) -> str:
+        return ":".join((self.prefix, *map(str, parts)))
+
+    def get_generation(self):
+        value = self.cache.get(self.key("generation"))
+        if value is None:
+            # Starts from the clock, so a counter lost with the cache never comes back to an old value.
+            self.cache.add(self.key("generation"), time_ns(), None)
+            value = self.cache.get(self.key("generation"))
+        return value
+
+    def build(self):
+        users = get_user_model().objects
+        generation = self.get_generation() if self.shared else None
+        start = monotonic()
+        bloom = BloomFilter(
+            max(getattr(settings, "PHONE_FILTER_CAPACITY", 1000000), users.count()),
+            getattr(settings, "PHONE_FILTER_ERROR_RATE", 0.001),
+        )
+        for phone in users.values_list("phone", flat=True).iterator(chunk_size=10000):
+            bloom.add(phone)
+        with self._lock:
+            self._bloom, self._generation, self._missing_since = bloom, generation, None
+            self._own.clear()
+            self.removed = 0
+            self.built = monotonic()
+        logger.info("Built the phone filter of %s phones in %.2f seconds, %s KiB.", bloom.count,
+                    monotonic() - start, len(bloom.bits) // 1024)
+
+    def sync(self):
+        """
+        Builds the filter if it was not, or applies the additions of the other workers.
+        """
+        if self._bloom is None:
+            self.build()
+            return
+        if not self.shared:
+            return
+        current = self.get_generation()
+        if current == self._generation:
+            return
+        if self._generation is None or current < self._generation or current - self._generation > self.max_delta:
+            self.build()
+            return
+        numbers = range(self._generation + 1, current + 1)
+        phones = self.cache.get_many([self.key("added", number) for number in numbers])
+        with self._lock:
+            for number in numbers:
+                phone = phones.get(self.key("added", number))
+                if phone is None:
+                    break
+                if number in self._own:
+                    # Added to this filter already.
+                    self._own.discard(number)
+                else:
+                    self._bloom.add(phone)
+                self._generation = number
+            caught_up = self._generation == current
+            if caught_up:
+                self._missing_since = None
+            elif self._missing_since is None:
+                self._missing_since = monotonic()
+        if not caught_up and monotonic() - self._missing_since > self.missing_grace:
+            # Evicted before this worker saw it.
+            self.build()
+
+    def add(self, phone: str):
+        if self._bloom is not None:
+            with self._lock:
+                self._bloom.add(phone)
+        if not self.shared:
+            return
+        try:
+            number = self.cache.incr(self.key("generation"))
+        except ValueError:
+            self.get_generation()
+            number = self.cache.incr(self.key("generation"))
+        if self._bloom is not None:
+            with self._lock:
+                self._own.add(number)
+        self.cache.set(self.key("added", number), phone, getattr(settings, "PHONE_FILTER_SYNC_TIMEOUT", 24 * 60 * 60))
+
+    def might_contain(self, phone: str) -> bool:
+        """
+        False if the phone is definitely not registered.
+        """
+        self.sync()
+        return phone in self._bloom
+
+    async def amight_contain(self, phone: str) -> bool:
+        return await sync_to_async(self.might_contain)(phone)
+
+    def get_stats(self) -> dict:
+        self.sync()
+        bloom = self._bloom
+        return {
+            "phones": bloom.count,
+            "capacity": bloom.capacity,
+            "bits": bloom.size,
+            "hashes": bloom.hashes,
+            "bytes": len(bloom.bits),
+            "error_rate": bloom.error_rate,
+            "estimated_error_rate": round(bloom.estimated_error_rate, 6),
+            "removed_since_build": self.removed,
+            "built_seconds_ago": round(monotonic() - self.built),
+            "shared": self.shared,
+        }
+
+
+phone_filter = PhoneFilter()
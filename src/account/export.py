@@ -0,0 +1,12 @@
+from django.contrib.auth import get_user_model
+from extensions.export import Exporter
+
+user = get_user_model()
+
+
+class UserExporter(Exporter):
+    def get_queryset(self):
+        return user.objects.values(
+            "id", "phone", "first_name", "last_name", "author", "special_user", "is_staff", "is_superuser",
+            "date_joined", "updated", "last_login", "two_step_password"
+        )
@@ -0,0 +1,55 @@
+from statistics import mean, quantiles
+from asgiref.sync import async_to_sync
+from time import perf_counter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+from account.otp import otp_store
+from account.views import VerifyOtp
+
+
+class Command(BaseCommand):
+    help = ("Measures VerifyOtp latency against a growing number of pending challenges in the configured "
+            "otp cache. The cache is cleared before and after every step, nothing is kept in the database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pending", type=int, nargs="+", default=[100, 1000, 10000, 100000],
+                            help="Numbers of pending challenges to measure with.")
+        parser.add_argument("--verifies", type=int, default=200, help="Verify requests per step.")
+
+    def handle(self, *args, **options):
+        view = async_to_sync(VerifyOtp.as_view())
+        cache = otp_store.cache
+        factory = APIRequestFactory()
+        largest = max(options["pending"])
+        max_entries = getattr(cache, "_max_entries", None)
+        if max_entries is not None and max_entries < largest * 3:
+            self.stderr.write(f"The cache keeps at most {max_entries} entries, pending challenges will be culled.")
+        with override_settings(OTP_REQUEST_LIMIT=largest, OTP_AUDIT_LOG=False), transaction.atomic():
+            get_user_model().objects.bulk_create(
+                get_user_model()(phone=f"98900{index:07d}") for index in range(options["verifies"])
+            )
+            for pending in options["pending"]:
+                cache.clear()
+                # Pending challenges of other phones, then the ones verified below.
+                for index in range(options["verifies"], pending):
+                    otp_store.issue(f"98900{index:07d}")
+                requests = []
+                for index in range(options["verifies"]):
+                    phone = f"98900{index:07d}"
+                    code, challenge = otp_store.issue(phone)
+                    requests.append(factory.post("/", {"code": code, "challenge": challenge}))
+                timings = []
+                for request in requests:
+                    start = perf_counter()
+                    response = view(request)
+                    timings.append(perf_counter() - start)
+                    if response.status_code != 200:
+                        raise CommandError(f"Verify failed: {response.data}")
+                p95 = quantiles(timings, n=20)[-1]
+                self.stdout.write(f"{pending:>8} pending: mean {mean(timings) * 1000:7.2f} ms  "
+                                  f"p95 {p95 * 1000:7.2f} ms")
+            cache.clear()
+            transaction.set_rollback(True)
@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from itertools import count
+from json import dumps
+from statistics import quantiles
+from threading import Lock
+from time import perf_counter
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+ENDPOINTS = {
+    "register": "account-api:register",
+    "verify": "account-api:verify-otp",
+}
+
+
+class Command(BaseCommand):
+    help = ("Compares requests per second and latency percentiles of the OTP endpoints across running "
+            "deployments, for example gunicorn config.wsgi against gunicorn config.asgi with uvicorn workers. "
+            "Start the servers with RATELIMIT_ENABLED=False and a high OTP_REQUEST_LIMIT, and run "
+            "run_sms_worker or clear the SMS outbox afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("targets", nargs="+", help="name=url of each deployment, e.g. wsgi=http://127.0.0.1:8000")
+        parser.add_argument("--endpoint", choices=ENDPOINTS, default="register",
+                            help="register issues a code for a new phone, verify checks a wrong code.")
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per deployment.")
+        parser.add_argument("--concurrency", type=int, default=50, help="Connections open at the same time.")
+
+    def handle(self, *args, **options):
+        path = reverse(ENDPOINTS[options["endpoint"]])
+        phones = count()
+        for target in options["targets"]:
+            name, _, url = target.partition("=")
+            if not url:
+                raise CommandError(f"Expected name=url, got {target}.")
+            timings, statuses, seconds = self.run(url, path, options, phones)
+            p50, p95, p99 = (quantiles(timings, n=100)[index] * 1000 for index in (49, 94, 98))
+            errors = sum(status >= 500 for status in statuses)
+            self.stdout.write(f"{name:>8}: {len(timings) / seconds:8.1f} req/s  p50 {p50:7.2f} ms  "
+                              f"p95 {p95:7.2f} ms  p99 {p99:7.2f} ms  {errors} errors")
+
+    def run(self, url, path, options, phones):
+        url = urlsplit(url)
+        timings, statuses, lock = [], [], Lock()
+        per_connection = -(-options["requests"] // options["concurrency"])
+
+        def connection_loop(_):
+            connection = HTTPConnection(url.hostname, url.port or 80, timeout=30)
+            try:
+                for _ in range(per_connection):
+                    with lock:
+                        phone = f"98950{next(phones):07d}"
+                    body = {"phone": phone}
+                    if options["endpoint"] == "verify":
+                        body["code"] = "000000"
+                    start = perf_counter()
+                    connection.request("POST", url.path.rstrip("/") + path, dumps(body),
+                                       {"Content-Type": "application/json"})
+                    response = connection.getresponse()
+                    response.read()
+                    elapsed = perf_counter() - start
+                    with lock:
+                        timings.append(elapsed)
+                        statuses.append(response.status)
+            finally:
+                connection.close()
+
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            list(executor.map(connection_loop, range(options["concurrency"])))
+        return timings, statuses, perf_counter() - start
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from account.bloom import phone_filter
+
+
+class Command(BaseCommand):
+    help = "Builds the Bloom filter of registered phones and prints its size and false positive rates."
+
+    def handle(self, *args, **options):
+        for name, value in phone_filter.get_stats().items():
+            self.stdout.write(f"{name}: {value}")
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from account.outbox import SmsOutbox
+
+
+class Command(BaseCommand):
+    help = ("Sends the queued text messages through SMS_PROVIDER in batches. Run several workers to send "
+            "faster, each claims its own batches.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit once the outbox has no due messages.")
+        parser.add_argument("--interval", type=float, default=getattr(settings, "SMS_POLL_INTERVAL", 1),
+                            help="Seconds to wait before polling an empty outbox again.")
+
+    def handle(self, *args, **options):
+        outbox = SmsOutbox()
+        self.stdout.write(f"Sending text messages through {outbox.provider.name}.")
+        try:
+            outbox.run(interval=options["interval"], once=options["once"])
+        except KeyboardInterrupt:
+            pass
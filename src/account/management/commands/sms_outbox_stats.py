@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from account.outbox import SmsOutbox
+
+
+class Command(BaseCommand):
+    help = "Prints the depth of the SMS outbox, its dead letters and the send and delivery latencies."
+
+    def handle(self, *args, **options):
+        for name, value in SmsOutbox.get_metrics().items():
+            self.stdout.write(f"{name}: {value}")
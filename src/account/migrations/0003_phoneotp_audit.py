@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_user_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='phoneotp',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='updated'),
+        ),
+        migrations.AlterField(
+            model_name='phoneotp',
+            name='count',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Number of otp sent in the current window'),
+        ),
+        migrations.AlterField(
+            model_name='phoneotp',
+            name='otp',
+            field=models.CharField(blank=True, default='', help_text='No longer written, codes live in the cache only', max_length=6),
+        ),
+    ]
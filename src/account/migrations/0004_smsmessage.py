@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:48
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0003_phoneotp_audit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SmsMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=12, verbose_name='phone')),
+                ('body', models.TextField(verbose_name='body')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('sent', 'sent'), ('dead', 'dead')], default='pending', max_length=7, verbose_name='status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now, help_text='A worker sending the message pushes this forward by its lease', verbose_name='next attempt')),
+                ('expires', models.DateTimeField(blank=True, help_text='Messages still unsent by then are dead-lettered', null=True, verbose_name='expires')),
+                ('provider', models.CharField(blank=True, max_length=100, verbose_name='provider')),
+                ('last_error', models.TextField(blank=True, verbose_name='last error')),
+                ('create', models.DateTimeField(auto_now_add=True, verbose_name='create')),
+                ('sent', models.DateTimeField(blank=True, null=True, verbose_name='sent')),
+            ],
+            options={
+                'verbose_name': 'SMS message',
+                'verbose_name_plural': 'SMS messages',
+                'indexes': [models.Index(fields=['status', 'next_attempt'], name='sms_outbox_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+FIELDS = ("phone", "first_name", "last_name")
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for field in FIELDS:
+        # istartswith compiles to UPPER(field::text) LIKE on PostgreSQL and to a case-insensitive LIKE on SQLite.
+        if vendor == "postgresql":
+            schema_editor.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS account_user_{field}_prefix "
+                f"ON account_user (UPPER({field}::text) text_pattern_ops)"
+            )
+        elif vendor == "sqlite":
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS account_user_{field}_prefix ON account_user ({field} COLLATE NOCASE)"
+            )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor in ("postgresql", "sqlite"):
+        for field in FIELDS:
+            schema_editor.execute(f"DROP INDEX IF EXISTS account_user_{field}_prefix")
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY keeps the table writable, it cannot run in a transaction.
+    atomic = False
+
+    dependencies = [
+        ('account', '0004_smsmessage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
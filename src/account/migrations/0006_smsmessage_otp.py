@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+def redact_codes(apps, schema_editor):
+    # Messages queued before the body became a template carry the code itself.
+    SmsMessage = apps.get_model("account", "SmsMessage")
+    SmsMessage.objects.filter(body__startswith="your otp code :: ").update(body="your otp code :: {code}", otp=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0005_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='smsmessage',
+            name='otp',
+            field=models.BooleanField(default=False, help_text='The body is a template rendered with the live code of the phone when sent, the code itself is never stored', verbose_name='one-time code'),
+        ),
+        migrations.RunPython(redact_codes, migrations.RunPython.noop),
+    ]
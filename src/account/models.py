@@ -85,6 +85,10 @@ class User(AbstractBaseUser, PermissionsMixin):
         default=timezone.now,
         verbose_name=_("date joined")
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_("updated")
+    )
     two_step_password = models.BooleanField(
         default=False,
         verbose_name=_("two step password"),
@@ -117,7 +121,7 @@ class User(AbstractBaseUser, PermissionsMixin):
 
 class PhoneOtp(models.Model):
     """
-    Model to store OTP for phone verification.
+    Audit log of OTP requests per phone, written behind by account.audit.otp_audit_log.
     """
     phone = models.CharField(
         max_length=12,
@@ -125,15 +129,95 @@ class PhoneOtp(models.Model):
         unique=True,
         verbose_name=_("phone")
     )
-    otp = models.CharField(max_length=6)
+    otp = models.CharField(
+        max_length=6,
+        blank=True,
+        default="",
+        help_text=_("No longer written, codes live in the cache only")
+    )
     count = models.PositiveSmallIntegerField(
         default=0,
-        help_text=_("Number of otp sent")
+        help_text=_("Number of otp sent in the current window")
     )
     verify = models.BooleanField(
         default=False,
         verbose_name=_("is verify")
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_("updated")
+    )
+
+    def __str__(self) -> str:
+        return self.phone
+
+
+class SmsMessage(models.Model):
+    """
+    Outbox of text messages, drained in batches by the run_sms_worker command.
+    """
+    PENDING, SENT, DEAD = "pending", "sent", "dead"
+    STATUS_CHOICES = [(PENDING, _("pending")), (SENT, _("sent")), (DEAD, _("dead"))]
+
+    phone = models.CharField(
+        max_length=12,
+        verbose_name=_("phone")
+    )
+    body = models.TextField(
+        verbose_name=_("body")
+    )
+    otp = models.BooleanField(
+        default=False,
+        verbose_name=_("one-time code"),
+        help_text=_("The body is a template rendered with the live code of the phone when sent, "
+                    "the code itself is never stored")
+    )
+    status = models.CharField(
+        max_length=7,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name=_("status")
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_("attempts")
+    )
+    next_attempt = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("next attempt"),
+        help_text=_("A worker sending the message pushes this forward by its lease")
+    )
+    expires = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("expires"),
+        help_text=_("Messages still unsent by then are dead-lettered")
+    )
+    provider = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name=_("provider")
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name=_("last error")
+    )
+    create = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("create")
+    )
+    sent = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("sent")
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt"], name="sms_outbox_due_idx"),
+        ]
+        verbose_name = _("SMS message")
+        verbose_name_plural = _("SMS messages")
 
     def __str__(self) -> str:
         return self.phone
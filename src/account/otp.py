@@ -0,0 +1,146 @@
+from secrets import token_urlsafe
+from asgiref.sync import sync_to_async
+from time import time
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+from extensions.code_generator import otp_generator
+
+
+class OtpStore:
+    """
+    Keeps one-time codes in the shared cache, so requesting and verifying a code never touches the database.
+    A pending challenge is keyed by the phone and can also be found from its opaque id, so verifying
+    is a single key lookup however many challenges are pending.
+    Every write is a single atomic cache operation: add() for the challenge, so concurrent requests
+    for a phone agree on one code, and incr() for the request and attempt counters. Requests are limited
+    to OTP_REQUEST_LIMIT per sliding OTP_REQUEST_WINDOW seconds, estimated from the counters of the
+    current and the previous fixed window.
+    """
+
+    prefix = "otp"
+    cache_alias = "otp"
+
+    VERIFIED = "verified"
+    INCORRECT = "incorrect"
+    EXPIRED = "expired"
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @property
+    def timeout(self) -> int:
+        return getattr(settings, "OTP_TIMEOUT", 300)
+
+    @property
+    def limit(self) -> int:
+        return getattr(settings, "OTP_REQUEST_LIMIT", 3)
+
+    @property
+    def window(self) -> int:
+        return getattr(settings, "OTP_REQUEST_WINDOW", 60 * 60)
+
+    @property
+    def max_attempts(self) -> int:
+        return getattr(settings, "OTP_VERIFY_ATTEMPTS", 5)
+
+    def key(self, *parts) -> str:
+        return ":".join((self.prefix, *map(str, parts)))
+
+    def incr(self, key: str, timeout: int) -> int:
+        self.cache.add(key, 0, timeout)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Expired between add and incr.
+            self.cache.add(key, 1, timeout)
+            return 1
+
+    def count_requests(self, phone: str, increment: bool = False) -> float:
+        """
+        Returns the requests of the phone in the sliding window, counting one more first if increment is set.
+        """
+        current, elapsed = divmod(time(), self.window)
+        key = self.key("requests", phone, int(current))
+        count = self.incr(key, self.window * 2) if increment else self.cache.get(key, 0)
+        previous = self.cache.get(self.key("requests", phone, int(current) - 1), 0)
+        return count + previous * (1 - elapsed / self.window)
+
+    def issue(self, phone: str):
+        """
+        Returns (code, challenge id) to send to the phone, the live ones if there are, or None if the
+        phone requested too many codes. The challenge id resolves to the phone with one cache lookup.
+        """
+        if self.count_requests(phone, increment=True) > self.limit:
+            return None
+        while True:
+            challenge = {"code": otp_generator(), "id": token_urlsafe(16)}
+            if self.cache.add(self.key("phone", phone), challenge, self.timeout):
+                self.cache.set(self.key("challenge", challenge["id"]), phone, self.timeout)
+                self.cache.delete(self.key("attempts", phone))
+                return challenge["code"], challenge["id"]
+            live = self.cache.get(self.key("phone", phone))
+            if live is not None:
+                return live["code"], live["id"]
+
+    def get_codes(self, phones) -> dict:
+        """
+        Returns {phone: live code} for those of the phones with one, for the SMS workers to render messages with.
+        """
+        keys = {self.key("phone", phone): phone for phone in phones}
+        return {keys[key]: challenge["code"] for key, challenge in self.cache.get_many(keys).items()}
+
+    def get_phone(self, challenge_id: str):
+        """
+        Returns the phone of a pending challenge, or None if it expired.
+        """
+        return self.cache.get(self.key("challenge", challenge_id))
+
+    def check(self, phone: str, code: str) -> str:
+        """
+        Compares the code in constant time. After OTP_VERIFY_ATTEMPTS wrong codes the live code is dropped.
+        """
+        live = self.cache.get(self.key("phone", phone))
+        if live is None:
+            return self.EXPIRED
+        if constant_time_compare(live["code"], code):
+            return self.VERIFIED
+        if self.incr(self.key("attempts", phone), self.timeout) >= self.max_attempts:
+            self.discard(phone, live)
+        return self.INCORRECT
+
+    def consume(self, phone: str, code: str) -> bool:
+        """
+        Drops the code once it has been used. Returns False if another request used it first.
+        """
+        live = self.cache.get(self.key("phone", phone))
+        if live is None or not constant_time_compare(live["code"], code):
+            return False
+        return self.discard(phone, live)
+
+    def discard(self, phone: str, challenge: dict) -> bool:
+        self.cache.delete(self.key("challenge", challenge["id"]))
+        self.cache.delete(self.key("attempts", phone))
+        return self.cache.delete(self.key("phone", phone))
+
+    # Each async variant runs its cache operations in a single hop to a thread, as the async methods of
+    # Django's cache backends would run every operation in one of its own.
+
+    async def acount_requests(self, phone: str, increment: bool = False) -> float:
+        return await sync_to_async(self.count_requests)(phone, increment)
+
+    async def aissue(self, phone: str):
+        return await sync_to_async(self.issue)(phone)
+
+    async def aget_phone(self, challenge_id: str):
+        return await sync_to_async(self.get_phone)(challenge_id)
+
+    async def acheck(self, phone: str, code: str) -> str:
+        return await sync_to_async(self.check)(phone, code)
+
+    async def aconsume(self, phone: str, code: str) -> bool:
+        return await sync_to_async(self.consume)(phone, code)
+
+
+otp_store = OtpStore()
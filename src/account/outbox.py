@@ -0,0 +1,186 @@
+import logging
+from datetime import timedelta
+from random import uniform
+from time import perf_counter, sleep
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction, close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from account.otp import otp_store
+from account.sms import SmsError, get_sms_provider
+
+logger = logging.getLogger(__name__)
+
+
+class SmsOutbox:
+    """
+    Queue of text messages in the SmsMessage table. Requests only insert a row, worker processes
+    running run_sms_worker claim due messages in batches and send them through the SMS_PROVIDER.
+    A claimed message gets a lease: its next_attempt moves SMS_LEASE seconds ahead, so the
+    messages of a worker that died are claimed again once the lease runs out. Failed messages are
+    retried with exponential backoff and jitter and dead-lettered after SMS_MAX_ATTEMPTS attempts,
+    on a permanent error or once they expire.
+    The body of an otp message is rendered with the live code of the phone right before it is sent,
+    so no code is written to the table. Sent and dead messages are deleted SMS_RETENTION seconds
+    after they were queued.
+    """
+
+    metrics_prefix = "sms-metrics"
+    # Seconds between purges of old messages by a running worker.
+    purge_interval = 60
+
+    def __init__(self, provider=None):
+        self.provider = provider or get_sms_provider()
+        self.purged = None
+
+    @staticmethod
+    def enqueue(phone: str, body: str, expires_in: int = None, otp: bool = False):
+        from account.models import SmsMessage
+
+        expires = timezone.now() + timedelta(seconds=expires_in) if expires_in else None
+        return SmsMessage.objects.create(phone=phone, body=body, otp=otp, expires=expires)
+
+    @staticmethod
+    async def aenqueue(phone: str, body: str, expires_in: int = None, otp: bool = False):
+        from account.models import SmsMessage
+
+        expires = timezone.now() + timedelta(seconds=expires_in) if expires_in else None
+        return await SmsMessage.objects.acreate(phone=phone, body=body, otp=otp, expires=expires)
+
+    def claim(self, batch_size: int) -> list:
+        """
+        Leases up to batch_size due messages. Rows locked by another worker are skipped where the
+        database supports it.
+        """
+        from account.models import SmsMessage
+
+        now = timezone.now()
+        lease = timedelta(seconds=getattr(settings, "SMS_LEASE", 60))
+        with transaction.atomic():
+            messages = list(
+                SmsMessage.objects.select_for_update(skip_locked=True)
+                .filter(status=SmsMessage.PENDING, next_attempt__lte=now)
+                .order_by("next_attempt")[:batch_size]
+            )
+            for message in messages:
+                message.attempts += 1
+                message.next_attempt = now + lease
+            SmsMessage.objects.bulk_update(messages, ["attempts", "next_attempt"])
+        return messages
+
+    def get_backoff(self, attempts: int) -> float:
+        base = getattr(settings, "SMS_RETRY_BACKOFF", 2)
+        delay = min(base ** attempts, getattr(settings, "SMS_RETRY_MAX_DELAY", 300))
+        return uniform(delay / 2, delay)
+
+    def process_batch(self, batch_size: int = None) -> int:
+        """
+        Sends one batch of due messages. Returns the number of messages claimed.
+        """
+        from account.models import SmsMessage
+
+        messages = self.claim(batch_size or getattr(settings, "SMS_BATCH_SIZE", 100))
+        if not messages:
+            return 0
+        now = timezone.now()
+        codes = otp_store.get_codes({message.phone for message in messages if message.otp})
+        live, bodies = [], []
+        for message in messages:
+            if message.expires and message.expires <= now:
+                message.status, message.last_error = SmsMessage.DEAD, "Expired before it could be sent."
+            elif message.otp and message.phone not in codes:
+                message.status, message.last_error = SmsMessage.DEAD, "The code expired or was used before it was sent."
+            else:
+                live.append(message)
+                bodies.append(message.body.format(code=codes[message.phone]) if message.otp else message.body)
+        start = perf_counter()
+        errors = self.provider.send_many([(message.phone, body) for message, body in zip(live, bodies)]) if live else []
+        self.record_latency(perf_counter() - start, len(live))
+        now = timezone.now()
+        max_attempts = getattr(settings, "SMS_MAX_ATTEMPTS", 5)
+        for message, error in zip(live, errors):
+            message.provider = self.provider.name
+            if error is None:
+                message.status, message.sent, message.last_error = SmsMessage.SENT, now, ""
+            elif isinstance(error, SmsError) and error.permanent or message.attempts >= max_attempts:
+                message.status, message.last_error = SmsMessage.DEAD, repr(error)
+            else:
+                message.next_attempt = now + timedelta(seconds=self.get_backoff(message.attempts))
+                message.last_error = repr(error)
+        SmsMessage.objects.bulk_update(messages, ["status", "sent", "next_attempt", "provider", "last_error"])
+        dead = sum(message.status == SmsMessage.DEAD for message in messages)
+        if dead:
+            logger.warning("Dead-lettered %s text messages.", dead)
+        return len(messages)
+
+    def run(self, interval: float = 1, once: bool = False):
+        """
+        Drains the queue batch after batch, sleeping interval seconds whenever it is empty.
+        """
+        while True:
+            close_old_connections()
+            try:
+                if self.purged is None or perf_counter() - self.purged >= self.purge_interval:
+                    self.purge()
+                    self.purged = perf_counter()
+                claimed = self.process_batch()
+            except Exception:
+                logger.exception("Sending text messages failed.")
+                claimed = 0
+            if once and not claimed:
+                return
+            if not claimed:
+                sleep(interval)
+
+    @staticmethod
+    def purge() -> int:
+        """
+        Deletes the sent and dead messages queued more than SMS_RETENTION seconds ago. Returns how many.
+        """
+        from account.models import SmsMessage
+
+        cutoff = timezone.now() - timedelta(seconds=getattr(settings, "SMS_RETENTION", 7 * 24 * 60 * 60))
+        deleted, _ = SmsMessage.objects.filter(status__in=[SmsMessage.SENT, SmsMessage.DEAD], create__lt=cutoff).delete()
+        return deleted
+
+    def record_latency(self, seconds: float, count: int):
+        if not count:
+            return
+        for name, value in (("batches", 1), ("messages", count), ("microseconds", int(seconds * 1_000_000))):
+            key = f"{self.metrics_prefix}:{name}"
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                cache.set(key, value, None)
+
+    @classmethod
+    def get_metrics(cls) -> dict:
+        """
+        Returns the queue depth, the dead letters, the mean provider latency per message and the
+        mean delivery latency, from enqueue to sent, over the last hour.
+        """
+        from django.db.models import Avg, Count, ExpressionWrapper, F, DurationField
+        from account.models import SmsMessage
+
+        now = timezone.now()
+        counts = SmsMessage.objects.aggregate(
+            pending=Count("id", filter=Q(status=SmsMessage.PENDING)),
+            due=Count("id", filter=Q(status=SmsMessage.PENDING, next_attempt__lte=now)),
+            dead=Count("id", filter=Q(status=SmsMessage.DEAD)),
+        )
+        delivery = SmsMessage.objects.filter(status=SmsMessage.SENT, sent__gte=now - timedelta(hours=1)).aggregate(
+            count=Count("id"),
+            latency=Avg(ExpressionWrapper(F("sent") - F("create"), output_field=DurationField())),
+        )
+        values = cache.get_many([f"{cls.metrics_prefix}:{name}" for name in ("batches", "messages", "microseconds")])
+        messages = values.get(f"{cls.metrics_prefix}:messages", 0)
+        microseconds = values.get(f"{cls.metrics_prefix}:microseconds", 0)
+        return {
+            **counts,
+            "sent_last_hour": delivery["count"],
+            "delivery_latency": delivery["latency"].total_seconds() if delivery["latency"] else None,
+            "batches": values.get(f"{cls.metrics_prefix}:batches", 0),
+            "send_latency": microseconds / messages / 1_000_000 if messages else None,
+        }
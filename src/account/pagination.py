@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class UsersCursorPagination(CursorPagination):
+    """
+    Keyset pagination over id, newest first. Every page is an index range scan on the primary key,
+    however deep it is, and no count is taken.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    ordering = "-id"
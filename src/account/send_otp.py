@@ -1,4 +1,16 @@
-def send_otp(*, phone: str, otp: str):
-    print(f"your phone: {phone}")
-    print(f"your otp code :: {otp} ")
-    # Here the otp code must later be sent to the user's phone number by SMS system.
\ No newline at end of file
+from django.conf import settings
+from account.outbox import SmsOutbox
+
+OTP_MESSAGE = "your otp code :: {code}"
+
+
+def send_otp(*, phone: str):
+    """
+    Queues the code for the SMS workers, see run_sms_worker. Only the template is stored, the worker renders
+    it with the live code of the phone, and drops the message once the code expired or was used.
+    """
+    return SmsOutbox.enqueue(phone, OTP_MESSAGE, expires_in=getattr(settings, "OTP_TIMEOUT", 300), otp=True)
+
+
+async def asend_otp(*, phone: str):
+    return await SmsOutbox.aenqueue(phone, OTP_MESSAGE, expires_in=getattr(settings, "OTP_TIMEOUT", 300), otp=True)
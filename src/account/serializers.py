@@ -11,7 +11,8 @@ class UsersListSerializer(serializers.ModelSerializer):
 class UserDetailUpdateDeleteSerializer(serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
-        exclude = ["password"]
+        fields = ["id", "phone", "first_name", "last_name", "author", "special_user", "is_staff", "is_superuser",
+                  "two_step_password", "date_joined", "last_login"]
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -34,8 +35,15 @@ class AuthenticationSerializer(serializers.Serializer):
 
 class OtpSerializer(serializers.Serializer):
     code = serializers.CharField(max_length=6, min_length=6)
+    phone = serializers.CharField(max_length=12, min_length=12, required=False)
+    challenge = serializers.CharField(max_length=32, required=False, help_text="Returned by login and register")
     password = serializers.CharField(max_length=20, required=False)
 
+    def validate(self, data):
+        if not data.get("phone") and not data.get("challenge"):
+            raise serializers.ValidationError({"Error": "Send the phone or the challenge of the code."})
+        return data
+
     def validate_code(self, value):
         from string import ascii_letters as char
         for _ in value:
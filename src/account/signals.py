@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from account.authentication import user_cache
+from account.bloom import phone_filter
+from extensions.tracking import changed, track_changes
+
+user = get_user_model()
+
+
+@receiver(post_save, sender=user)
+@receiver(post_delete, sender=user)
+def invalidate_cached_user(sender, instance, *args, **kwargs):
+    """
+    Drops the cached user on every save and delete, so changes to is_superuser, author, special_user or
+    two_step_password apply to the next request. QuerySet.update() bypasses this, call user_cache.invalidate().
+    """
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(m2m_changed, sender=user.groups.through)
+@receiver(m2m_changed, sender=user.user_permissions.through)
+def invalidate_cached_user_permissions(sender, instance, action, reverse, pk_set, *args, **kwargs):
+    """
+    Drops the cached users whose groups or permissions changed, on either side of the relation.
+    """
+    if action in ("post_add", "post_remove"):
+        pks = pk_set if reverse else [instance.pk]
+    elif action == "pre_clear":
+        pks = instance.user_set.values_list("pk", flat=True) if reverse else [instance.pk]
+    else:
+        return
+    for pk in pks:
+        user_cache.invalidate(pk)
+
+
+track_changes(user, "phone")
+
+
+@receiver(post_save, sender=user)
+def add_phone_to_filter(sender, instance, created, *args, **kwargs):
+    """
+    Adds the phone of new users, and changed phones, right away rather than on commit, a rolled back
+    user only costs a false positive. Other saves leave the filter and its shared generation be.
+    """
+    if created or changed(instance, "phone"):
+        phone_filter.add(instance.phone)
+
+
+@receiver(post_delete, sender=user)
+def count_removed_phone(sender, instance, *args, **kwargs):
+    phone_filter.removed += 1
@@ -0,0 +1,97 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps
+from threading import Lock
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+class SmsError(Exception):
+    """
+    Raised by a provider when a message could not be sent. permanent errors are dead-lettered at once.
+    """
+
+    def __init__(self, message, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+class BaseSmsProvider:
+    """
+    Sends text messages through a gateway. Providers implement send(), or send_many() when the
+    gateway takes batches. max_concurrency caps the messages a worker sends at the same time.
+    """
+
+    max_concurrency = 4
+
+    def __init__(self, **options):
+        for name, value in options.items():
+            setattr(self, name, value)
+
+    @property
+    def name(self) -> str:
+        return type(self).__name__
+
+    def send(self, phone: str, body: str):
+        raise NotImplementedError
+
+    def send_many(self, messages) -> list:
+        """
+        Sends (phone, body) pairs and returns the exception raised for each of them, or None.
+        """
+
+        def send(message):
+            try:
+                self.send(*message)
+            except Exception as error:
+                return error
+            return None
+
+        if len(messages) <= 1 or self.max_concurrency <= 1:
+            return [send(message) for message in messages]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(messages))) as executor:
+            return list(executor.map(send, messages))
+
+
+class ConsoleSmsProvider(BaseSmsProvider):
+    """
+    Writes messages to stdout, for development.
+    """
+
+    max_concurrency = 1
+
+    def send(self, phone, body):
+        sys.stdout.write(f"SMS to {phone}: {body}\n")
+        sys.stdout.flush()
+
+
+class FileSmsProvider(BaseSmsProvider):
+    """
+    Appends messages as JSON lines to path.
+    """
+
+    max_concurrency = 1
+    path = "sms.ndjson"
+
+    def send(self, phone, body):
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(dumps({"phone": phone, "body": body, "sent": timezone.now().isoformat()}) + "\n")
+
+
+class LocmemSmsProvider(BaseSmsProvider):
+    """
+    Keeps messages in LocmemSmsProvider.outbox, for tests.
+    """
+
+    outbox = []
+    lock = Lock()
+
+    def send(self, phone, body):
+        with self.lock:
+            self.outbox.append((phone, body))
+
+
+def get_sms_provider() -> BaseSmsProvider:
+    provider = getattr(settings, "SMS_PROVIDER", "account.sms.ConsoleSmsProvider")
+    return import_string(provider)(**getattr(settings, "SMS_PROVIDER_OPTIONS", {}))
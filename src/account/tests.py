@@ -1,3 +1,602 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import sqlite3
+from multiprocessing import get_context
+from datetime import timedelta
+from functools import partial
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import time
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import caches
+from django.db.utils import ConnectionHandler
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from account.audit import otp_audit_log
+from account.bloom import BloomFilter, PhoneFilter, phone_filter
+from account.models import PhoneOtp, SmsMessage
+from account.otp import otp_store
+from account.outbox import SmsOutbox
+from account.sms import LocmemSmsProvider, SmsError
+from extensions.cache import LocalTier, TwoTierCache
+from extensions.db.pool import ConnectionPool, PoolTimeout
+from extensions.ratelimit import TokenBucket
 
-# Create your tests here.
+user = get_user_model()
+
+
+class UserExportTest(APITestCase):
+    """
+    The user export streams every user without their password hash.
+    """
+
+    def test_streams_users_without_passwords(self):
+        admin = user.objects.create_superuser(phone="989120000016", password="password")
+        user.objects.create_user(phone="989120000017")
+        self.client.force_authenticate(admin)
+        response = self.client.get(reverse("account-api:export"))
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["phone"] for row in rows], ["989120000016", "989120000017"])
+        self.assertNotIn("password", rows[0])
+
+
+class UsersListTest(APITestCase):
+    """
+    The user listing pages by keyset and searches by prefix.
+    """
+
+    def setUp(self):
+        self.admin = user.objects.create_superuser(phone="989120000200", password="password")
+        user.objects.bulk_create(
+            user(phone=f"98912100{index:04d}", first_name=f"Name{index}", last_name="Family") for index in range(7)
+        )
+        self.client.force_authenticate(self.admin)
+
+    def test_pages_take_one_query_each(self):
+        url, phones = f"{reverse('account-api:users-list')}?page_size=3", []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            phones += [row["phone"] for row in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(phones, list(user.objects.order_by("-id").values_list("phone", flat=True)))
+
+    def test_searches_by_prefix(self):
+        def search(term):
+            response = self.client.get(reverse("account-api:users-list"), {"search": term})
+            return sorted(row["phone"] for row in response.data["results"])
+
+        self.assertEqual(search("989121000003"), ["989121000003"])
+        self.assertEqual(search("name5"), ["989121000005"])
+        self.assertEqual(len(search("fam")), 7)
+        self.assertEqual(search("ame"), [])
+
+    def test_detail_update_bumps_updated(self):
+        updated = self.admin.updated
+        response = self.client.patch(reverse("account-api:users-detail", args=[self.admin.pk]), {"first_name": "new"})
+        self.assertEqual(response.status_code, 200)
+        self.admin.refresh_from_db()
+        self.assertEqual(self.admin.first_name, "new")
+        self.assertGreater(self.admin.updated, updated)
+
+    def test_detail_fields(self):
+        response = self.client.get(reverse("account-api:users-detail", args=[self.admin.pk]))
+        self.assertNotIn("password", response.data)
+        self.assertNotIn("user_permissions", response.data)
+        self.assertEqual(response.data["phone"], "989120000200")
+
+
+@override_settings(OTP_AUDIT_FLUSH_INTERVAL=0, OTP_REQUEST_LIMIT=3, OTP_REQUEST_WINDOW=3600, RATELIMIT_ENABLED=False)
+class OtpTest(APITestCase):
+    """
+    Codes and request counters live in the cache, PhoneOtp is only written behind as an audit log.
+    """
+
+    phone = "989120000020"
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        self.enterContext(patch("account.views.asend_otp"))
+        self.addCleanup(otp_audit_log.flush)
+
+    def register(self):
+        return self.client.post(reverse("account-api:register"), {"phone": self.phone})
+
+    def live_code(self):
+        return otp_store.cache.get(otp_store.key("phone", self.phone))["code"]
+
+    def verify(self, code, **data):
+        return self.client.post(reverse("account-api:verify-otp"), {"code": code, **data})
+
+    def test_request_takes_no_database_write(self):
+        phone_filter.sync()
+        # the phone filter answers the user lookup
+        with self.assertNumQueries(0):
+            self.assertEqual(self.register().status_code, 200)
+
+    def test_requests_are_limited_per_window(self):
+        for _ in range(3):
+            self.assertEqual(self.register().status_code, 200)
+        code = self.live_code()
+        self.assertEqual(self.register().status_code, 429)
+        self.assertEqual(self.live_code(), code)
+        later = time() + 2 * 3600
+        with patch("account.otp.time", return_value=later):
+            self.assertEqual(self.register().status_code, 200)
+
+    def test_code_is_used_once(self):
+        self.register()
+        code = self.live_code()
+        response = self.verify(code, phone=self.phone)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["created"])
+        response = self.verify(code, phone=self.phone)
+        self.assertEqual(response.status_code, 408)
+
+    def test_wrong_codes_drop_the_live_code(self):
+        self.register()
+        code = self.live_code()
+        wrong = f"{(int(code) + 1) % 1000000:06d}"
+        for _ in range(5):
+            self.assertEqual(otp_store.check(self.phone, wrong), otp_store.INCORRECT)
+        self.assertEqual(otp_store.check(self.phone, code), otp_store.EXPIRED)
+
+    def test_audit_log_is_written_behind(self):
+        self.register()
+        self.register()
+        self.assertFalse(PhoneOtp.objects.exists())
+        otp_audit_log.flush()
+        self.assertEqual(PhoneOtp.objects.values_list("phone", "count", "verify").get(), (self.phone, 2, False))
+        self.verify(self.live_code(), phone=self.phone)
+        otp_audit_log.flush()
+        self.assertEqual(PhoneOtp.objects.values_list("count", "verify").get(), (0, True))
+
+    def test_verify_by_challenge(self):
+        challenge = self.register().data["challenge"]
+        self.assertEqual(self.register().data["challenge"], challenge)
+        self.assertEqual(self.verify(self.live_code(), challenge="unknown").status_code, 408)
+        self.assertEqual(self.verify(self.live_code(), challenge=challenge).status_code, 200)
+        self.assertEqual(self.verify("123456").status_code, 400)
+
+    def test_phones_sharing_a_code_verify_separately(self):
+        with patch("account.otp.otp_generator", return_value="123456"):
+            self.register()
+            self.client.post(reverse("account-api:register"), {"phone": "989120000021"})
+        self.assertEqual(self.verify("123456", phone="989120000021").status_code, 200)
+        self.assertEqual(self.verify("123456", phone=self.phone).status_code, 200)
+
+
+class FlakySmsProvider(LocmemSmsProvider):
+    failures = 0
+
+    def send(self, phone, body):
+        if FlakySmsProvider.failures:
+            FlakySmsProvider.failures -= 1
+            raise SmsError("gateway timeout")
+        super().send(phone, body)
+
+
+@override_settings(SMS_PROVIDER="account.sms.LocmemSmsProvider", SMS_MAX_ATTEMPTS=3, OTP_AUDIT_FLUSH_INTERVAL=0)
+class SmsOutboxTest(APITestCase):
+    """
+    Requests only queue text messages, workers send them in batches and retry failed ones.
+    """
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        LocmemSmsProvider.outbox.clear()
+        self.addCleanup(otp_audit_log.flush)
+
+    def test_request_only_enqueues(self):
+        response = self.client.post(reverse("account-api:register"), {"phone": "989120000030"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(LocmemSmsProvider.outbox, [])
+        message = SmsMessage.objects.get()
+        self.assertEqual(message.status, SmsMessage.PENDING)
+        code = otp_store.cache.get(otp_store.key("phone", "989120000030"))["code"]
+        self.assertNotIn(code, message.body)
+        self.assertIsNotNone(message.expires)
+        SmsOutbox().process_batch()
+        self.assertEqual(LocmemSmsProvider.outbox, [("989120000030", f"your otp code :: {code}")])
+        message.refresh_from_db()
+        self.assertNotIn(code, message.body)
+
+    def test_used_codes_are_not_sent(self):
+        self.client.post(reverse("account-api:register"), {"phone": "989120000031"})
+        otp_store.consume("989120000031", otp_store.get_codes(["989120000031"])["989120000031"])
+        SmsOutbox().process_batch()
+        self.assertEqual(LocmemSmsProvider.outbox, [])
+        self.assertEqual(SmsMessage.objects.get().status, SmsMessage.DEAD)
+
+    def test_old_messages_are_purged(self):
+        old = timezone.now() - timedelta(days=30)
+        for status in (SmsMessage.SENT, SmsMessage.DEAD, SmsMessage.PENDING):
+            SmsMessage.objects.create(phone="989120000032", body="hello", status=status)
+        SmsMessage.objects.update(create=old)
+        SmsMessage.objects.create(phone="989120000033", body="hello", status=SmsMessage.SENT)
+        self.assertEqual(SmsOutbox.purge(), 2)
+        self.assertEqual(sorted(SmsMessage.objects.values_list("phone", flat=True)), ["989120000032", "989120000033"])
+
+    def test_worker_sends_in_batches(self):
+        for index in range(5):
+            SmsOutbox.enqueue(f"98912000004{index}", "hello")
+        outbox = SmsOutbox()
+        self.assertEqual(outbox.process_batch(batch_size=3), 3)
+        outbox.run(once=True)
+        self.assertEqual(len(LocmemSmsProvider.outbox), 5)
+        self.assertEqual(SmsMessage.objects.filter(status=SmsMessage.SENT, attempts=1).count(), 5)
+        metrics = SmsOutbox.get_metrics()
+        self.assertEqual((metrics["pending"], metrics["sent_last_hour"]), (0, 5))
+
+    @override_settings(SMS_PROVIDER="account.tests.FlakySmsProvider")
+    def test_failures_are_retried_with_backoff_then_dead_lettered(self):
+        message = SmsOutbox.enqueue("989120000050", "hello")
+        FlakySmsProvider.failures = 1
+        outbox = SmsOutbox()
+        outbox.process_batch()
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (SmsMessage.PENDING, 1))
+        self.assertGreater(message.next_attempt, timezone.now())
+        # not due yet
+        self.assertEqual(outbox.process_batch(), 0)
+        SmsMessage.objects.update(next_attempt=timezone.now())
+        outbox.process_batch()
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (SmsMessage.SENT, 2))
+
+        message = SmsOutbox.enqueue("989120000051", "hello")
+        FlakySmsProvider.failures = 3
+        for _ in range(3):
+            SmsMessage.objects.filter(pk=message.pk).update(next_attempt=timezone.now())
+            outbox.process_batch()
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (SmsMessage.DEAD, 3))
+        self.assertIn("gateway timeout", message.last_error)
+
+    def test_expired_messages_are_dead_lettered(self):
+        SmsOutbox.enqueue("989120000060", "hello", expires_in=60)
+        SmsMessage.objects.update(expires=timezone.now() - timedelta(seconds=1))
+        SmsOutbox().process_batch()
+        self.assertEqual(LocmemSmsProvider.outbox, [])
+        self.assertEqual(SmsMessage.objects.get().status, SmsMessage.DEAD)
+
+
+@override_settings(OTP_AUDIT_LOG=False, RATELIMIT_ROUTES={"account-api:verify-otp": "4/min"})
+class RateLimitTest(APITestCase):
+    """
+    Token buckets in the shared cache, per route and address in the middleware and per phone in the throttles.
+    """
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        self.enterContext(patch("account.views.asend_otp"))
+
+    def verify(self, phone, address="10.0.0.1"):
+        return self.client.post(reverse("account-api:verify-otp"), {"code": "000000", "phone": phone},
+                                REMOTE_ADDR=address)
+
+    def test_bucket_refills(self):
+        bucket = TokenBucket("2/s")
+        with patch("extensions.ratelimit.time", return_value=1000.0):
+            self.assertEqual([bucket.consume("a").allowed for _ in range(3)], [True, True, False])
+            self.assertEqual(bucket.consume("b").remaining, 1)
+        with patch("extensions.ratelimit.time", return_value=1000.5):
+            self.assertTrue(bucket.consume("a").allowed)
+            self.assertFalse(bucket.consume("a").allowed)
+        with patch("extensions.ratelimit.time", return_value=1001.6):
+            self.assertEqual(bucket.consume("a").remaining, 1)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {
+        "verify-otp-phone": "2/min"}})
+    def test_verify_is_throttled_per_phone(self):
+        for _ in range(2):
+            response = self.verify("989120000070")
+            self.assertEqual(response.status_code, 408)
+        self.assertEqual(response["X-RateLimit-Remaining"], "0")
+        response = self.verify("989120000070", address="10.0.0.2")
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response["Retry-After"]), 0)
+        self.assertEqual(self.verify("989120000071", address="10.0.0.2").status_code, 408)
+
+    def test_route_is_limited_before_the_database(self):
+        for remaining in range(3, -1, -1):
+            response = self.verify(f"98912000008{remaining}")
+            self.assertEqual(response["X-RateLimit-Limit"], "4")
+            self.assertEqual(response["X-RateLimit-Remaining"], str(remaining))
+        with self.assertNumQueries(0):
+            response = self.verify("989120000089")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["X-RateLimit-Remaining"], "0")
+        self.assertEqual(self.verify("989120000089", address="10.0.0.2").status_code, 408)
+
+    def test_forwarded_for_sent_by_the_client_is_ignored(self):
+        statuses = []
+        for index in range(6):
+            # nginx appends the address it saw to the header the client sent.
+            response = self.client.post(reverse("account-api:verify-otp"), {"code": "000000", "phone": "989120000090"},
+                                        REMOTE_ADDR="172.18.0.2", HTTP_X_FORWARDED_FOR=f"10.1.0.{index}, 203.0.113.7")
+            statuses.append(response.status_code)
+        self.assertEqual(statuses, [408] * 4 + [429] * 2)
+
+
+def issue_code(phone, queue):
+    queue.put(otp_store.issue(phone))
+
+
+def count_to(key, times):
+    for _ in range(times):
+        otp_store.cache.incr(key)
+
+
+class ConnectionPoolTest(APITestCase):
+    """
+    Pooled connections are reused, health checked, recycled and waited for at most the pool timeout.
+    """
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        directory = self.enterContext(TemporaryDirectory())
+        self.path = os.path.join(directory, "pool.sqlite3")
+        self.connect = partial(sqlite3.connect, self.path, check_same_thread=False)
+
+    def test_close_returns_the_connection(self):
+        handler = ConnectionHandler({"default": {
+            "ENGINE": "extensions.db.sqlite3", "NAME": self.path, "POOL": {"MAX_SIZE": 2},
+        }})
+        wrapper = handler["default"]
+        self.addCleanup(wrapper.pool.close_all)
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+        wrapper.close()
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, raw)
+        wrapper.close()
+        stats = wrapper.pool.get_stats()
+        self.assertEqual((stats["opened"], stats["checkouts"], stats["idle"], stats["in_use"]), (1, 2, 1, 0))
+
+    def test_exhausted_pool_fails_fast(self):
+        pool = ConnectionPool("test", max_size=1, timeout=0.05)
+        connection = pool.acquire(self.connect)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.connect)
+        pool.release(connection)
+        self.assertIs(pool.acquire(self.connect), connection)
+        self.assertEqual(pool.get_stats()["timeouts"], 1)
+
+    def test_broken_and_old_connections_are_replaced(self):
+        pool = ConnectionPool("test", max_size=1, health_check_after=0)
+        connection = pool.acquire(self.connect)
+        pool.release(connection)
+        connection.close()
+        replacement = pool.acquire(self.connect)
+        self.assertIsNot(replacement, connection)
+        pool.max_lifetime = 0
+        pool.release(replacement)
+        self.assertEqual(pool.get_stats()["size"], 0)
+        stats = pool.get_stats()
+        self.assertEqual((stats["health_check_failures"], stats["recycled"], stats["opened"]), (1, 1, 2))
+
+    def test_min_size_is_filled_and_kept(self):
+        pool = ConnectionPool("test", min_size=2, max_size=3, max_idle=0)
+        pool.fill(self.connect)
+        connections = [pool.acquire(self.connect) for _ in range(3)]
+        for connection in connections:
+            pool.release(connection)
+        # The one above min_size closes once the next checkout sees it idle past max_idle.
+        pool.release(pool.acquire(self.connect))
+        self.assertEqual(pool.get_stats()["size"], 2)
+        self.assertEqual(pool.get_stats()["opened"], 3)
+
+    def test_metrics_are_shared(self):
+        pool = ConnectionPool("test")
+        pool.release(pool.acquire(self.connect))
+        pool.flush_metrics()
+        metrics = ConnectionPool.get_metrics("test")
+        self.assertEqual((metrics["checkouts"], metrics["open"], metrics["in_use"]), (1, 1, 0))
+        pool.close_all()
+        pool.flush_metrics()
+        self.assertEqual(ConnectionPool.get_metrics("test")["open"], 0)
+
+    def test_timeout_answers_503(self):
+        self.client.force_authenticate(user.objects.create_user(phone="989120000300"))
+        with patch("account.views.UserProfile.get", side_effect=PoolTimeout("busy")):
+            response = self.client.get(reverse("account-api:profile"))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+
+@override_settings(OTP_AUDIT_LOG=False)
+class SharedCacheTest(APITestCase):
+    """
+    The cache namespaces are shared by every worker process, the response cache through an L1 per process.
+    """
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+
+    def test_code_issued_by_one_worker_verifies_in_another(self):
+        context = get_context("fork")
+        queue = context.Queue()
+        worker = context.Process(target=issue_code, args=("989120000090", queue))
+        worker.start()
+        code, challenge = queue.get(timeout=10)
+        worker.join()
+        self.assertEqual(otp_store.get_phone(challenge), "989120000090")
+        self.assertEqual(otp_store.check("989120000090", code), otp_store.VERIFIED)
+
+    def test_counters_are_atomic_across_workers(self):
+        otp_store.cache.set("counter", 0)
+        context = get_context("fork")
+        workers = [context.Process(target=count_to, args=("counter", 100)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(otp_store.cache.get("counter"), 400)
+        self.assertFalse(otp_store.cache.add("counter", 0))
+        otp_store.cache.set("expired", 1, -1)
+        self.assertTrue(otp_store.cache.add("expired", 2))
+
+    def test_counters_are_atomic_across_threads(self):
+        cache = otp_store.cache
+        cache.set("counter", 0)
+        errors = []
+
+        def count():
+            try:
+                for _ in range(200):
+                    cache.incr("counter")
+            except Exception as error:
+                errors.append(error)
+
+        threads = [Thread(target=count) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(cache.get("counter"), 1600)
+
+    @override_settings(CACHES={**settings.CACHES, "response": {**settings.CACHES["response"], "OPTIONS": {
+        "MAX_ENTRIES": 2, "LOCAL_TIMEOUT": 30, "VERSION_CHECK_INTERVAL": 0}}})
+    def test_local_tier_is_invalidated_by_other_workers(self):
+        worker, other = caches["response"], TwoTierCache("response-shared", settings.CACHES["response"])
+        # another process has an L1 of its own
+        other._local = LocalTier(2)
+        worker.set("key", 1)
+        self.assertEqual(other.get("key"), 1)
+        caches["response-shared"].set("key", 2)
+        # served from the L1 until someone invalidates
+        self.assertEqual(other.get("key"), 1)
+        worker.delete("unrelated")
+        self.assertEqual(other.get("key"), 2)
+        for key in ("a", "b", "c"):
+            other.set(key, key)
+        self.assertEqual(len(other._local._entries), 2)
+
+
+class CachedAuthenticationTest(APITestCase):
+    """
+    Users behind access tokens are cached until a save bumps their generation.
+    """
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        self.user = get_user_model().objects.create_user(phone="989120000100")
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_cached_user_takes_no_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse("account-api:profile")).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("account-api:profile")).status_code, 200)
+
+    def test_generations_expire_with_the_cached_users(self):
+        self.client.get(reverse("account-api:profile"))
+        key = f"generation:user:{self.user.pk}"
+        self.assertIsNotNone(caches["default"].get(key))
+        later = time() + settings.AUTH_USER_CACHE_SHARED_TIMEOUT + 1
+        with patch("extensions.cache.time", return_value=later):
+            self.assertIsNone(caches["default"].get(key))
+
+    def test_saves_apply_to_the_next_request(self):
+        self.client.get(reverse("account-api:profile"))
+        self.assertEqual(self.client.get(reverse("account-api:users-list")).status_code, 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_superuser = True
+            self.user.save(update_fields=["is_superuser"])
+        self.assertEqual(self.client.get(reverse("account-api:users-list")).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self.client.get(reverse("account-api:profile")).data["code"], "user_not_found")
+
+
+@override_settings(OTP_AUDIT_LOG=False, RATELIMIT_ENABLED=False)
+class AsyncOtpTest(APITestCase):
+    """
+    The OTP endpoints are coroutines, served on the event loop under ASGI.
+    """
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+
+    async def test_otp_flow_under_asgi(self):
+        responses = await asyncio.gather(*(
+            self.async_client.post(reverse("account-api:register"), {"phone": f"98912000011{index}"})
+            for index in range(5)
+        ))
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        self.assertEqual(await SmsMessage.objects.acount(), 5)
+        challenge = responses[0].json()["challenge"]
+        code = otp_store.cache.get(otp_store.key("phone", "989120000110"))["code"]
+        response = await self.async_client.post(reverse("account-api:verify-otp"), {"code": code, "challenge": challenge})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["created"])
+        response = await self.async_client.post(reverse("account-api:login"), {"phone": "989120000111"})
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(OTP_AUDIT_LOG=False, RATELIMIT_ENABLED=False)
+class PhoneFilterTest(APITestCase):
+    """
+    Login and Register skip the user lookup for phones the Bloom filter has never seen.
+    """
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        self.enterContext(patch("account.views.asend_otp"))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+        for index in range(1000):
+            bloom.add(f"98912{index:07d}")
+        self.assertTrue(all(f"98912{index:07d}" in bloom for index in range(1000)))
+        false_positives = sum(f"98935{index:07d}" in bloom for index in range(10000))
+        self.assertLess(false_positives, 300)
+        self.assertAlmostEqual(bloom.estimated_error_rate, 0.01, delta=0.005)
+
+    def test_unknown_phones_take_no_query(self):
+        phone_filter.sync()
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse("account-api:login"), {"phone": "989120000120"})
+        self.assertEqual(response.status_code, 401)
+        get_user_model().objects.create_user(phone="989120000120")
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse("account-api:login"), {"phone": "989120000120"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_only_new_phones_are_added(self):
+        saved = get_user_model().objects.create_user(phone="989120000121")
+        generation = phone_filter.get_generation()
+        saved.first_name = "renamed"
+        saved.save()
+        get_user_model().objects.get(pk=saved.pk).save()
+        self.assertEqual(phone_filter.get_generation(), generation)
+        saved.phone = "989120000122"
+        saved.save()
+        self.assertEqual(phone_filter.get_generation(), generation + 1)
+        self.assertTrue(phone_filter.might_contain("989120000122"))
+
+    def test_phones_saved_by_other_workers_are_applied(self):
+        phone_filter.sync()
+        # another process, built before the user was saved here
+        other = PhoneFilter()
+        other.build()
+        get_user_model().objects.create_user(phone="989120000121")
+        self.assertTrue(other.might_contain("989120000121"))
+        self.assertEqual(other.get_stats()["phones"], phone_filter.get_stats()["phones"])
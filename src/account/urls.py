@@ -1,4 +1,5 @@
 from django.urls import path
+from extensions.export import ExportView
 from account.views import UsersList, UsersDetailUpdateDelete, UserProfile, Login, Register, VerifyOtp,\
     ChangeTwoStepPassword, CreateTwoStepPassword
 
@@ -6,6 +7,7 @@ from account.views import UsersList, UsersDetailUpdateDelete, UserProfile, Login
 app_name = "account-api"
 
 urlpatterns = [
+    path("export/", ExportView.as_view(exporter_name="users"), name="export"),
     path("", UsersList.as_view(), name="users-list"),
     path("profile/", UserProfile.as_view(), name="profile"),
     path("login/", Login.as_view(), name="login"),
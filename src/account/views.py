@@ -1,5 +1,6 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
+from django.contrib.auth.hashers import check_password
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.generics import ListAPIView, RetrieveUpdateDestroyAPIView
@@ -7,26 +8,31 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
-from extensions.code_generator import otp_generator
 from extensions.permissions import IsSuperUser
-from account.send_otp import send_otp
+from extensions.views import AsyncAPIView
+from account.send_otp import asend_otp
 from account.serializers import UsersListSerializer, UserDetailUpdateDeleteSerializer, UserProfileSerializer, \
     AuthenticationSerializer, OtpSerializer, ChangeTwoStepPasswordSerializer, CreateTwoStepPasswordSerializer
-from account.models import PhoneOtp
+from account.audit import otp_audit_log
+from account.bloom import phone_filter
+from account.otp import otp_store
+from account.pagination import UsersCursorPagination
 
 user = get_user_model()
 
 
 class UsersList(ListAPIView):
     """
-    get: Returns a list of all existing users.
+    get: Returns a page of existing users, newest first. Search matches the start of the phone or names.
     """
-    queryset = user.objects.all()
+    queryset = user.objects.only(*UsersListSerializer.Meta.fields)
     serializer_class = UsersListSerializer
     permission_classes = [IsSuperUser]
+    pagination_class = UsersCursorPagination
     filterset_fields = ["author"]
-    search_fields = ["phone", "first_name", "last_name"]
-    ordering_fields = ("id", "author")
+    # Prefix searches, served by the indexes of account migration 0005.
+    search_fields = ["^phone", "^first_name", "^last_name"]
+    ordering_fields = ("id",)
 
 
 class UsersDetailUpdateDelete(RetrieveUpdateDestroyAPIView):
@@ -39,7 +45,9 @@ class UsersDetailUpdateDelete(RetrieveUpdateDestroyAPIView):
     permission_classes = [IsSuperUser]
 
     def get_object(self):
-        return get_object_or_404(user, pk=self.kwargs.get("pk"))
+        # A save writes only the loaded fields, the auto_now updated must be one of them.
+        return get_object_or_404(user.objects.only(*UserDetailUpdateDeleteSerializer.Meta.fields, "updated"),
+                                 pk=self.kwargs.get("pk"))
 
 
 class UserProfile(RetrieveUpdateDestroyAPIView):
@@ -56,113 +64,120 @@ class UserProfile(RetrieveUpdateDestroyAPIView):
         return self.request.user
 
 
-class Login(APIView):
+class Login(AsyncAPIView):
     """
     post: Send mobile number for Login. parameters: [phone,]
     """
 
     permission_classes = [AllowAny]
+    authentication_classes = []
+    throttle_scope = "otp"
 
-    def post(self, request):
+    async def post(self, request):
         serializer = AuthenticationSerializer(data=request.data)
         if serializer.is_valid():
             phone = serializer.validated_data.get("phone")
-            user_is_exists: bool = user.objects.filter(phone=phone).values("phone").exists()
+            user_is_exists: bool = (
+                await phone_filter.amight_contain(phone)
+                and await user.objects.filter(phone=phone).values("phone").aexists()
+            )
             if not user_is_exists:
                 return Response({"No User exists.": "Please enter another phone number."},
                                 status=status.HTTP_401_UNAUTHORIZED)
-            code = otp_generator()
-            user_otp, _ = PhoneOtp.objects.get_or_create(phone=phone)
-            user_otp.otp = code
-            user_otp.count += 1
-            user_otp.save(update_fields=["otp", "count"])
-            if user_otp.count >= 4:
+            challenge = await otp_store.aissue(phone)
+            if challenge is None:
                 return Response({"Many Requests": "You requested too much."}, status=status.HTTP_429_TOO_MANY_REQUESTS)
-            cache.set(phone, code, 300)
-            # TODO: send_otp(phone, code)
-            send_otp(phone=phone, otp=code)
-            return Response({"code sent.": "The code has been sent to the desired phone number."},
-                            status=status.HTTP_200_OK)
+            _, challenge_id = challenge
+            otp_audit_log.record(phone, count=round(await otp_store.acount_requests(phone)))
+            await asend_otp(phone=phone)
+            return Response({"code sent.": "The code has been sent to the desired phone number.",
+                             "challenge": challenge_id}, status=status.HTTP_200_OK)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class Register(APIView):
+class Register(AsyncAPIView):
     """
     post: Send mobile number for Register. parameters: [phone,]
     """
 
     permission_classes = [AllowAny]
+    authentication_classes = []
+    throttle_scope = "otp"
 
-    def post(self, request):
+    async def post(self, request):
         serializer = AuthenticationSerializer(data=request.data)
         if serializer.is_valid():
             phone = serializer.validated_data.get("phone")
-            user_is_exists: bool = user.objects.filter(phone=phone).values("phone").exists()
+            user_is_exists: bool = (
+                await phone_filter.amight_contain(phone)
+                and await user.objects.filter(phone=phone).values("phone").aexists()
+            )
             if user_is_exists:
                 return Response({"User exists.": "Please enter a different phone number."},
                                 status=status.HTTP_401_UNAUTHORIZED)
-            code = otp_generator()
-            user_otp, _ = PhoneOtp.objects.get_or_create(phone=phone)
-            user_otp.otp = code
-            user_otp.count += 1
-            user_otp.save(update_fields=["otp", "count"])
-            if user_otp.count >= 4:
+            challenge = await otp_store.aissue(phone)
+            if challenge is None:
                 return Response({"Many Request": "You requested too much."}, status=status.HTTP_429_TOO_MANY_REQUESTS)
-            cache.set(phone, code, 300)
-            # TODO: send_otp(phone, code)
-            send_otp(phone=phone, otp=code)
-            return Response({"code sent.": "The code has been sent to the desired phone number."},
-                            status=status.HTTP_200_OK)
+            _, challenge_id = challenge
+            otp_audit_log.record(phone, count=round(await otp_store.acount_requests(phone)))
+            await asend_otp(phone=phone)
+            return Response({"code sent.": "The code has been sent to the desired phone number.",
+                             "challenge": challenge_id}, status=status.HTTP_200_OK)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class VerifyOtp(APIView):
+class VerifyOtp(AsyncAPIView):
     """
     post: Send otp code to verify mobile number and complete authentication. If the user has a 2-step password,
-    he must also send a password. parameters: [otp, password]
+    he must also send a password. parameters: [code, phone or challenge, password]
     """
 
     permission_classes = [AllowAny]
+    authentication_classes = []
+    throttle_scope = "verify-otp"
     confirm_for_authentication = False
 
-    def post(self, request):
+    async def post(self, request):
         serializer = OtpSerializer(data=request.data)
         if serializer.is_valid():
             received_code = serializer.validated_data.get("code")
-            query = PhoneOtp.objects.filter(otp=received_code)
-            if not query.exists():
+            phone = serializer.validated_data.get("phone")
+            if phone is None:
+                phone = await otp_store.aget_phone(serializer.validated_data.get("challenge"))
+                if phone is None:
+                    return Response({"Code expired.": "The entered code has expired."},
+                                    status=status.HTTP_408_REQUEST_TIMEOUT)
+            result = await otp_store.acheck(phone, received_code)
+            if result == otp_store.EXPIRED:
+                return Response({"Code expired.": "The entered code has expired."},
+                                status=status.HTTP_408_REQUEST_TIMEOUT)
+            if result != otp_store.VERIFIED:
                 return Response({"Incorrect code.": "The code entered is incorrect."},
                                 status=status.HTTP_406_NOT_ACCEPTABLE)
-            object = query.first()
-            code_in_cache = cache.get(object.phone)
-            if code_in_cache is not None:
-                if code_in_cache == received_code:
-                    user, created = user.objects.get_or_create(phone=object.phone)
-                    if user.two_step_password:
-                        password = serializer.validated_data.get("password")
-                        check_password: bool = user.check_password(password)
-                        if check_password:
-                            self.confirm_for_authentication = True
-                        else:
-                            return Response({"Incorrect password.": "The password entered is incorrect."},
-                                            status=status.HTTP_406_NOT_ACCEPTABLE)
-                    else:
-                        self.confirm_for_authentication = True
-                    if self.confirm_for_authentication:
-                        refresh = RefreshToken.for_user(user)
-                        cache.delete(object.phone)
-                        object.verify, object.count = True, 0
-                        object.save(update_fields=["verify", "count"])
-                        return Response({"created": created, "refresh": str(refresh),
-                                         "access": str(refresh.access_token)}, status=status.HTTP_200_OK)
+            instance, created = await user.objects.aget_or_create(phone=phone)
+            if instance.two_step_password:
+                password = serializer.validated_data.get("password")
+                # Hashing is CPU bound, it runs in the thread pool rather than on the event loop.
+                password_is_valid: bool = await sync_to_async(check_password, thread_sensitive=False)(
+                    password, instance.password
+                )
+                if password_is_valid:
+                    self.confirm_for_authentication = True
                 else:
-                    return Response({"Incorrect code.": "The code entered is incorrect."},
+                    return Response({"Incorrect password.": "The password entered is incorrect."},
                                     status=status.HTTP_406_NOT_ACCEPTABLE)
             else:
-                return Response({"Code expired.": "The entered code has expired."},
-                                status=status.HTTP_408_REQUEST_TIMEOUT)
+                self.confirm_for_authentication = True
+            if self.confirm_for_authentication:
+                if not await otp_store.aconsume(phone, received_code):
+                    return Response({"Code expired.": "The entered code has expired."},
+                                    status=status.HTTP_408_REQUEST_TIMEOUT)
+                refresh = RefreshToken.for_user(instance)
+                otp_audit_log.record(phone, count=0, verify=True)
+                return Response({"created": created, "refresh": str(refresh),
+                                 "access": str(refresh.access_token)}, status=status.HTTP_200_OK)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
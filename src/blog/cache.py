@@ -0,0 +1,17 @@
+from django.db import transaction
+from extensions.response_cache import generations
+
+
+def invalidate_blogs(*slugs):
+    """
+    Drops the cached blog lists and the cached details of the given blogs once the transaction commits.
+    """
+    names = ("blogs", *(f"blog:{slug}" for slug in slugs))
+    transaction.on_commit(lambda: generations.bump(*names))
+
+
+def invalidate_categories():
+    """
+    Drops the cached category list and the blog lists, which show category titles.
+    """
+    transaction.on_commit(lambda: generations.bump("categories", "blogs"))
@@ -0,0 +1,20 @@
+from django.db.models import Prefetch
+from extensions.export import Exporter
+from .models import Blog, Category
+
+
+class BlogExporter(Exporter):
+    def get_queryset(self):
+        return Blog.objects.select_related("author").only(
+            "title", "slug", "body", "image", "summary", "publish", "create", "updated", "special", "status",
+            "visits", "like_count", "comment_count", "author__phone"
+        ).prefetch_related(Prefetch("category", queryset=Category.objects.only("id")))
+
+    def to_dict(self, blog):
+        return {
+            "id": blog.id, "author": blog.author_id, "author_phone": blog.author.phone, "title": blog.title,
+            "slug": blog.slug, "body": blog.body, "image": blog.image.name, "summary": blog.summary,
+            "category": [category.id for category in blog.category.all()], "publish": blog.publish,
+            "create": blog.create, "updated": blog.updated, "special": blog.special, "status": blog.status,
+            "visits": blog.visits, "like_count": blog.like_count, "comment_count": blog.comment_count,
+        }
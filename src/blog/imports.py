@@ -0,0 +1,208 @@
+from csv import DictReader
+from io import TextIOWrapper
+from json import loads
+from time import monotonic
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+from extensions.code_generator import slug_generator
+from .cache import invalidate_blogs
+from .models import Blog, Category
+from .search import get_search_backend
+
+user = get_user_model()
+
+
+def read_ndjson(file):
+    """
+    Yields the rows of a binary NDJSON stream, skipping blank lines.
+    """
+    for line in TextIOWrapper(file, encoding="utf-8"):
+        if line.strip():
+            yield loads(line)
+
+
+def read_csv(file):
+    """
+    Yields the rows of a binary CSV stream with a header line. category and likes hold comma separated ids.
+    """
+    for row in DictReader(TextIOWrapper(file, encoding="utf-8", newline="")):
+        for field in ("category", "likes"):
+            row[field] = [value for value in (row.get(field) or "").split(",") if value.strip()]
+        yield row
+
+
+readers = {"ndjson": read_ndjson, "csv": read_csv}
+
+
+class RowError(ValueError):
+    pass
+
+
+class BlogImporter:
+    """
+    Creates blogs from rows in batches, without the per-row signals of Blog.save: slugs are generated
+    for a whole batch with one collision query, and blogs, categories and likes are written with
+    bulk_create. Search indexing and cache invalidation run once in finish(), renditions are left to
+    the caller, see rendition_pipeline.
+
+    A row holds title, body, summary, image (a storage name), author (an id) or author_phone, and
+    optionally slug, publish, special, status, category and likes (lists of ids).
+    """
+
+    batch_size = 1000
+    max_errors = 100
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or self.batch_size
+        self.category_ids = set(Category.objects.values_list("id", flat=True))
+        self.blog_ids = []
+        self.created = self.failed = 0
+        self.errors = []
+        self.started = monotonic()
+
+    def run(self, rows, progress=None):
+        """
+        Imports every row, calling progress(stats) after each batch, and returns the stats.
+        """
+        batch = []
+        for line, row in enumerate(rows, start=1):
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+                if progress is not None:
+                    progress(self.get_stats())
+        if batch:
+            self.import_batch(batch)
+        self.finish()
+        return self.get_stats()
+
+    def import_batch(self, batch):
+        users = self.get_users(row for _, row in batch)
+        blogs, relations = [], []
+        for line, row in batch:
+            try:
+                blog, categories, likes = self.build(row, users)
+            except (RowError, ValueError, TypeError) as error:
+                self.add_error(line, error)
+                continue
+            blogs.append(blog)
+            relations.append((categories, likes))
+        self.assign_slugs(blogs)
+        with transaction.atomic():
+            Blog.objects.bulk_create(blogs, batch_size=self.batch_size)
+            Blog.category.through.objects.bulk_create([
+                Blog.category.through(blog_id=blog.pk, category_id=category_id)
+                for blog, (categories, _) in zip(blogs, relations) for category_id in categories
+            ], batch_size=self.batch_size)
+            Blog.likes.through.objects.bulk_create([
+                Blog.likes.through(blog_id=blog.pk, user_id=user_id)
+                for blog, (_, likes) in zip(blogs, relations) for user_id in likes
+            ], batch_size=self.batch_size)
+        self.blog_ids.extend(blog.pk for blog in blogs)
+        self.created += len(blogs)
+
+    def get_users(self, rows) -> dict:
+        """
+        Maps the phones and ids of the authors and likes referenced by the rows to user ids, with one query.
+        """
+        phones, ids = set(), set()
+        for row in rows:
+            if row.get("author_phone"):
+                phones.add(str(row["author_phone"]))
+            elif row.get("author"):
+                ids.add(str(row["author"]))
+            ids.update(str(user_id) for user_id in row.get("likes") or ())
+        ids = [user_id for user_id in ids if user_id.isdigit()]
+        users = {}
+        for user_id, phone in user.objects.filter(Q(phone__in=phones) | Q(pk__in=ids)).values_list("id", "phone"):
+            users[("phone", phone)] = users[("id", user_id)] = user_id
+        return users
+
+    def build(self, row, users):
+        for field in ("title", "body", "summary", "image"):
+            if not row.get(field):
+                raise RowError(f"{field} is required.")
+        if row.get("author_phone"):
+            author = users.get(("phone", str(row["author_phone"])))
+        else:
+            author = users.get(("id", int(row.get("author") or 0)))
+        if author is None:
+            raise RowError("The author does not exist.")
+        status = row.get("status") or "d"
+        if status not in dict(Blog.STATUS_CHOICES):
+            raise RowError(f"{status} is not a valid status.")
+        publish = row.get("publish") or timezone.now()
+        if isinstance(publish, str):
+            publish = parse_datetime(publish)
+            if publish is None:
+                raise RowError("publish is not a valid date and time.")
+            if timezone.is_naive(publish):
+                publish = timezone.make_aware(publish)
+        categories = {int(category) for category in row.get("category") or ()}
+        if not categories <= self.category_ids:
+            raise RowError(f"Unknown categories {sorted(categories - self.category_ids)}.")
+        likes = {int(user_id) for user_id in row.get("likes") or ()}
+        if any(("id", user_id) not in users for user_id in likes):
+            raise RowError("A user in likes does not exist.")
+        blog = Blog(
+            author_id=author, title=row["title"][:200], slug=slugify(row.get("slug") or "")[:50],
+            body=row["body"], image=row["image"], summary=row["summary"], publish=publish, status=status,
+            special=str(row.get("special")).lower() in ("1", "true"), like_count=len(likes),
+        )
+        return blog, categories, likes
+
+    @staticmethod
+    def assign_slugs(blogs):
+        """
+        Keeps the given slugs that are free and generates the others, checking a whole batch of
+        candidates for collisions with one query.
+        """
+        pending = blogs
+        while pending:
+            candidates = [blog.slug if len(blog.slug) > 5 else slugify(slug_generator(10)) for blog in pending]
+            taken = set(Blog.objects.filter(slug__in=candidates).order_by().values_list("slug", flat=True))
+            seen, retry = set(), []
+            for blog, slug in zip(pending, candidates):
+                if slug in taken or slug in seen:
+                    blog.slug = ""
+                    retry.append(blog)
+                else:
+                    blog.slug = slug
+                    seen.add(slug)
+            pending = retry
+
+    def finish(self):
+        """
+        Indexes the imported blogs for search and drops the cached lists, once for the whole import.
+        """
+        backend = get_search_backend()
+        if backend is not None:
+            with transaction.atomic():
+                for start in range(0, len(self.blog_ids), self.batch_size):
+                    backend.update(self.blog_ids[start:start + self.batch_size])
+        invalidate_blogs()
+
+    def get_images(self):
+        """
+        Yields (id, image) of the imported blogs, to render their renditions.
+        """
+        for start in range(0, len(self.blog_ids), self.batch_size):
+            blogs = Blog.objects.filter(pk__in=self.blog_ids[start:start + self.batch_size])
+            yield from blogs.values_list("id", "image")
+
+    def add_error(self, line, error):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": str(error)})
+
+    def get_stats(self) -> dict:
+        seconds = monotonic() - self.started
+        return {
+            "created": self.created, "failed": self.failed, "errors": self.errors, "seconds": round(seconds, 3),
+            "rows_per_second": round((self.created + self.failed) / seconds, 1) if seconds else None,
+        }
@@ -0,0 +1,70 @@
+from random import Random
+from string import ascii_lowercase
+from statistics import mean, quantiles
+from time import perf_counter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from blog.models import Blog
+from blog.search import BlogSearchFilter, get_search_backend
+from blog.views import BlogsList
+
+WORDS = (
+    "python django rest api cache index query cursor search token worker signal model view serializer "
+    "database postgres sqlite migration deploy docker nginx gunicorn request response image comment "
+    "category author blog phone login register verify password otp session thread process memory"
+).split()
+
+
+class Command(BaseCommand):
+    help = "Compares the full-text search backend with SearchFilter on a seeded corpus. Nothing is kept."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--blogs", type=int, default=20000, help="Number of blogs to seed.")
+        parser.add_argument("--rounds", type=int, default=20, help="Repetitions of every query.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError("No search backend is available for this database.")
+        with transaction.atomic():
+            self.seed(options["blogs"], Random(options["seed"]))
+            backend.rebuild()
+            queries = ["python", "cache worker", "gunicorn", "postgres migration deploy"]
+            for name, search_filter in (("SearchFilter", SearchFilter()), ("BlogSearchFilter", BlogSearchFilter())):
+                timings = [self.run_query(search_filter, query) for query in queries for _ in range(options["rounds"])]
+                p95 = quantiles(timings, n=20)[-1]
+                self.stdout.write(f"{name:>16}: mean {mean(timings) * 1000:8.2f} ms  p95 {p95 * 1000:8.2f} ms")
+            transaction.set_rollback(True)
+
+    def seed(self, count, random):
+        # Pad the vocabulary with random words so that query terms are selective, as in real text.
+        vocabulary = list(WORDS) + ["".join(random.choices(ascii_lowercase, k=random.randint(4, 9)))
+                                    for _ in range(20000)]
+        author = get_user_model().objects.create_user(phone="989000000000", first_name="benchmark")
+
+        def sentence(size):
+            return " ".join(random.choices(vocabulary, k=size))
+
+        Blog.objects.bulk_create(
+            [Blog(author=author, title=sentence(6), slug=f"benchmark-{index}", summary=sentence(30),
+                  body=sentence(300), image="blogs/benchmark.jpg", status="p") for index in range(count)],
+            batch_size=1000
+        )
+
+    @staticmethod
+    def run_query(search_filter, query):
+        """
+        Times the filtered count and first page, as a paginated list request would run them.
+        """
+        request = Request(RequestFactory().get("/", {"search": query}))
+        view = BlogsList(request=request)
+        start = perf_counter()
+        queryset = search_filter.filter_queryset(request, Blog.objects.publish(), view)
+        queryset.count()
+        list(queryset.values_list("id", flat=True)[:20])
+        return perf_counter() - start
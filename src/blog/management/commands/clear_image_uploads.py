@@ -0,0 +1,14 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from blog.models import ImageUpload
+
+
+class Command(BaseCommand):
+    help = "Deletes chunked image uploads older than BLOG_UPLOAD_EXPIRY seconds, with their temporary files."
+
+    def handle(self, *args, **options):
+        expiry = timedelta(seconds=getattr(settings, "BLOG_UPLOAD_EXPIRY", 24 * 60 * 60))
+        deleted, _ = ImageUpload.objects.filter(create__lt=timezone.now() - expiry).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired uploads."))
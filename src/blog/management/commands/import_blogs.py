@@ -0,0 +1,36 @@
+import sys
+from contextlib import nullcontext
+from os import cpu_count
+from django.core.management.base import BaseCommand
+from blog.imports import BlogImporter, readers
+from blog.renditions import rendition_pipeline
+
+
+class Command(BaseCommand):
+    help = "Imports blogs from an NDJSON or CSV file in batches, then indexes them and renders their images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to read, - for stdin.")
+        parser.add_argument("--format", choices=sorted(readers), help="Defaults to the extension of the file.")
+        parser.add_argument("--batch-size", type=int, default=BlogImporter.batch_size)
+        parser.add_argument("--workers", type=int, default=cpu_count() or 1,
+                            help="Processes rendering the images, 0 skips rendering.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.endswith(".csv") else "ndjson")
+        importer = BlogImporter(batch_size=options["batch_size"])
+        with open(path, "rb") if path != "-" else nullcontext(sys.stdin.buffer) as file:
+            stats = importer.run(readers[fmt](file), progress=self.report)
+        for error in stats["errors"]:
+            self.stderr.write(f"Line {error['line']}: {error['error']}")
+        self.report(stats)
+        if options["workers"] and importer.blog_ids:
+            backfill = rendition_pipeline.backfill(importer.get_images(), options["workers"])
+            failed = sum(error is not None for _, error in backfill)
+            self.stdout.write(f"Rendered the images of the imported blogs, {failed} failed.")
+        self.stdout.write(self.style.SUCCESS(f"Imported {stats['created']} blogs, {stats['failed']} rows failed."))
+
+    def report(self, stats):
+        self.stdout.write(f"{stats['created']} created, {stats['failed']} failed in {stats['seconds']}s "
+                          f"({stats['rows_per_second']} rows/s)")
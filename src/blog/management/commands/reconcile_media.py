@@ -0,0 +1,24 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from blog.media import media_collector, find_orphans
+
+
+class Command(BaseCommand):
+    help = "Finds media files that no blog references and, with --delete, queues them for deletion."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delete", action="store_true", help="Queue the orphaned files for deletion.")
+        parser.add_argument("--grace", type=int, default=3600,
+                            help="Skip files modified within this many seconds.")
+
+    def handle(self, *args, **options):
+        orphans = list(find_orphans(grace=timedelta(seconds=options["grace"])))
+        for name in orphans:
+            self.stdout.write(name)
+        if options["delete"]:
+            with transaction.atomic():
+                media_collector.bury(orphans)
+            self.stdout.write(self.style.SUCCESS(f"Queued {len(orphans)} orphaned files for deletion."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Found {len(orphans)} orphaned files."))
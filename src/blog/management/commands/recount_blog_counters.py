@@ -0,0 +1,27 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from blog.cache import invalidate_blogs
+from blog.models import Blog
+from comment.models import Comment
+
+
+class Command(BaseCommand):
+    help = "Recomputes the like_count and comment_count of every blog from the likes and comments tables."
+
+    def handle(self, *args, **options):
+        likes = Blog.likes.through.objects.filter(blog_id=OuterRef("pk")).values("blog_id")
+        like_count = Coalesce(Subquery(likes.annotate(count=Count("id")).values("count")), Value(0))
+        comments = Comment.objects.filter(content_type=ContentType.objects.get_for_model(Blog),
+                                          object_id=OuterRef("pk")).values("object_id")
+        comment_count = Coalesce(Subquery(comments.annotate(count=Count("id")).values("count")), Value(0))
+        with transaction.atomic():
+            drifted = Blog.objects.annotate(real_likes=like_count, real_comments=comment_count).filter(
+                ~Q(like_count=F("real_likes")) | ~Q(comment_count=F("real_comments"))
+            )
+            slugs = list(drifted.values_list("slug", flat=True))
+            Blog.objects.filter(slug__in=slugs).update(like_count=like_count, comment_count=comment_count)
+            invalidate_blogs(*slugs)
+        self.stdout.write(self.style.SUCCESS(f"Recounted the counters of {len(slugs)} blogs."))
@@ -0,0 +1,27 @@
+from os import cpu_count
+from django.core.management.base import BaseCommand
+from blog.models import Blog
+from blog.renditions import rendition_pipeline
+
+
+class Command(BaseCommand):
+    help = "Renders the image variants of existing blogs in parallel worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=cpu_count() or 1, help="Number of worker processes.")
+        parser.add_argument("--all", action="store_true", help="Render blogs whose variants are up to date too.")
+
+    def handle(self, *args, **options):
+        blogs = (
+            (blog_id, image) for blog_id, image, renditions in
+            Blog.objects.exclude(image="").values_list("id", "image", "renditions").iterator()
+            if options["all"] or renditions.get("source") != image
+        )
+        rendered = failed = 0
+        for blog_id, error in rendition_pipeline.backfill(blogs, options["workers"]):
+            if error is None:
+                rendered += 1
+            else:
+                failed += 1
+                self.stderr.write(f"Blog {blog_id}: {error}")
+        self.stdout.write(self.style.SUCCESS(f"Rendered the images of {rendered} blogs, {failed} failed."))
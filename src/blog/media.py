@@ -0,0 +1,101 @@
+import logging
+from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from extensions.writebehind import WriteBehind
+
+logger = logging.getLogger(__name__)
+
+
+class MediaCollector(WriteBehind):
+    """
+    Deletes media files in the background. Files are recorded as MediaTombstone rows inside the
+    transaction that stops using them, and are deleted through the storage API in batches once it
+    commits, so a rolled back delete keeps its files and a request never waits on the filesystem.
+    A daemon thread collects when woken after a commit and every MEDIA_GC_INTERVAL seconds, which
+    also picks up tombstones left by a stopped worker. With MEDIA_GC_INTERVAL = 0 tombstones are
+    collected in the committing thread instead.
+    """
+
+    name = "media-gc"
+    description = "media files"
+    interval_setting = "MEDIA_GC_INTERVAL"
+    default_interval = 60
+    # Tombstones outlive the process, the next worker collects them.
+    flush_on_exit = False
+    batch_size = 200
+
+    def bury(self, names):
+        """
+        Records the files for deletion once the current transaction commits.
+        """
+        from blog.models import MediaTombstone
+
+        names = {name for name in names if name}
+        if not names:
+            return
+        MediaTombstone.objects.bulk_create([MediaTombstone(name=name) for name in names], ignore_conflicts=True)
+        transaction.on_commit(self.schedule)
+
+    def schedule(self):
+        if not self.interval:
+            self.collect()
+            return
+        self.start()
+        self.wake()
+
+    def collect(self) -> int:
+        """
+        Deletes the files of every tombstone, one batch at a time. Files that a blog uses again are
+        kept. Returns the number of tombstones collected.
+        """
+        from blog.models import Blog, MediaTombstone
+
+        collected = 0
+        while True:
+            batch = list(MediaTombstone.objects.order_by("id").values_list("id", "name")[:self.batch_size])
+            if not batch:
+                return collected
+            in_use = set(Blog.objects.filter(image__in=[name for _, name in batch]).values_list("image", flat=True))
+            for _, name in batch:
+                if name not in in_use:
+                    try:
+                        default_storage.delete(name)
+                    except OSError:
+                        logger.exception("Deleting media file %s failed.", name)
+            MediaTombstone.objects.filter(id__in=[tombstone_id for tombstone_id, _ in batch]).delete()
+            collected += len(batch)
+
+    def flush(self):
+        self.collect()
+
+
+media_collector = MediaCollector()
+
+
+def find_orphans(directories=("blogs",), grace=timedelta(hours=1)):
+    """
+    Yields the storage names of files under the given media directories that no blog references
+    and no tombstone holds. Files modified within the grace period are skipped, as an upload or a
+    rendition may be saved before the row referencing it is committed.
+    """
+    from blog.models import Blog, MediaTombstone
+    from blog.renditions import get_rendition_names
+
+    referenced = set(MediaTombstone.objects.values_list("name", flat=True))
+    for image, renditions in Blog.objects.values_list("image", "renditions").iterator():
+        referenced.add(image)
+        referenced.update(get_rendition_names(renditions))
+    cutoff = timezone.now() - grace
+    pending = list(directories)
+    while pending:
+        directory = pending.pop()
+        if not default_storage.exists(directory):
+            continue
+        subdirectories, files = default_storage.listdir(directory)
+        pending.extend(f"{directory}/{name}" for name in subdirectories)
+        for name in files:
+            name = f"{directory}/{name}"
+            if name not in referenced and default_storage.get_modified_time(name) < cutoff:
+                yield name
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['status', '-publish', '-updated', '-id'], name='blog_status_publish_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:22
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_like_count(apps, schema_editor):
+    Blog = apps.get_model("blog", "Blog")
+    likes = Blog.likes.through.objects.filter(blog_id=OuterRef("pk")).values("blog_id")
+    count = likes.annotate(count=Count("id")).values("count")
+    Blog.objects.update(like_count=Coalesce(Subquery(count), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_blog_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Like count'),
+        ),
+        migrations.RunPython(populate_like_count, migrations.RunPython.noop),
+    ]
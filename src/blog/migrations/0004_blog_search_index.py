@@ -0,0 +1,48 @@
+from django.db import migrations
+
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('simple', b.title), 'A') || "
+    "setweight(to_tsvector('simple', b.summary), 'B') || "
+    "setweight(to_tsvector('simple', u.first_name || ' ' || u.last_name), 'B') || "
+    "setweight(to_tsvector('simple', b.body), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE TABLE blog_search (blog_id bigint PRIMARY KEY REFERENCES blog_blog (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute("CREATE INDEX blog_search_document_idx ON blog_search USING GIN (document)")
+        schema_editor.execute(
+            f"INSERT INTO blog_search (blog_id, document) SELECT b.id, {POSTGRES_DOCUMENT} "
+            f"FROM blog_blog b JOIN account_user u ON u.id = b.author_id"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE blog_search USING fts5(title, summary, body, author, tokenize='unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO blog_search (rowid, title, summary, body, author) "
+            "SELECT b.id, b.title, b.summary, b.body, u.first_name || ' ' || u.last_name "
+            "FROM blog_blog b JOIN account_user u ON u.id = b.author_id"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ("postgresql", "sqlite"):
+        schema_editor.execute("DROP TABLE blog_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0001_initial'),
+        ('blog', '0003_blog_like_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:33
+
+from django.db import migrations, models
+
+
+def populate_category_path(apps, schema_editor):
+    Category = apps.get_model("blog", "Category")
+    categories = list(Category.objects.only("id", "parent_id"))
+    children = {}
+    for category in categories:
+        children.setdefault(category.parent_id, []).append(category)
+    stack = [(category, "") for category in children.get(None, [])]
+    while stack:
+        category, parent_path = stack.pop()
+        category.path = f"{parent_path}{category.id}/"
+        category.depth = category.path.count("/") - 1
+        stack.extend((child, category.path) for child in children.get(category.id, []))
+    Category.objects.bulk_update(categories, ["path", "depth"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_blog_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Depth'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='Ids of the ancestors and of the category, e.g. 1/4/9/', max_length=255, verbose_name='Path'),
+        ),
+        migrations.RunPython(populate_category_path, migrations.RunPython.noop),
+    ]
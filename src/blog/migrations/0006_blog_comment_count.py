@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_comment_count(apps, schema_editor):
+    Blog = apps.get_model("blog", "Blog")
+    Comment = apps.get_model("comment", "Comment")
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    content_type = ContentType.objects.filter(app_label="blog", model="blog").first()
+    if content_type is None:
+        return
+    comments = Comment.objects.filter(content_type=content_type, object_id=OuterRef("pk")).values("object_id")
+    count = comments.annotate(count=Count("id")).values("count")
+    Blog.objects.update(comment_count=Coalesce(Subquery(count), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_category_path'),
+        ('comment', '0002_comment_root'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Comment count'),
+        ),
+        migrations.RunPython(populate_comment_count, migrations.RunPython.noop),
+    ]
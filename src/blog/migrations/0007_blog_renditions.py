@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_blog_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Storage names of the resized variants of the image', verbose_name='Image renditions'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_blog_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Storage name of a media file waiting to be deleted', max_length=255, unique=True, verbose_name='Name')),
+                ('create', models.DateTimeField(auto_now_add=True, verbose_name='Create time')),
+            ],
+            options={
+                'verbose_name': 'Media tombstone',
+                'verbose_name_plural': 'Media tombstones',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blog', '0008_mediatombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='File name')),
+                ('size', models.PositiveIntegerField(help_text='Total size in bytes', verbose_name='Size')),
+                ('offset', models.PositiveIntegerField(default=0, help_text='Bytes received so far', verbose_name='Offset')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256')),
+                ('completed', models.BooleanField(default=False, verbose_name='Completed')),
+                ('create', models.DateTimeField(auto_now_add=True, verbose_name='Create time')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_uploads', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Image upload',
+                'verbose_name_plural': 'Image uploads',
+            },
+        ),
+    ]
@@ -1,9 +1,17 @@
+from os.path import join
+from tempfile import gettempdir
+from uuid import uuid4
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
-from django.db.models import Manager
+from django.contrib.contenttypes.fields import GenericRelation
+from django.db import models, transaction, IntegrityError
+from django.core.exceptions import ValidationError
+from django.db.models import Manager, F, Value
+from django.db.models.functions import Concat, Substr
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from extensions.upload_file_path import upload_file_path
+from .cache import invalidate_blogs
 
 user = get_user_model()
 
@@ -36,12 +44,48 @@ class Blog(models.Model):
     special = models.BooleanField(default=False, verbose_name=_("Is special Blog ?"))
     status = models.CharField(max_length=1, choices=STATUS_CHOICES, verbose_name=_("Status"))
     visits = models.PositiveIntegerField(default=0, verbose_name=_("Visits"))
+    like_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("Like count"))
+    comment_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("Comment count"))
+    renditions = models.JSONField(default=dict, blank=True, editable=False, verbose_name=_("Image renditions"),
+                                  help_text=_("Storage names of the resized variants of the image"))
+    comments = GenericRelation("comment.Comment", related_query_name="blog")
 
     def __str__(self):
         return f"{self.author.first_name} {self.title}"
 
+    def like(self, user) -> bool:
+        """
+        Adds the like of the user and bumps like_count in the same transaction.
+        Returns False if the user had already liked this blog.
+        """
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    Blog.likes.through.objects.create(blog_id=self.pk, user_id=user.pk)
+            except IntegrityError:
+                return False
+            Blog.objects.filter(pk=self.pk).update(like_count=F("like_count") + 1)
+            invalidate_blogs(self.slug)
+        return True
+
+    def unlike(self, user) -> bool:
+        """
+        Removes the like of the user and decrements like_count in the same transaction.
+        Returns False if the user had not liked this blog.
+        """
+        with transaction.atomic():
+            deleted, _ = Blog.likes.through.objects.filter(blog_id=self.pk, user_id=user.pk).delete()
+            if not deleted:
+                return False
+            Blog.objects.filter(pk=self.pk).update(like_count=F("like_count") - 1)
+            invalidate_blogs(self.slug)
+        return True
+
     class Meta:
         ordering = ["-publish", "-updated"]
+        indexes = [
+            models.Index(fields=["status", "-publish", "-updated", "-id"], name="blog_status_publish_idx"),
+        ]
         verbose_name = _("Blog")
         verbose_name_plural = _("Blogs")
 
@@ -54,13 +98,88 @@ class Category(models.Model):
     title = models.CharField(max_length=150, blank=False, verbose_name=_("Title"))
     slug = models.SlugField(unique=True, blank=False, verbose_name=_("Slug"), help_text=_("Do not fill in here"))
     status = models.BooleanField(default=False, verbose_name=_("Status"))
+    path = models.CharField(max_length=255, default="", editable=False, db_index=True, verbose_name=_("Path"),
+                            help_text=_("Ids of the ancestors and of the category, e.g. 1/4/9/"))
+    depth = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name=_("Depth"))
 
     def __str__(self):
         return self.title
 
+    def get_parent_path(self) -> str:
+        if self.parent_id is None:
+            return ""
+        return Category.objects.values_list("path", flat=True).get(pk=self.parent_id)
+
+    def clean(self):
+        if self.path and self.get_parent_path().startswith(self.path):
+            raise ValidationError({"parent": _("A category cannot be moved under itself or its descendants.")})
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the category and keeps the materialized path of it and of its descendants up to date,
+        so a subtree is found with one indexed prefix lookup on path.
+        """
+        with transaction.atomic():
+            old_path, old_depth = Category.objects.filter(pk=self.pk).values_list("path", "depth").first() or ("", 0)
+            parent_path = self.get_parent_path()
+            if old_path and parent_path.startswith(old_path):
+                raise ValueError("A category cannot be moved under itself or its descendants.")
+            super().save(*args, **kwargs)
+            path = f"{parent_path}{self.pk}/"
+            self.path, self.depth = path, path.count("/") - 1
+            if path == old_path:
+                return
+            Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            if old_path:
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(path), Substr("path", len(old_path) + 1)),
+                    depth=F("depth") + self.depth - old_depth
+                )
+
     class Meta:
         ordering = ["-id"]
         verbose_name = _("Category")
         verbose_name_plural = _("Categories")
 
     objects = CategoryManager()
+
+
+class MediaTombstone(models.Model):
+    name = models.CharField(max_length=255, unique=True, verbose_name=_("Name"),
+                            help_text=_("Storage name of a media file waiting to be deleted"))
+    create = models.DateTimeField(auto_now_add=True, verbose_name=_("Create time"))
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = _("Media tombstone")
+        verbose_name_plural = _("Media tombstones")
+
+
+class ImageUpload(models.Model):
+    """
+    A resumable, chunked upload of a blog image. Chunks are appended to a temporary file, the
+    finished upload is referenced by its id when the blog is created.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    user = models.ForeignKey(user, on_delete=models.CASCADE, related_name="image_uploads", verbose_name=_("User"))
+    filename = models.CharField(max_length=255, verbose_name=_("File name"))
+    size = models.PositiveIntegerField(verbose_name=_("Size"), help_text=_("Total size in bytes"))
+    offset = models.PositiveIntegerField(default=0, verbose_name=_("Offset"), help_text=_("Bytes received so far"))
+    sha256 = models.CharField(max_length=64, blank=True, verbose_name=_("SHA-256"))
+    completed = models.BooleanField(default=False, verbose_name=_("Completed"))
+    create = models.DateTimeField(auto_now_add=True, verbose_name=_("Create time"))
+
+    def __str__(self):
+        return self.filename
+
+    @property
+    def path(self) -> str:
+        directory = getattr(settings, "FILE_UPLOAD_TEMP_DIR", None) or gettempdir()
+        return join(directory, "blog-uploads", f"{self.id}.part")
+
+    class Meta:
+        verbose_name = _("Image upload")
+        verbose_name_plural = _("Image uploads")
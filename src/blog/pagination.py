@@ -1,7 +1,146 @@
-from rest_framework.pagination import LimitOffsetPagination
+from json import dumps, loads
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination, CursorPagination, Cursor, _reverse_ordering
+from extensions.conditional import make_etag
+from extensions.response_cache import generations
 
 
 class BlogLimitOffsetPagination(LimitOffsetPagination):
     default_limit = 20
     max_limit = 20
 
+
+class BlogCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (publish, updated, id), following Blog.Meta.ordering with id as a tie-breaker.
+    The cursor carries the full position of the boundary row, so no offset or count is ever needed.
+    Orderings that are not a prefix of a keyset ordering, and querysets ranked by the search index,
+    fall back to limit/offset pagination.
+    """
+
+    page_size = 20
+    ordering = ("-publish", "-updated", "-id")
+    keyset_orderings = (("-publish", "-updated", "-id"), ("publish", "updated", "id"))
+    fallback_class = BlogLimitOffsetPagination
+
+    fallback = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.fallback = None
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.ordering = self.get_keyset_ordering(self.get_ordering(request, queryset, view))
+        if self.ordering is None or "search_rank" in queryset.query.extra:
+            self.fallback = self.fallback_class()
+            page = self.fallback.paginate_queryset(queryset, request, view)
+            self.display_page_controls = self.fallback.display_page_controls
+            return page
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.get_position_from_cursor(self.cursor, queryset.model)
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position, reverse))
+
+        # Fetch one extra row to find out whether a following page exists.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next, self.has_previous = position is not None, has_following
+        else:
+            self.has_next, self.has_previous = has_following, position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_keyset_ordering(self, ordering):
+        """
+        Returns the keyset ordering the requested ordering is a prefix of, or None if there is none.
+        """
+        for keyset_ordering in self.keyset_orderings:
+            if keyset_ordering[:len(ordering)] == tuple(ordering):
+                return keyset_ordering
+        return None
+
+    def get_keyset_filter(self, position, reverse):
+        """
+        Builds (a < x) OR (a = x AND b < y) OR ... honouring the direction of each ordering field.
+        """
+        keyset_filter, equal = Q(), {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") != reverse else "gt"
+            keyset_filter |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return keyset_filter
+
+    def get_position_from_cursor(self, cursor, model):
+        if cursor is None or cursor.position is None:
+            return None
+        try:
+            position = loads(cursor.position)
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+            fields = (model._meta.get_field(field.lstrip("-")) for field in self.ordering)
+            return [field.to_python(value) for field, value in zip(fields, position)]
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = (field.lstrip("-") for field in ordering)
+        return dumps([instance._meta.get_field(name).value_to_string(instance) for name in fields])
+
+    def get_next_link(self):
+        if self.fallback is not None:
+            return self.fallback.get_next_link()
+        if not self.has_next or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if self.fallback is not None:
+            return self.fallback.get_previous_link()
+        if not self.has_previous or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.fallback is not None:
+            return self.fallback.get_html_context()
+        return super().get_html_context()
+
+    def get_page_validators(self, queryset, request, view=None):
+        """
+        Paginates a lightweight queryset of blogs and returns (etag, None) of the page, built from the
+        id, updated, like_count and comment_count of its rows, its links and the response cache generations
+        of the view, which every change to what a list renders bumps: removals, author and category
+        renames included. No Last-Modified is given, no single timestamp follows all of those.
+        """
+        page = self.paginate_queryset(queryset, request, view) or []
+        count = self.fallback.count if self.fallback is not None else None
+        rows = [(blog.id, blog.updated.isoformat(), blog.like_count, blog.comment_count) for blog in page]
+        versions = generations.get_many(view.get_cache_generations()) if view is not None else None
+        etag = make_etag(rows, count, self.get_next_link(), self.get_previous_link(), versions)
+        return etag, None
@@ -0,0 +1,211 @@
+import logging
+from base64 import b64encode
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from hashlib import md5
+from io import BytesIO
+from multiprocessing import get_context
+from threading import Lock
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction, close_old_connections
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Pillow format and save options of each rendition format.
+RENDITION_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+PLACEHOLDER_WIDTH = 16
+
+
+def render(path: str, widths) -> dict:
+    """
+    Renders the image at path to every format at every width not larger than the original, plus a
+    blurred placeholder data URI. Runs in a worker process, so it only needs Pillow.
+    Returns {"variants": {format: {width: bytes}}, "placeholder": str}.
+    """
+    with Image.open(path) as image:
+        largest = min(max(widths), image.width)
+        # Lets the JPEG decoder scale down by a power of two while decoding, far cheaper than a full decode.
+        image.draft("RGB", (largest, largest * image.height // image.width))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    variants = {name: {} for name in RENDITION_FORMATS}
+    # Resize from the largest width down, each step resampling the previous, smaller, result.
+    for width in sorted({min(width, image.width) for width in widths}, reverse=True):
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+        for name, (image_format, options) in RENDITION_FORMATS.items():
+            buffer = BytesIO()
+            frame = image.convert("RGB") if image_format == "JPEG" else image
+            frame.save(buffer, image_format, **options)
+            variants[name][width] = buffer.getvalue()
+    placeholder = image.resize((PLACEHOLDER_WIDTH, max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))))
+    buffer = BytesIO()
+    placeholder.save(buffer, "WEBP", quality=30)
+    return {"variants": variants, "placeholder": f"data:image/webp;base64,{b64encode(buffer.getvalue()).decode()}"}
+
+
+def render_many(paths, widths) -> list:
+    """
+    Renders each of paths with render() in one task, None standing for the images that failed.
+    """
+    results = []
+    for path in paths:
+        try:
+            results.append(render(path, widths))
+        except Exception:
+            logger.exception("Rendering the image %s failed.", path)
+            results.append(None)
+    return results
+
+
+def get_rendition_names(renditions: dict) -> list:
+    return [name for fmt in RENDITION_FORMATS for name in renditions.get(fmt, {}).values()]
+
+
+class RenditionPipeline:
+    """
+    Renders resized WebP and JPEG variants of Blog.image in a pool of worker processes, off the
+    request thread, and records their storage names in Blog.renditions:
+    {"source": image name, "placeholder": data URI, "webp": {width: name}, "jpeg": {width: name}}.
+    With BLOG_IMAGE_RENDITION_WORKERS = 0 images are rendered in the calling process instead.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = Lock()
+
+    @staticmethod
+    def get_widths():
+        return getattr(settings, "BLOG_IMAGE_RENDITION_WIDTHS", (320, 640, 1024, 1600))
+
+    @staticmethod
+    def create_executor(workers: int):
+        # Worker processes are spawned rather than forked, the web process runs threads of its own.
+        return ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+
+    def get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self.create_executor(getattr(settings, "BLOG_IMAGE_RENDITION_WORKERS", 2))
+            return self._executor
+
+    def submit(self, blog_id: int, source: str):
+        """
+        Queues the rendering of source, the current image of the blog. Call it once the blog is committed.
+        """
+        if not source or not default_storage.exists(source):
+            return
+        if not getattr(settings, "BLOG_IMAGE_RENDITION_WORKERS", 2):
+            self.store(blog_id, source, render(default_storage.path(source), self.get_widths()))
+            return
+        future = self.get_executor().submit(render, default_storage.path(source), self.get_widths())
+        future.add_done_callback(partial(self._store_result, blog_id, source))
+
+    def submit_many(self, blogs, batch_size: int = 50):
+        """
+        Queues the rendering of the images of committed blogs, given as (id, image) pairs, in tasks of
+        batch_size images rather than one per blog. An image shared by several blogs is rendered once.
+        """
+        batch = {}
+        for blog_id, source in blogs:
+            if source not in batch and len(batch) >= batch_size:
+                self._submit_batch(batch)
+                batch = {}
+            if source:
+                batch.setdefault(source, []).append(blog_id)
+        if batch:
+            self._submit_batch(batch)
+
+    def _submit_batch(self, batch: dict):
+        batch = {source: blog_ids for source, blog_ids in batch.items() if default_storage.exists(source)}
+        paths = [default_storage.path(source) for source in batch]
+        if not paths:
+            return
+        if not getattr(settings, "BLOG_IMAGE_RENDITION_WORKERS", 2):
+            self._store_batch(batch, render_many(paths, self.get_widths()))
+            return
+        future = self.get_executor().submit(render_many, paths, self.get_widths())
+        future.add_done_callback(partial(self._store_batch_result, batch))
+
+    def _store_batch_result(self, batch, future):
+        close_old_connections()
+        try:
+            self._store_batch(batch, future.result())
+        except Exception:
+            logger.exception("Rendering the images of blogs %s failed.", sorted(sum(batch.values(), [])))
+        finally:
+            close_old_connections()
+
+    def _store_batch(self, batch: dict, results: list):
+        for (source, blog_ids), result in zip(batch.items(), results):
+            if result is None:
+                continue
+            for blog_id in blog_ids:
+                try:
+                    self.store(blog_id, source, result)
+                except Exception:
+                    logger.exception("Storing the renditions of blog %s failed.", blog_id)
+
+    def _store_result(self, blog_id, source, future):
+        close_old_connections()
+        try:
+            self.store(blog_id, source, future.result())
+        except Exception:
+            logger.exception("Rendering the image of blog %s failed.", blog_id)
+        finally:
+            close_old_connections()
+
+    def store(self, blog_id: int, source: str, result: dict) -> bool:
+        """
+        Saves the rendered variants and records them, unless the image of the blog changed meanwhile.
+        Returns False if the result was discarded.
+        """
+        from blog.cache import invalidate_blogs
+        from blog.media import media_collector
+        from blog.models import Blog
+
+        token = md5(source.encode()).hexdigest()[:8]
+        renditions = {"source": source, "placeholder": result["placeholder"]}
+        for fmt, variants in result["variants"].items():
+            renditions[fmt] = {
+                str(width): default_storage.save(f"blogs/renditions/{blog_id}-{token}-{width}.{fmt}", ContentFile(data))
+                for width, data in variants.items()
+            }
+        with transaction.atomic():
+            blogs = Blog.objects.select_for_update().filter(pk=blog_id, image=source)
+            blog = blogs.values("slug", "renditions").first()
+            if blog is None:
+                media_collector.bury(get_rendition_names(renditions))
+                return False
+            # Not a change of the content, updated stays: it orders the keyset cursors and the updated_since export.
+            blogs.update(renditions=renditions)
+            media_collector.bury(get_rendition_names(blog["renditions"]))
+            invalidate_blogs(blog["slug"])
+        return True
+
+    def backfill(self, blogs, workers: int):
+        """
+        Renders the images of the given (id, image) pairs with a dedicated pool, yielding
+        (blog id, error or None) as each one finishes.
+        """
+        with self.create_executor(workers) as executor:
+            futures = {
+                executor.submit(render, default_storage.path(source), self.get_widths()): (blog_id, source)
+                for blog_id, source in blogs if source and default_storage.exists(source)
+            }
+            for future in as_completed(futures):
+                blog_id, source = futures[future]
+                try:
+                    self.store(blog_id, source, future.result())
+                except Exception as error:
+                    yield blog_id, error
+                else:
+                    yield blog_id, None
+
+
+rendition_pipeline = RenditionPipeline()
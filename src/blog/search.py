@@ -0,0 +1,164 @@
+from re import findall
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+from rest_framework.filters import SearchFilter
+
+
+class BaseSearchBackend:
+    """
+    Token index over the title, summary, body and author name of blogs, kept in the ``blog_search`` table.
+    """
+
+    table = "blog_search"
+
+    def update(self, blog_ids):
+        """
+        (Re)indexes the given blogs.
+        """
+        raise NotImplementedError
+
+    def remove(self, blog_ids):
+        raise NotImplementedError
+
+    def rebuild(self):
+        """
+        Drops every entry and indexes all blogs again.
+        """
+        raise NotImplementedError
+
+    def search(self, queryset, query: str):
+        """
+        Joins the index into the queryset, keeping the blogs matching the query, and orders them by
+        the ``search_rank`` extra select, most relevant first.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def get_terms(query: str) -> list:
+        return findall(r"\w+", query)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    tsvector documents behind a GIN index, weighted title > summary, author > body.
+    """
+
+    config = "simple"
+    document = (
+        "setweight(to_tsvector(%(config)s, b.title), 'A') || "
+        "setweight(to_tsvector(%(config)s, b.summary), 'B') || "
+        "setweight(to_tsvector(%(config)s, u.first_name || ' ' || u.last_name), 'B') || "
+        "setweight(to_tsvector(%(config)s, b.body), 'C')"
+    )
+
+    def _insert(self, where: str, params: dict):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table} (blog_id, document) "
+                f"SELECT b.id, {self.document} FROM blog_blog b JOIN account_user u ON u.id = b.author_id "
+                f"{where} ON CONFLICT (blog_id) DO UPDATE SET document = EXCLUDED.document",
+                {"config": self.config, **params}
+            )
+
+    def update(self, blog_ids):
+        self._insert("WHERE b.id = ANY(%(ids)s)", {"ids": list(blog_ids)})
+
+    def remove(self, blog_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE blog_id = ANY(%s)", [list(blog_ids)])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {self.table}")
+        self._insert("", {})
+
+    def search(self, queryset, query):
+        params = [self.config, " & ".join(f"{term}:*" for term in self.get_terms(query))]
+        return queryset.extra(
+            tables=[self.table],
+            where=[f"{self.table}.blog_id = blog_blog.id", f"{self.table}.document @@ to_tsquery(%s, %s)"],
+            params=params,
+            select={"search_rank": f"-ts_rank_cd({self.table}.document, to_tsquery(%s, %s))"},
+            select_params=params,
+        ).order_by("search_rank", "-id")
+
+
+class SqliteSearchBackend(BaseSearchBackend):
+    """
+    FTS5 virtual table keyed by the blog id, ranked with bm25.
+    """
+
+    weights = (10.0, 4.0, 1.0, 4.0)
+
+    def _insert(self, where: str, params: list):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, title, summary, body, author) "
+                f"SELECT b.id, b.title, b.summary, b.body, u.first_name || ' ' || u.last_name "
+                f"FROM blog_blog b JOIN account_user u ON u.id = b.author_id {where}",
+                params
+            )
+
+    def update(self, blog_ids):
+        blog_ids = list(blog_ids)
+        if not blog_ids:
+            return
+        self.remove(blog_ids)
+        self._insert(f"WHERE b.id IN ({', '.join(['%s'] * len(blog_ids))})", blog_ids)
+
+    def remove(self, blog_ids):
+        blog_ids = list(blog_ids)
+        if not blog_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(blog_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", blog_ids)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+        self._insert("", [])
+
+    def search(self, queryset, query):
+        return queryset.extra(
+            tables=[self.table],
+            where=[f"blog_blog.id = {self.table}.rowid + 0", f"{self.table} MATCH %s"],
+            params=[" ".join(f'"{term}"*' for term in self.get_terms(query))],
+            select={"search_rank": f"bm25({self.table}, {', '.join(map(str, self.weights))})"},
+        ).order_by("search_rank", "-id")
+
+
+search_backends = {
+    "postgresql": PostgresSearchBackend,
+    "sqlite": SqliteSearchBackend,
+}
+
+
+def get_search_backend():
+    """
+    Returns the configured search backend, or the one matching the database vendor.
+    None means the database has no full-text support and SearchFilter should be used.
+    """
+    backend = getattr(settings, "BLOG_SEARCH_BACKEND", None)
+    if backend is not None:
+        return import_string(backend)()
+    backend = search_backends.get(connection.vendor)
+    return backend() if backend is not None else None
+
+
+class BlogSearchFilter(SearchFilter):
+    """
+    Answers ?search= from the full-text index and orders the results by relevance.
+    Falls back to the icontains search of SearchFilter when no backend is available.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        backend = get_search_backend()
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+        terms = backend.get_terms(" ".join(terms))
+        if not terms:
+            return queryset
+        return backend.search(queryset, " ".join(terms))
@@ -1,45 +1,123 @@
+from django.db.models import Prefetch
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from blog.models import Blog, Category
+from blog.models import Blog, Category, ImageUpload
+from blog.renditions import RENDITION_FORMATS
+from blog.uploads import ChunkedUploadFile
+from blog.visits import visit_buffer
 
 
 class BlogsListSerializer(serializers.ModelSerializer):
     author = serializers.SerializerMethodField(method_name='get_author')
     category = serializers.SerializerMethodField(method_name='get_category')
+    srcset = serializers.SerializerMethodField(method_name='get_srcset')
+    placeholder = serializers.SerializerMethodField(method_name='get_placeholder')
 
     def get_author(self, obj):
         return {"first_name": obj.author.first_name, "last_name": obj.author.last_name}
 
     def get_category(self, obj):
-        return [cat.title for cat in obj.category.get_queryset()]
+        return [cat.title for cat in obj.category.all()]
+
+    def get_srcset(self, obj):
+        """
+        Returns {format: "url 320w, url 640w, ..."} for the rendered variants of the image, or None
+        until they are rendered.
+        """
+        if obj.renditions.get("source") != obj.image.name:
+            return None
+        request = self.context.get("request")
+        srcset = {}
+        for fmt in RENDITION_FORMATS:
+            urls = []
+            for width, name in sorted(obj.renditions.get(fmt, {}).items(), key=lambda item: int(item[0])):
+                url = default_storage.url(name)
+                urls.append(f"{request.build_absolute_uri(url) if request else url} {width}w")
+            srcset[fmt] = ", ".join(urls)
+        return srcset
+
+    def get_placeholder(self, obj):
+        return obj.renditions.get("placeholder")
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Load the author and category titles up front and select only the columns this serializer emits,
+        plus the ones the cursor paginator needs to build its position.
+        """
+        return queryset.select_related("author").only(
+            "title", "slug", "image", "renditions", "summary", "like_count", "comment_count", "publish", "updated",
+            "author__first_name", "author__last_name"
+        ).prefetch_related(Prefetch("category", queryset=Category.objects.only("title")))
 
     class Meta:
         model = Blog
-        exclude = ['id', 'likes', 'create', 'body', 'status', 'updated', 'publish', 'visits', 'special']
+        exclude = ['id', 'likes', 'create', 'body', 'status', 'updated', 'publish', 'visits', 'special', 'renditions']
 
 
 class BlogCreateSerializer(serializers.ModelSerializer):
     category = serializers.SlugRelatedField(many=True, queryset=Category.objects.all(), slug_field='id')
+    image = serializers.ImageField(required=False)
+    image_upload = serializers.PrimaryKeyRelatedField(queryset=ImageUpload.objects.filter(completed=True),
+                                                      required=False, write_only=True,
+                                                      help_text="Token of a completed chunked upload")
+
+    def validate_image_upload(self, upload):
+        if upload.user_id != self.context["request"].user.pk:
+            self.fields["image_upload"].fail("does_not_exist", pk_value=upload.pk)
+        return upload
+
+    def validate(self, attrs):
+        if ("image" in attrs) == ("image_upload" in attrs):
+            raise serializers.ValidationError({"image": "Send either an image or an image_upload token."})
+        return attrs
+
+    def create(self, validated_data):
+        upload = validated_data.pop("image_upload", None)
+        if upload is None:
+            return super().create(validated_data)
+        validated_data["image"] = image = ChunkedUploadFile(upload)
+        try:
+            blog = super().create(validated_data)
+        finally:
+            image.close()
+        upload.delete()
+        return blog
 
     class Meta:
         model = Blog
-        fields = ['title', 'body', 'image', 'summary', 'category', 'publish', 'special', 'status']
+        fields = ['title', 'body', 'image', 'image_upload', 'summary', 'category', 'publish', 'special', 'status']
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    def validate_size(self, size):
+        max_size = getattr(settings, "BLOG_UPLOAD_MAX_SIZE", 30 * 1024 * 1024)
+        if size > max_size:
+            raise serializers.ValidationError(f"Uploads are limited to {max_size} bytes.")
+        return size
+
+    class Meta:
+        model = ImageUpload
+        fields = ['id', 'filename', 'size', 'offset', 'sha256', 'completed']
+        read_only_fields = ['offset', 'sha256', 'completed']
 
 
 class BlogDetailUpdateDeleteSerializer(serializers.ModelSerializer):
     slug = serializers.ReadOnlyField()
     author = serializers.SerializerMethodField(method_name='get_author')
-    likes = serializers.SerializerMethodField(method_name='get_likes')
+    likes = serializers.ReadOnlyField(source="like_count")
+    visits = serializers.SerializerMethodField(method_name='get_visits')
 
     def get_author(self, obj):
         return {"first_name": obj.author.first_name, "last_name": obj.author.last_name}
 
-    def get_likes(self, obj):
-        return obj.likes.count()
+    def get_visits(self, obj):
+        return obj.visits + visit_buffer.pending(obj.pk)
 
     class Meta:
         model = Blog
-        exclude = ["create", "updated"]
-        read_only_fields = ["likes"]
+        exclude = ["create", "updated", "like_count", "renditions"]
 
 
 class CategoryListSerializer(serializers.ModelSerializer):
@@ -50,4 +128,4 @@ class CategoryListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Category
-        fields = ["parent", "title"]
+        fields = ["parent", "title", "slug", "depth"]
@@ -1,9 +1,18 @@
-from os import getcwd, remove
-from django.db.models.signals import pre_save, post_delete
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.utils.text import slugify
 from extensions.code_generator import slug_generator
-from .models import Blog
+from extensions.tracking import changed, track_changes
+from .cache import invalidate_blogs, invalidate_categories
+from .media import media_collector
+from .models import Blog, Category, ImageUpload
+from .renditions import rendition_pipeline, get_rendition_names
+from .search import get_search_backend
+from .uploads import remove_upload_file
 
 
 @receiver(pre_save, sender=Blog)
@@ -12,6 +21,123 @@ def save_slug_blog(sender, instance, *args, **kwargs):
         instance.slug = slugify(slug_generator(10))
 
 
+@receiver(pre_save, sender=Blog)
+def find_replaced_image(sender, instance, raw=False, update_fields=None, *args, **kwargs):
+    """
+    Remembers the previous image and its renditions when the image is replaced. They are buried in
+    post_save: a save outside a transaction commits with its UPDATE, and collecting before it would
+    find the old image still referenced and drop its tombstone, leaking the file.
+    """
+    instance._replaced_media = []
+    if raw or instance.pk is None or update_fields is not None and "image" not in update_fields:
+        return
+    old = Blog.objects.filter(pk=instance.pk).values_list("image", "renditions").first()
+    if old is not None and old[0] != instance.image.name:
+        instance._replaced_media = [old[0], *get_rendition_names(old[1])]
+
+
+@receiver(post_save, sender=Blog)
+def bury_replaced_image(sender, instance, *args, **kwargs):
+    media_collector.bury(instance.__dict__.pop("_replaced_media", []))
+
+
 @receiver(post_delete, sender=Blog)
-def delete_media_blog(sender, instance, *args, **kwargs):
-    remove(getcwd() + instance.image.url)
+def bury_blog_media(sender, instance, *args, **kwargs):
+    media_collector.bury([instance.image.name, *get_rendition_names(instance.renditions)])
+
+
+@receiver(post_save, sender=Blog)
+def render_blog_image(sender, instance, raw=False, *args, **kwargs):
+    if raw or instance.image.name == instance.renditions.get("source"):
+        return
+    blog_id, source = instance.pk, instance.image.name
+    transaction.on_commit(lambda: rendition_pipeline.submit(blog_id, source))
+
+
+@receiver(m2m_changed, sender=Blog.likes.through)
+def sync_like_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Recomputes like_count for likes changed through the M2M manager (e.g. the admin).
+    Blog.like and Blog.unlike write the through table directly and keep the counter themselves.
+    """
+    if action == "pre_clear" and reverse:
+        instance._cleared_blog_ids = list(instance.blogs_like.values_list("id", flat=True))
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        blog_ids = [instance.pk]
+    elif pk_set is not None:
+        blog_ids = pk_set
+    else:
+        blog_ids = instance.__dict__.pop("_cleared_blog_ids", [])
+    likes = sender.objects.filter(blog_id=OuterRef("pk")).values("blog_id")
+    count = likes.annotate(count=Count("id")).values("count")
+    blogs = Blog.objects.filter(pk__in=blog_ids)
+    blogs.update(like_count=Coalesce(Subquery(count), Value(0)))
+    invalidate_blogs(*blogs.values_list("slug", flat=True))
+
+
+@receiver(pre_delete, sender=get_user_model())
+def delete_user_likes(sender, instance, *args, **kwargs):
+    blogs = Blog.objects.filter(likes=instance)
+    invalidate_blogs(*blogs.values_list("slug", flat=True))
+    blogs.update(like_count=F("like_count") - 1)
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+def invalidate_blog_cache(sender, instance, *args, **kwargs):
+    invalidate_blogs(instance.slug)
+
+
+@receiver(m2m_changed, sender=Blog.category.through)
+def invalidate_blog_category_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        invalidate_blogs(instance.slug)
+    else:
+        invalidate_blogs(*Blog.objects.filter(pk__in=pk_set or ()).values_list("slug", flat=True))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, *args, **kwargs):
+    invalidate_categories()
+
+
+@receiver(post_save, sender=Blog)
+def index_blog(sender, instance, raw=False, *args, **kwargs):
+    backend = get_search_backend()
+    if backend is not None and not raw:
+        backend.update([instance.pk])
+
+
+@receiver(post_delete, sender=Blog)
+def unindex_blog(sender, instance, *args, **kwargs):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.remove([instance.pk])
+
+
+track_changes(get_user_model(), "first_name", "last_name")
+
+
+@receiver(post_save, sender=get_user_model())
+def update_author_blogs(sender, instance, created, raw=False, *args, **kwargs):
+    """
+    The author name is part of the search index and of cached blog responses, so renaming a user
+    reindexes their blogs and drops their cached responses. Saves that keep the name leave them be.
+    """
+    if created or raw or not changed(instance, "first_name", "last_name"):
+        return
+    blogs = Blog.objects.filter(author=instance)
+    invalidate_blogs(*blogs.values_list("slug", flat=True))
+    backend = get_search_backend()
+    if backend is not None:
+        backend.update(blogs.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=ImageUpload)
+def delete_upload_file(sender, instance, *args, **kwargs):
+    remove_upload_file(instance)
@@ -1,3 +1,833 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+from base64 import b64encode
+from hashlib import sha256
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from time import time
+from unittest.mock import patch
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from blog.export import BlogExporter
+from blog.imports import BlogImporter
+from blog.models import Blog, Category, ImageUpload, MediaTombstone
+from blog.renditions import rendition_pipeline, get_rendition_names, render
+from blog.uploads import receive_chunk
+from blog.visits import VisitBuffer, visit_buffer
+from extensions.response_cache import cache_stats, get_cache_stats
 
-# Create your tests here.
+user = get_user_model()
+
+
+class BlogAPITestCase(APITestCase):
+    def setUp(self):
+        # Cached responses would otherwise leak between tests, as generations only move on commit.
+        for backend in caches.all():
+            backend.clear()
+
+
+class BlogListQueryCountTest(BlogAPITestCase):
+    """
+    The list endpoints must take a fixed number of queries per page, whatever the page size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title="Python", slug="python", status=True)
+        other = Category.objects.create(title="Django", slug="django", status=True)
+        for index in range(15):
+            author = user.objects.create_user(phone=f"98912000{index:04d}", first_name=f"author{index}")
+            blog = Blog.objects.create(author=author, title=f"title {index}", body="body", summary="summary",
+                                       image="blogs/image.jpg", status="p")
+            blog.category.add(cls.category, other)
+
+    def test_blogs_list_query_count(self):
+        # validators, page, categories
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("blog:list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 15)
+        self.assertEqual(sorted(response.data["results"][0]["category"]), ["Django", "Python"])
+
+    def test_category_blog_query_count(self):
+        # validators (category, page), category, blogs, categories
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("blog:category-blog", kwargs={"slug": self.category.slug}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 15)
+        self.assertIn("first_name", response.data["results"][0]["author"])
+
+
+class BlogCursorPaginationTest(BlogAPITestCase):
+    """
+    Keyset pagination must be stable across identical publish times and fall back for other orderings.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = user.objects.create_user(phone="989120000000")
+        publish = timezone.now()
+        for index in range(25):
+            Blog.objects.create(author=author, title=f"title {index}", body="body", summary="summary",
+                                image="blogs/image.jpg", status="p", publish=publish)
+
+    def test_walks_all_pages_without_duplicates(self):
+        first = self.client.get(reverse("blog:list")).data
+        self.assertNotIn("count", first)
+        self.assertIsNone(first["previous"])
+        second = self.client.get(first["next"]).data
+        self.assertIsNone(second["next"])
+        slugs = [blog["slug"] for blog in first["results"] + second["results"]]
+        self.assertEqual(len(slugs), 25)
+        self.assertEqual(len(set(slugs)), 25)
+        back = self.client.get(second["previous"]).data
+        self.assertEqual(back["results"], first["results"])
+
+    def test_new_posts_do_not_shift_next_page(self):
+        first = self.client.get(reverse("blog:list")).data
+        expected = self.client.get(first["next"]).data["results"]
+        Blog.objects.create(author=user.objects.first(), title="new", body="body", summary="summary",
+                            image="blogs/image.jpg", status="p")
+        self.assertEqual(self.client.get(first["next"]).data["results"], expected)
+
+    def test_non_keyset_ordering_falls_back_to_limit_offset(self):
+        response = self.client.get(reverse("blog:list"), {"ordering": "special"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 25)
+
+    def test_invalid_cursor(self):
+        for cursor in ("cD1nYXJiYWdl", b64encode(b'p=["x", "y", "z"]').decode()):
+            response = self.client.get(reverse("blog:list"), {"cursor": cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class LikeBlogTest(BlogAPITestCase):
+    """
+    Liking keeps Blog.like_count in step with the through table on every write path.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = user.objects.create_user(phone="989120000001")
+        self.blog = Blog.objects.create(author=self.user, title="title", body="body", summary="summary",
+                                        image="blogs/image.jpg", status="p")
+        self.url = reverse("blog:like", kwargs={"pk": self.blog.pk})
+        self.client.force_authenticate(self.user)
+
+    def assertLikeCount(self, count):
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.like_count, count)
+        self.assertEqual(self.blog.likes.count(), count)
+
+    def test_like_and_unlike_are_idempotent(self):
+        self.client.post(self.url)
+        self.client.post(self.url)
+        self.assertLikeCount(1)
+        self.client.delete(self.url)
+        self.client.delete(self.url)
+        self.assertLikeCount(0)
+
+    def test_get_toggles_like(self):
+        self.client.get(self.url)
+        self.assertLikeCount(1)
+        self.client.get(self.url)
+        self.assertLikeCount(0)
+
+    def test_m2m_manager_and_user_delete_keep_count(self):
+        other = user.objects.create_user(phone="989120000002")
+        self.blog.likes.add(self.user, other)
+        self.assertLikeCount(2)
+        other.blogs_like.clear()
+        self.assertLikeCount(1)
+        self.blog.like(other)
+        other.delete()
+        self.assertLikeCount(1)
+
+    def test_detail_serves_counter(self):
+        self.addCleanup(visit_buffer.flush)
+        self.blog.like(self.user)
+        # validators, blog with author, categories
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("blog:detail", kwargs={"slug": self.blog.slug}))
+        self.assertEqual(response.data["likes"], 1)
+
+
+class VisitBufferTest(BlogAPITestCase):
+    """
+    Visits are counted per blog in the shared cache, served with the pending delta and written back in one batch.
+    """
+
+    def setUp(self):
+        super().setUp()
+        author = user.objects.create_user(phone="989120000003")
+        self.blogs = [Blog.objects.create(author=author, title=f"title {index}", body="body", summary="summary",
+                                          image="blogs/image.jpg", status="p") for index in range(2)]
+        self.addCleanup(visit_buffer.flush)
+
+    def test_detail_counts_visit_without_writing_row(self):
+        url = reverse("blog:detail", kwargs={"slug": self.blogs[0].slug})
+        # Authenticated detail responses are not cached, so each one is rendered.
+        self.client.force_authenticate(self.blogs[0].author)
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.data["visits"], 2)
+        self.blogs[0].refresh_from_db()
+        self.assertEqual(self.blogs[0].visits, 0)
+
+    def test_flush_merges_per_blog(self):
+        visit_buffer.add(self.blogs[0].pk, 3)
+        visit_buffer.add(self.blogs[1].pk)
+        visit_buffer.add(self.blogs[0].pk)
+        with self.assertNumQueries(3):
+            self.assertEqual(visit_buffer.flush(), 2)
+        self.assertEqual(visit_buffer.pending(self.blogs[0].pk), 0)
+        self.assertEqual([blog.visits for blog in Blog.objects.order_by("id")], [4, 1])
+
+    def test_visits_outlive_the_worker(self):
+        visit_buffer.add(self.blogs[0].pk, 2)
+        # Another worker flushes the visits counted by one that was killed.
+        worker = VisitBuffer()
+        self.assertEqual(worker.pending(self.blogs[0].pk), 2)
+        self.assertEqual(worker.flush(), 1)
+        visit_buffer.add(self.blogs[0].pk)
+        self.assertEqual(worker.flush(), 1)
+        self.assertEqual(Blog.objects.get(pk=self.blogs[0].pk).visits, 3)
+        self.assertEqual(worker.flush(), 0)
+        # Buckets closed two flushes ago are deleted.
+        self.assertFalse(caches["visits"].has_key(f"visits:0:{self.blogs[0].pk}"))
+
+
+class BlogSearchTest(BlogAPITestCase):
+    """
+    ?search= is answered from the full-text index, which follows blog and author changes.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.author = user.objects.create_user(phone="989120000004", first_name="guido")
+        self.title_match = Blog.objects.create(author=self.author, title="python tips", body="body",
+                                               summary="summary", image="blogs/image.jpg", status="p")
+        self.body_match = Blog.objects.create(author=self.author, title="title", body="python everywhere",
+                                              summary="summary", image="blogs/image.jpg", status="p")
+
+    def search(self, query):
+        response = self.client.get(reverse("blog:list"), {"search": query})
+        self.assertEqual(response.status_code, 200)
+        return [blog["slug"] for blog in response.data["results"]]
+
+    def test_ranks_by_relevance(self):
+        self.assertEqual(self.search("pyth"), [self.title_match.slug, self.body_match.slug])
+        self.assertEqual(self.search("guido tips"), [self.title_match.slug])
+
+    def test_index_follows_saves(self):
+        self.body_match.body = "rust everywhere"
+        self.body_match.save()
+        self.assertEqual(self.search("python"), [self.title_match.slug])
+        self.author.first_name = "linus"
+        self.author.save()
+        self.assertEqual(self.search("linus rust"), [self.body_match.slug])
+
+    def test_saves_keeping_the_name_do_not_reindex(self):
+        with patch("blog.signals.get_search_backend") as get_backend:
+            self.author.last_login = timezone.now()
+            self.author.save()
+            user.objects.get(pk=self.author.pk).save()
+            get_backend.assert_not_called()
+            self.author.last_name = "van rossum"
+            self.author.save()
+            get_backend.assert_called_once()
+
+
+class ResponseCacheTest(BlogAPITestCase):
+    """
+    Public read endpoints are served from the cache until a write bumps a generation they depend on.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.author = user.objects.create_user(phone="989120000005", first_name="first")
+        self.category = Category.objects.create(title="Python", slug="python", status=True)
+        self.blog = Blog.objects.create(author=self.author, title="title", body="body", summary="summary",
+                                        image="blogs/image.jpg", status="p")
+        self.detail = reverse("blog:detail", kwargs={"slug": self.blog.slug})
+        self.addCleanup(visit_buffer.flush)
+
+    def test_hit_after_miss_without_queries(self):
+        self.assertEqual(self.client.get(reverse("blog:list"))["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("blog:list"))
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(self.client.get(reverse("blog:list"), {"ordering": "publish"})["X-Cache"], "MISS")
+
+    def test_blog_write_invalidates_lists_and_its_detail_only(self):
+        other = Blog.objects.create(author=self.author, title="other", body="body", summary="summary",
+                                    image="blogs/image.jpg", status="p")
+        other_detail = reverse("blog:detail", kwargs={"slug": other.slug})
+        for url in (reverse("blog:list"), reverse("blog:category-list"), self.detail, other_detail):
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blog.title = "changed"
+            self.blog.save()
+        response = self.client.get(reverse("blog:list"))
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertIn("changed", [blog["title"] for blog in response.data["results"]])
+        self.assertEqual(self.client.get(self.detail)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(other_detail)["X-Cache"], "HIT")
+        self.assertEqual(self.client.get(reverse("blog:category-list"))["X-Cache"], "HIT")
+
+    def test_category_and_like_invalidate(self):
+        self.client.get(reverse("blog:category-list"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(title="Django", slug="django", status=True)
+        self.assertEqual(len(self.client.get(reverse("blog:category-list")).data), 2)
+        self.client.get(self.detail)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blog.like(self.author)
+        self.assertEqual(self.client.get(self.detail).data["likes"], 1)
+
+    def test_detail_cached_for_anonymous_only_and_counts_visits(self):
+        self.client.get(self.detail)
+        self.assertEqual(self.client.get(self.detail)["X-Cache"], "HIT")
+        self.assertEqual(visit_buffer.pending(self.blog.pk), 2)
+        self.client.force_authenticate(self.author)
+        self.assertNotIn("X-Cache", self.client.get(self.detail))
+
+    def test_stats(self):
+        # Counts left in memory by earlier tests.
+        cache_stats.flush()
+        caches["default"].clear()
+        self.client.get(reverse("blog:category-list"))
+        self.client.get(reverse("blog:category-list"))
+        self.assertEqual(get_cache_stats(["CategoryList"]), {"CategoryList": {"hits": 0, "misses": 0}})
+        cache_stats.flush()
+        self.assertEqual(get_cache_stats(["CategoryList"]), {"CategoryList": {"hits": 1, "misses": 1}})
+
+
+class ConditionalGetTest(BlogAPITestCase):
+    """
+    ETags come from the counters of the rows and the response cache generations, so unchanged resources
+    answer 304 after one query and any change to what a response renders gives a new ETag.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.author = user.objects.create_user(phone="989120000006", is_superuser=True)
+        self.blog = Blog.objects.create(author=self.author, title="title", body="body", summary="summary",
+                                        image="blogs/image.jpg", status="p")
+        self.detail = reverse("blog:detail", kwargs={"slug": self.blog.slug})
+        self.client.force_authenticate(self.author)
+        self.addCleanup(visit_buffer.flush)
+
+    def test_detail_not_modified_until_liked(self):
+        etag = self.client.get(self.detail)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.blog.like(self.author)
+        self.assertEqual(self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_no_last_modified(self):
+        # updated misses likes, comments and removals, If-Modified-Since would answer 304 on stale data.
+        self.assertNotIn("Last-Modified", self.client.get(self.detail))
+        self.assertNotIn("Last-Modified", self.client.get(reverse("blog:list")))
+        since = http_date(time() + 60)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blog.like(self.author)
+        self.assertEqual(self.client.get(self.detail, HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+    def test_list_not_modified_until_unpublished(self):
+        etag = self.client.get(reverse("blog:list"))["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blog.status = "d"
+            self.blog.save()
+        self.assertEqual(self.client.get(reverse("blog:list"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_not_modified_until_author_renamed(self):
+        etag = self.client.get(reverse("blog:list"))["ETag"]
+        self.assertEqual(self.client.get(reverse("blog:list"), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = "renamed"
+            self.author.save()
+        self.assertEqual(self.client.get(reverse("blog:list"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_not_modified_until_page_changes(self):
+        etag = self.client.get(reverse("blog:list"))["ETag"]
+        self.assertEqual(self.client.get(reverse("blog:list"), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Blog.objects.create(author=self.author, title="new", body="body", summary="summary",
+                                image="blogs/image.jpg", status="p")
+        self.assertEqual(self.client.get(reverse("blog:list"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cached_list_answers_not_modified_without_queries(self):
+        self.client.logout()
+        etag = self.client.get(reverse("blog:list"))["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("blog:list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_if_match_on_write(self):
+        etag = self.client.get(self.detail)["ETag"]
+        self.blog.like(self.author)
+        data = {"title": "changed", "body": "body", "summary": "summary", "status": "p"}
+        response = self.client.patch(self.detail, data, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        etag = self.client.get(self.detail)["ETag"]
+        response = self.client.patch(self.detail, data, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(self.client.delete(self.detail, HTTP_IF_MATCH=etag).status_code, 412)
+
+
+class CategoryTreeTest(BlogAPITestCase):
+    """
+    Categories keep a materialized path, so subtrees are read with a prefix lookup.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.root = Category.objects.create(title="Programming", slug="programming", status=True)
+        self.python = Category.objects.create(title="Python", slug="python", parent=self.root, status=True)
+        self.django = Category.objects.create(title="Django", slug="django", parent=self.python, status=True)
+        self.other = Category.objects.create(title="Music", slug="music", status=True)
+        author = user.objects.create_user(phone="989120000007")
+        self.blog = Blog.objects.create(author=author, title="title", body="body", summary="summary",
+                                        image="blogs/image.jpg", status="p")
+        self.blog.category.add(self.django)
+
+    def test_paths_follow_moves(self):
+        self.assertEqual(self.django.path, f"{self.root.pk}/{self.python.pk}/{self.django.pk}/")
+        self.python.parent = self.other
+        self.python.save()
+        self.django.refresh_from_db()
+        self.assertEqual(self.django.path, f"{self.other.pk}/{self.python.pk}/{self.django.pk}/")
+        self.assertEqual(self.django.depth, 2)
+        self.python.parent = None
+        self.python.save()
+        self.django.refresh_from_db()
+        self.assertEqual((self.django.path, self.django.depth), (f"{self.python.pk}/{self.django.pk}/", 1))
+
+    def test_cannot_move_under_descendant(self):
+        self.root.parent = self.django
+        with self.assertRaises(ValueError):
+            self.root.save()
+
+    def test_category_blog_includes_descendants(self):
+        for category, count in ((self.root, 1), (self.python, 1), (self.django, 1), (self.other, 0)):
+            response = self.client.get(reverse("blog:category-blog", kwargs={"slug": category.slug}))
+            self.assertEqual(len(response.data["results"]), count)
+        self.blog.category.add(self.python)
+        response = self.client.get(reverse("blog:category-blog", kwargs={"slug": self.root.slug}))
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_category_list_is_one_query_in_tree_order(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("blog:category-list"))
+        self.assertEqual([category["slug"] for category in response.data], ["programming", "python", "django", "music"])
+        self.assertEqual(response.data[2]["parent"], {"title": "Python"})
+
+
+class ImageRenditionTest(BlogAPITestCase):
+    """
+    Saved blogs get resized variants of their image, which the list exposes as a srcset.
+    """
+
+    def setUp(self):
+        super().setUp()
+        media_root = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name, BLOG_IMAGE_RENDITION_WIDTHS=(320, 640),
+                                            BLOG_IMAGE_RENDITION_WORKERS=0, MEDIA_GC_INTERVAL=0))
+        buffer = BytesIO()
+        Image.new("RGB", (800, 400), "red").save(buffer, "JPEG")
+        image = default_storage.save("blogs/source.jpg", ContentFile(buffer.getvalue()))
+        self.author = user.objects.create_user(phone="989120000008")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blog = Blog.objects.create(author=self.author, title="title", body="body", summary="summary",
+                                            image=image, status="p")
+        self.blog.refresh_from_db()
+
+    def test_variants_are_rendered_after_commit(self):
+        renditions = self.blog.renditions
+        self.assertEqual(renditions["source"], self.blog.image.name)
+        self.assertEqual(set(renditions["webp"]), {"320", "640"})
+        with default_storage.open(renditions["jpeg"]["320"]) as file, Image.open(file) as image:
+            self.assertEqual(image.size, (320, 160))
+        self.assertTrue(renditions["placeholder"].startswith("data:image/webp;base64,"))
+
+    def test_list_emits_srcset(self):
+        result = self.client.get(reverse("blog:list")).data["results"][0]
+        self.assertRegex(result["srcset"]["webp"], r"^http://testserver/media/\S+\.webp 320w, \S+\.webp 640w$")
+        self.assertEqual(result["placeholder"], self.blog.renditions["placeholder"])
+
+    def test_storing_keeps_updated(self):
+        updated = self.blog.updated
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(rendition_pipeline.store(self.blog.pk, self.blog.image.name, {
+                "variants": {"webp": {320: b"data"}}, "placeholder": ""
+            }))
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.updated, updated)
+        self.assertEqual(set(self.blog.renditions["webp"]), {"320"})
+
+    def test_stale_result_is_discarded(self):
+        old = self.blog.renditions
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(rendition_pipeline.store(self.blog.pk, "blogs/other.jpg", {
+                "variants": {"webp": {320: b"data"}}, "placeholder": ""
+            }))
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.renditions, old)
+        self.assertEqual(len(default_storage.listdir("blogs/renditions")[1]), 4)
+
+    def test_backfill_command_renders_in_worker_processes(self):
+        old = get_rendition_names(self.blog.renditions)
+        Blog.objects.filter(pk=self.blog.pk).update(renditions={})
+        out = StringIO()
+        call_command("render_blog_images", workers=1, stdout=out)
+        self.assertIn("Rendered the images of 1 blogs, 0 failed.", out.getvalue())
+        self.blog.refresh_from_db()
+        self.assertEqual(set(self.blog.renditions["jpeg"]), {"320", "640"})
+        self.assertNotEqual(get_rendition_names(self.blog.renditions), old)
+
+
+class MediaGCTest(BlogAPITestCase):
+    """
+    Media files of deleted and replaced images are deleted through tombstones after commit.
+    """
+
+    def setUp(self):
+        super().setUp()
+        media_root = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name, MEDIA_GC_INTERVAL=0,
+                                            BLOG_IMAGE_RENDITION_WORKERS=0, BLOG_IMAGE_RENDITION_WIDTHS=(320,)))
+        self.author = user.objects.create_user(phone="989120000009")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blog = Blog.objects.create(author=self.author, title="title", body="body", summary="summary",
+                                            image=self.save_image("blogs/source.jpg"), status="p")
+        self.blog.refresh_from_db()
+
+    @staticmethod
+    def save_image(name):
+        buffer = BytesIO()
+        Image.new("RGB", (400, 200), "blue").save(buffer, "JPEG")
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_delete_removes_files_after_commit(self):
+        names = [self.blog.image.name, *get_rendition_names(self.blog.renditions)]
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.blog.delete()
+        self.assertTrue(all(default_storage.exists(name) for name in names))
+        self.assertEqual(MediaTombstone.objects.count(), 3)
+        for callback in callbacks:
+            callback()
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+        self.assertFalse(MediaTombstone.objects.exists())
+
+    def test_delete_with_missing_file(self):
+        default_storage.delete(self.blog.image.name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blog.delete()
+        self.assertFalse(MediaTombstone.objects.exists())
+
+    def test_replaced_image_and_renditions_are_collected(self):
+        old = [self.blog.image.name, *get_rendition_names(self.blog.renditions)]
+        self.blog.image = self.save_image("blogs/replacement.jpg")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blog.save()
+        self.blog.refresh_from_db()
+        self.assertFalse(any(default_storage.exists(name) for name in old))
+        self.assertEqual(self.blog.renditions["source"], "blogs/replacement.jpg")
+        self.assertTrue(all(default_storage.exists(name) for name in get_rendition_names(self.blog.renditions)))
+
+    def test_reconcile_finds_orphans(self):
+        orphan = default_storage.save("blogs/orphan.jpg", ContentFile(b"orphan"))
+        out = StringIO()
+        call_command("reconcile_media", grace=0, stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[0], orphan)
+        self.assertIn("Found 1 orphaned files.", out.getvalue())
+        call_command("reconcile_media", grace=3600, stdout=out)
+        self.assertIn("Found 0 orphaned files.", out.getvalue())
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("reconcile_media", grace=0, delete=True, stdout=StringIO())
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(self.blog.image.name))
+
+
+
+class MediaGCTransactionTest(APITransactionTestCase):
+    """
+    Replacing an image outside a transaction, where on_commit callbacks run right away.
+    """
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        media_root = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name, MEDIA_GC_INTERVAL=0,
+                                            BLOG_IMAGE_RENDITION_WORKERS=0, BLOG_IMAGE_RENDITION_WIDTHS=(320,)))
+        self.author = user.objects.create_user(phone="989120000009")
+        self.blog = Blog.objects.create(author=self.author, title="title", body="body", summary="summary",
+                                        image=MediaGCTest.save_image("blogs/source.jpg"), status="p")
+        self.blog.refresh_from_db()
+
+    def test_replaced_image_is_deleted(self):
+        old = [self.blog.image.name, *get_rendition_names(self.blog.renditions)]
+        self.assertEqual(len(old), 3)
+        self.blog.image = MediaGCTest.save_image("blogs/replacement.jpg")
+        self.blog.save()
+        self.assertFalse(any(default_storage.exists(name) for name in old))
+        self.assertFalse(MediaTombstone.objects.exists())
+        self.assertTrue(default_storage.exists("blogs/replacement.jpg"))
+
+class ChunkedUploadTest(BlogAPITestCase):
+    """
+    Images uploaded in resumable chunks are finalized with a checksum and referenced by token on create.
+    """
+
+    def setUp(self):
+        super().setUp()
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=temp_dir.name, FILE_UPLOAD_TEMP_DIR=temp_dir.name,
+                                            BLOG_IMAGE_RENDITION_WORKERS=0, MEDIA_GC_INTERVAL=0))
+        self.author = user.objects.create_user(phone="989120000012", author=True)
+        self.client.force_authenticate(self.author)
+        buffer = BytesIO()
+        Image.new("RGB", (300, 200), "green").save(buffer, "PNG")
+        self.content = buffer.getvalue()
+
+    def start(self):
+        response = self.client.post(reverse("blog:upload"), {"filename": "photo.png", "size": len(self.content)})
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def put(self, upload_id, start, end):
+        return self.client.put(reverse("blog:upload-detail", kwargs={"pk": upload_id}), self.content[start:end],
+                               content_type="application/octet-stream",
+                               HTTP_CONTENT_RANGE=f"bytes {start}-{end - 1}/{len(self.content)}")
+
+    def finalize(self, upload_id, checksum=None):
+        return self.client.post(reverse("blog:upload-finalize", kwargs={"pk": upload_id}),
+                                {"sha256": checksum or sha256(self.content).hexdigest()})
+
+    def test_upload_resume_and_create(self):
+        upload_id = self.start()
+        middle = len(self.content) // 2
+        self.assertEqual(self.put(upload_id, 0, middle).data["offset"], middle)
+        conflict = self.put(upload_id, 0, middle)
+        self.assertEqual((conflict.status_code, conflict.data["offset"]), (409, middle))
+        self.assertEqual(self.finalize(upload_id).status_code, 400)
+        self.put(upload_id, middle, len(self.content))
+        token = self.finalize(upload_id).data["token"]
+        response = self.client.post(reverse("blog:create"), {"title": "title", "body": "body", "summary": "summary",
+                                                             "image_upload": token, "status": "p"})
+        self.assertEqual(response.status_code, 201)
+        blog = Blog.objects.get()
+        with blog.image.open() as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_chunk_is_read_before_locking(self):
+        upload_id = self.start()
+        middle = len(self.content) // 2
+
+        def receive_raced(upload, stream, length):
+            # Another request appends the same chunk while this body arrives.
+            ImageUpload.objects.filter(pk=upload_id).update(offset=middle)
+            return receive_chunk(upload, stream, length)
+
+        with patch("blog.views.receive_chunk", side_effect=receive_raced):
+            conflict = self.put(upload_id, 0, middle)
+        self.assertEqual((conflict.status_code, conflict.data["offset"]), (409, middle))
+
+    def test_checksum_mismatch_is_rejected(self):
+        upload_id = self.start()
+        self.put(upload_id, 0, len(self.content))
+        response = self.finalize(upload_id, checksum="0" * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("sha256", response.data)
+
+    def test_token_of_another_user_or_unfinished_upload_is_rejected(self):
+        upload_id = self.start()
+        data = {"title": "title", "body": "body", "summary": "summary", "image_upload": upload_id, "status": "p"}
+        self.assertIn("image_upload", self.client.post(reverse("blog:create"), data).data)
+        self.put(upload_id, 0, len(self.content))
+        self.finalize(upload_id)
+        self.client.force_authenticate(user.objects.create_user(phone="989120000013", author=True))
+        self.assertIn("image_upload", self.client.post(reverse("blog:create"), data).data)
+
+    def test_aborted_upload_removes_its_file(self):
+        upload_id = self.start()
+        self.put(upload_id, 0, 10)
+        path = ImageUpload.objects.get(pk=upload_id).path
+        self.assertTrue(os.path.exists(path))
+        self.client.delete(reverse("blog:upload-detail", kwargs={"pk": upload_id}))
+        self.assertFalse(os.path.exists(path))
+
+
+class ExportTest(BlogAPITestCase):
+    """
+    Admins can stream blogs as NDJSON, optionally gzip compressed and limited to recent updates.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = user.objects.create_superuser(phone="989120000014", password="password")
+        category = Category.objects.create(title="Python", slug="python", status=True)
+        for index in range(5):
+            blog = Blog.objects.create(author=cls.admin, title=f"title {index}", body="body", summary="summary",
+                                       image="blogs/image.jpg", status="p")
+            blog.category.add(category)
+        cls.category = category
+
+    def export(self, **params):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse("blog:export"), params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_streams_every_blog(self):
+        rows = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual([row["title"] for row in rows], [f"title {index}" for index in range(5)])
+        self.assertEqual(rows[0]["category"], [self.category.pk])
+
+    def test_gzip_and_updated_since(self):
+        since = timezone.now()
+        Blog.objects.filter(title="title 3").update(updated=since)
+        rows = gzip.decompress(self.export(gzip="true", updated_since=since.isoformat())).splitlines()
+        self.assertEqual([json.loads(row)["title"] for row in rows], ["title 3"])
+
+    async def test_streams_under_asgi(self):
+        self.enterContext(patch.object(BlogExporter, "chunk_size", 2))
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.admin).access_token))()
+        response = await self.async_client.get(reverse("blog:export"), {"gzip": "true"},
+                                               headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 200)
+        # An async iterator is streamed by the ASGI handler, a sync one would be read into memory first.
+        self.assertTrue(response.is_async)
+        content = b"".join([block async for block in response.streaming_content])
+        rows = [json.loads(row) for row in gzip.decompress(content).splitlines()]
+        self.assertEqual([row["title"] for row in rows], [f"title {index}" for index in range(5)])
+
+    def test_reads_in_chunks(self):
+        self.enterContext(patch.object(BlogExporter, "chunk_size", 2))
+        # one blogs query read two rows at a time, categories for each chunk of two blogs
+        with self.assertNumQueries(4):
+            rows = list(BlogExporter().rows())
+        self.assertEqual(len(rows), 5)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(user.objects.create_user(phone="989120000015", author=True))
+        self.assertEqual(self.client.get(reverse("blog:export")).status_code, 403)
+
+    def test_command_writes_file(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "blogs.ndjson.gz")
+            call_command("export_ndjson", "blogs", gzip=True, output=path)
+            with gzip.open(path) as file:
+                self.assertEqual(len(file.read().splitlines()), 5)
+
+
+class BlogImportTest(BlogAPITestCase):
+    """
+    Imports create blogs with their categories and likes in batches, and index them once at the end.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = user.objects.create_superuser(phone="989120000018", password="password")
+        cls.reader = user.objects.create_user(phone="989120000019")
+        cls.category = Category.objects.create(title="Python", slug="python", status=True)
+        Blog.objects.create(author=cls.admin, title="existing", slug="taken-slug", body="body", summary="summary",
+                            image="blogs/image.jpg", status="p")
+
+    def rows(self, count):
+        return [{"title": f"imported {index}", "body": "body", "summary": "summary", "image": "blogs/image.jpg",
+                 "author_phone": self.admin.phone, "status": "p", "category": [self.category.pk],
+                 "likes": [self.reader.pk]} for index in range(count)]
+
+    def test_batches_take_constant_queries(self):
+        rows = self.rows(10)
+        rows[0]["slug"] = "taken-slug"
+        rows[1]["slug"] = "fresh-slug"
+        importer = BlogImporter(batch_size=5)
+        # users, slugs, blogs, categories, likes and a savepoint pair per batch, plus a retry of the taken slug
+        with self.assertNumQueries(2 * 7 + 1):
+            importer.import_batch(list(enumerate(rows[:5], start=1)))
+            importer.import_batch(list(enumerate(rows[5:], start=6)))
+            self.assertEqual(importer.created, 10)
+        blogs = Blog.objects.filter(title__startswith="imported")
+        self.assertEqual(len(set(blogs.values_list("slug", flat=True))), 10)
+        self.assertTrue(blogs.filter(slug="fresh-slug").exists())
+        self.assertEqual(Blog.likes.through.objects.filter(blog__in=blogs).count(), 10)
+        self.assertEqual(set(blogs.values_list("like_count", flat=True)), {1})
+        self.assertEqual(Blog.category.through.objects.filter(blog__in=blogs).count(), 10)
+
+    def test_endpoint_reads_csv_and_reports_errors(self):
+        content = ("title,body,summary,image,author,status,category,likes\n"
+                   f"csv one,body,summary,blogs/image.jpg,{self.admin.pk},p,{self.category.pk},{self.reader.pk}\n"
+                   f"csv two,body,summary,blogs/image.jpg,{self.admin.pk},x,,\n"
+                   f"csv three,body,summary,blogs/image.jpg,999999,p,,\n")
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(reverse("blog:import"),
+                                    {"file": SimpleUploadedFile("blogs.csv", content.encode())})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["created"], response.data["failed"]), (1, 2))
+        self.assertEqual([error["line"] for error in response.data["errors"]], [2, 3])
+        blog = Blog.objects.get(title="csv one")
+        self.assertEqual(list(blog.category.all()), [self.category])
+        search = self.client.get(reverse("blog:list"), {"search": "csv"})
+        self.assertEqual([result["title"] for result in search.data["results"]], ["csv one"])
+
+    @override_settings(BLOG_IMPORT_MAX_ROWS=2)
+    def test_endpoint_refuses_large_files(self):
+        content = "".join(json.dumps(row) + "\n" for row in self.rows(3))
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(reverse("blog:import"),
+                                    {"file": SimpleUploadedFile("blogs.ndjson", content.encode())})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("import_blogs", response.data["file"][0])
+        self.assertFalse(Blog.objects.filter(title__startswith="imported").exists())
+
+    def test_endpoint_renders_shared_images_once(self):
+        media_root = TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name, MEDIA_GC_INTERVAL=0,
+                                            BLOG_IMAGE_RENDITION_WORKERS=0, BLOG_IMAGE_RENDITION_WIDTHS=(320,)))
+        MediaGCTest.save_image("blogs/image.jpg")
+        content = "".join(json.dumps(row) + "\n" for row in self.rows(3))
+        self.client.force_authenticate(self.admin)
+        with patch("blog.renditions.render", wraps=render) as render_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse("blog:import"),
+                                            {"file": SimpleUploadedFile("blogs.ndjson", content.encode())})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(render_mock.call_count, 1)
+        renditions = Blog.objects.filter(title__startswith="imported").values_list("renditions", flat=True)
+        self.assertEqual([set(rendition["webp"]) for rendition in renditions], [{"320"}] * 3)
+
+    def test_command_reads_ndjson(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "blogs.ndjson")
+            with open(path, "w") as file:
+                file.writelines(json.dumps(row) + "\n" for row in self.rows(3))
+            out = StringIO()
+            call_command("import_blogs", path, workers=0, stdout=out)
+        self.assertIn("Imported 3 blogs, 0 rows failed.", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
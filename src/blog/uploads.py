@@ -0,0 +1,90 @@
+from hashlib import sha256
+from os import makedirs, remove
+from os.path import dirname, exists
+from re import fullmatch
+from tempfile import TemporaryFile
+from django.core.files import File
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ChunkedUploadFile(File):
+    """
+    The file of a completed ImageUpload. Exposes temporary_file_path, so FileSystemStorage moves
+    the file into place instead of copying it.
+    """
+
+    def __init__(self, upload):
+        super().__init__(open(upload.path, "rb"), name=upload.filename)
+        self.upload = upload
+
+    def temporary_file_path(self):
+        return self.upload.path
+
+
+def parse_content_range(header: str):
+    """
+    Parses "bytes start-end/total" into (start, end, total), or returns None if it is malformed.
+    """
+    match = fullmatch(r"bytes (\d+)-(\d+)/(\d+)", header.strip())
+    if match is None:
+        return None
+    start, end, total = map(int, match.groups())
+    return (start, end, total) if start <= end < total else None
+
+
+def copy_stream(stream, file, length: int) -> int:
+    """
+    Copies up to length bytes of stream to file, CHUNK_SIZE bytes at a time. Returns the number of bytes
+    copied, less than length if the stream ended early.
+    """
+    copied = 0
+    while copied < length and stream is not None:
+        try:
+            chunk = stream.read(min(CHUNK_SIZE, length - copied))
+        except OSError:
+            break
+        if not chunk:
+            break
+        file.write(chunk)
+        copied += len(chunk)
+    return copied
+
+
+def receive_chunk(upload, stream, length: int):
+    """
+    Reads up to length bytes of the request body into an anonymous temporary file next to the upload,
+    which disappears once closed, and returns it rewound. Nothing is locked while the body arrives.
+    """
+    makedirs(dirname(upload.path), exist_ok=True)
+    file = TemporaryFile(dir=dirname(upload.path))
+    copy_stream(stream, file, length)
+    file.seek(0)
+    return file
+
+
+def append_chunk(upload, stream, start: int, length: int) -> int:
+    """
+    Writes up to length bytes of stream at start of the temporary file of the upload, dropping anything
+    past start a previous request left behind. Returns the number of bytes written.
+    """
+    makedirs(dirname(upload.path), exist_ok=True)
+    with open(upload.path, "r+b" if exists(upload.path) else "wb") as file:
+        file.seek(start)
+        file.truncate()
+        return copy_stream(stream, file, length)
+
+
+def file_sha256(path: str) -> str:
+    digest = sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remove_upload_file(upload):
+    try:
+        remove(upload.path)
+    except FileNotFoundError:
+        pass
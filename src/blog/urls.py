@@ -1,11 +1,18 @@
 from django.urls import path
-from .views import BlogsList, BlogCreate, BlogDetailUpdateDelete, LikeBlog, CategoryBlog, CategoryList
+from extensions.export import ExportView
+from .views import BlogsList, BlogCreate, BlogDetailUpdateDelete, LikeBlog, CategoryBlog, CategoryList, \
+    ImageUploadCreate, ImageUploadDetail, ImageUploadFinalize, BlogImport
 
 app_name = "blog-api"
 
 urlpatterns = [
+    path("export/", ExportView.as_view(exporter_name="blogs"), name="export"),
     path("", BlogsList.as_view(), name="list"),
     path("create/", BlogCreate.as_view(), name="create"),
+    path("import/", BlogImport.as_view(), name="import"),
+    path("upload/", ImageUploadCreate.as_view(), name="upload"),
+    path("upload/<uuid:pk>/", ImageUploadDetail.as_view(), name="upload-detail"),
+    path("upload/<uuid:pk>/finalize/", ImageUploadFinalize.as_view(), name="upload-finalize"),
     path("category/list/", CategoryList.as_view(), name="category-list"),
     path("category/<slug:slug>/", CategoryBlog.as_view(), name="category-blog"),
     path("<slug:slug>/", BlogDetailUpdateDelete.as_view(), name="detail"),
@@ -1,34 +1,60 @@
+from itertools import islice
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django_filters.rest_framework import DjangoFilterBackend
+from PIL import Image
+from rest_framework import status
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import ListAPIView, CreateAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from blog.models import Blog, Category
-from extensions.permissions import IsSuperUserOrAuthor, IsSuperUserOrAuthorOrReadOnly
-from .pagination import BlogLimitOffsetPagination
+from blog.models import Blog, Category, ImageUpload
+from extensions.permissions import IsSuperUser, IsSuperUserOrAuthor, IsSuperUserOrAuthorOrReadOnly
+from extensions.conditional import ConditionalGetMixin, make_etag
+from extensions.response_cache import ResponseCacheMixin, generations
+from .imports import BlogImporter, readers
+from .renditions import rendition_pipeline
+from .search import BlogSearchFilter
+from .visits import visit_buffer
+from .pagination import BlogCursorPagination
 from .serializers import BlogsListSerializer, BlogCreateSerializer, BlogDetailUpdateDeleteSerializer, \
-    CategoryListSerializer
+    CategoryListSerializer, ImageUploadSerializer
+from .uploads import append_chunk, receive_chunk, file_sha256, parse_content_range
 
+# Columns the conditional GET validators of the blog lists are computed from.
+VALIDATOR_FIELDS = ("id", "publish", "updated", "like_count", "comment_count")
 
-class BlogsList(ListAPIView):
+
+class BlogsList(ResponseCacheMixin, ConditionalGetMixin, ListAPIView):
     """
     get: Returns a list of all existing blogs.
     """
 
     serializer_class = BlogsListSerializer
-    pagination_class = BlogLimitOffsetPagination
+    pagination_class = BlogCursorPagination
+    filter_backends = [DjangoFilterBackend, BlogSearchFilter, OrderingFilter]
     filterset_fields = ["category", "special"]
     search_fields = ["title", "summary", "author__first_name"]
     ordering_fields = ("publish", "special")
 
     def get_queryset(self):
-        return Blog.objects.publish()
+        return BlogsListSerializer.setup_eager_loading(Blog.objects.publish())
+
+    def get_cache_generations(self):
+        return ["blogs"]
+
+    def get_validators(self):
+        queryset = self.filter_queryset(Blog.objects.publish().only(*VALIDATOR_FIELDS))
+        return self.pagination_class().get_page_validators(queryset, self.request, self)
 
 
 class BlogCreate(CreateAPIView):
     """
     post: Creates a new post instance. Returns created post data. parameters: [title, body, image, summary, category, publish, special, status,]
+    Instead of image, image_upload may carry the token of a completed chunked upload.
     """
 
     serializer_class = BlogCreateSerializer
@@ -43,7 +69,121 @@ class BlogCreate(CreateAPIView):
         return serializer.save(author=self.request.user)
 
 
-class BlogDetailUpdateDelete(RetrieveUpdateDestroyAPIView):
+class ImageUploadCreate(CreateAPIView):
+    """
+    post: Starts a resumable upload of a blog image. Returns the upload with its id. parameters: [filename, size]
+    """
+
+    serializer_class = ImageUploadSerializer
+    permission_classes = [IsSuperUserOrAuthor]
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class ImageUploadDetail(APIView):
+    """
+    get: Returns the upload, its offset is where the next chunk starts.
+    put: Appends the raw request body at the position given by the Content-Range header, e.g. "bytes 0-1048575/4194304".
+    delete: Aborts the upload.
+    """
+
+    permission_classes = [IsSuperUserOrAuthor]
+
+    def get_object(self, pk, **kwargs):
+        return get_object_or_404(ImageUpload, pk=pk, user=self.request.user, **kwargs)
+
+    def get(self, request, pk):
+        return Response(ImageUploadSerializer(self.get_object(pk)).data)
+
+    def put(self, request, pk):
+        content_range = parse_content_range(request.headers.get("Content-Range", ""))
+        if content_range is None:
+            return Response({"detail": "A Content-Range header of the form 'bytes start-end/total' is required."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        start, end, total = content_range
+        upload = self.get_object(pk, completed=False)
+        if total != upload.size or start != upload.offset:
+            return self.conflict(upload)
+        # The body is read before the row is locked, a slow client holds neither a lock nor a transaction.
+        with receive_chunk(upload, request.stream, end - start + 1) as chunk:
+            with transaction.atomic():
+                upload = get_object_or_404(ImageUpload.objects.select_for_update(), pk=pk, user=request.user,
+                                           completed=False)
+                if total != upload.size or start != upload.offset:
+                    # Another request appended this chunk meanwhile.
+                    return self.conflict(upload)
+                upload.offset += append_chunk(upload, chunk, start, end - start + 1)
+                upload.save(update_fields=["offset"])
+        return Response(ImageUploadSerializer(upload).data)
+
+    @staticmethod
+    def conflict(upload):
+        return Response({"detail": "The chunk does not start at the offset of the upload.", "offset": upload.offset},
+                        status=status.HTTP_409_CONFLICT)
+
+    def delete(self, request, pk):
+        self.get_object(pk).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ImageUploadFinalize(APIView):
+    """
+    post: Completes an upload once every byte is received. Returns the token to create a blog with. parameters: [sha256]
+    """
+
+    permission_classes = [IsSuperUserOrAuthor]
+
+    def post(self, request, pk):
+        upload = get_object_or_404(ImageUpload, pk=pk, user=request.user)
+        if upload.completed:
+            return Response({"token": upload.pk})
+        if upload.offset != upload.size:
+            return Response({"detail": f"{upload.size - upload.offset} bytes are missing.", "offset": upload.offset},
+                            status=status.HTTP_400_BAD_REQUEST)
+        checksum = file_sha256(upload.path)
+        if str(request.data.get("sha256", "")).lower() != checksum:
+            return Response({"sha256": ["The checksum does not match the uploaded file."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with Image.open(upload.path) as image:
+                image.verify()
+        except Exception:
+            return Response({"detail": "The uploaded file is not a valid image."}, status=status.HTTP_400_BAD_REQUEST)
+        upload.sha256, upload.completed = checksum, True
+        upload.save(update_fields=["sha256", "completed"])
+        return Response({"token": upload.pk})
+
+
+class BlogImport(APIView):
+    """
+    post: Imports blogs from an NDJSON or CSV file in batches. Returns the number of blogs created, the rows that
+    failed and the throughput. parameters: [file, format (ndjson/csv, defaults to the extension of file)]
+    Files of more than BLOG_IMPORT_MAX_ROWS rows are refused, the import_blogs command imports those.
+    """
+
+    permission_classes = [IsSuperUser]
+
+    def post(self, request):
+        file = request.FILES.get("file")
+        if file is None:
+            return Response({"file": ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get("format") or ("csv" if file.name.endswith(".csv") else "ndjson")
+        if fmt not in readers:
+            return Response({"format": [f"Choose one of {', '.join(sorted(readers))}."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        max_rows = getattr(settings, "BLOG_IMPORT_MAX_ROWS", 5000)
+        rows = list(islice(readers[fmt](file), max_rows + 1))
+        if len(rows) > max_rows:
+            return Response({"file": [f"Files of more than {max_rows} rows are imported with the import_blogs "
+                                      f"command."]}, status=status.HTTP_400_BAD_REQUEST)
+        importer = BlogImporter()
+        stats = importer.run(rows)
+        rendition_pipeline.submit_many(importer.get_images())
+        return Response(stats, status=status.HTTP_201_CREATED)
+
+
+class BlogDetailUpdateDelete(ResponseCacheMixin, ConditionalGetMixin, RetrieveUpdateDestroyAPIView):
     """
     get: Returns the details of a post instance. Searches post using slug field.
     put: Updates an existing post. Returns updated post data. parameters: exclude = [user, create, updated, likes]
@@ -51,11 +191,35 @@ class BlogDetailUpdateDelete(RetrieveUpdateDestroyAPIView):
     """
 
     serializer_class = BlogDetailUpdateDeleteSerializer
-    permission_classes = (IsSuperUserOrAuthorOrReadOnly)
+    permission_classes = [IsSuperUserOrAuthorOrReadOnly]
     lookup_field = "slug"
+    cache_tiers = ["anon"]
 
     def get_object(self):
-        return get_object_or_404(Blog, slug=self.kwargs.get("slug"))
+        blog = get_object_or_404(Blog.objects.select_related("author"), slug=self.kwargs.get("slug"))
+        self.check_object_permissions(self.request, blog)
+        return blog
+
+    def retrieve(self, request, *args, **kwargs):
+        blog = self.get_object()
+        visit_buffer.add(blog.pk)
+        serializer = self.get_serializer(blog)
+        return Response(serializer.data)
+
+    def get_cache_generations(self):
+        return [f"blog:{self.kwargs.get('slug')}"]
+
+    def cache_hit(self, data):
+        visit_buffer.add(data["id"])
+
+    def get_validators(self):
+        blog = Blog.objects.filter(slug=self.kwargs.get("slug")).values(*VALIDATOR_FIELDS).first()
+        if blog is None:
+            return None
+        # updated misses the like and comment counters, the generation follows every change of the response.
+        versions = generations.get_many(self.get_cache_generations())
+        etag = make_etag(blog["id"], blog["updated"].isoformat(), blog["like_count"], blog["comment_count"], versions)
+        return etag, None
 
     def perform_update(self, serializer):
         if not self.request.user.is_superuser:
@@ -65,39 +229,70 @@ class BlogDetailUpdateDelete(RetrieveUpdateDestroyAPIView):
 
 class LikeBlog(APIView):
     """
-    get: Likes the desired blog. parameters = [pk]
+    get: Toggles the like of the desired blog. parameters = [pk]
+    post: Likes the desired blog, liking twice has no effect. parameters = [pk]
+    delete: Removes the like of the desired blog, unliking twice has no effect. parameters = [pk]
     """
 
     permission_classes = [IsAuthenticated]
 
+    def get_blog(self, pk):
+        return get_object_or_404(Blog.objects.only("id", "slug"), pk=pk, status='p')
+
     def get(self, request, pk):
-        user = request.user
-        blog = get_object_or_404(Blog, pk=pk, status='p')
-        if user in blog.likes.all():
-            blog.likes.remove(user)
-        else:
-            blog.likes.add(user)
+        blog = self.get_blog(pk)
+        if not blog.like(request.user):
+            blog.unlike(request.user)
+        return Response({"ok": "Your request was successful."}, status=200)
+
+    def post(self, request, pk):
+        self.get_blog(pk).like(request.user)
+        return Response({"ok": "Your request was successful."}, status=200)
+
+    def delete(self, request, pk):
+        self.get_blog(pk).unlike(request.user)
         return Response({"ok": "Your request was successful."}, status=200)
 
 
-class CategoryBlog(ListAPIView):
+class CategoryBlog(ResponseCacheMixin, ConditionalGetMixin, ListAPIView):
     """
-    get: Returns the list of blogs on a particular category. parameters = [slug]
+    get: Returns the list of blogs on a particular category and its subcategories. parameters = [slug]
     """
 
     serializer_class = BlogsListSerializer
+    pagination_class = BlogCursorPagination
     lookup_field = 'slug'
 
+    def get_blogs(self):
+        """
+        Returns the published blogs of the category and of its active descendants.
+        """
+        category = get_object_or_404(Category.objects.active().only("path"), slug=self.kwargs.get("slug"))
+        return Blog.objects.publish().filter(
+            category__path__startswith=category.path, category__status=True
+        ).distinct()
+
     def get_queryset(self):
-        category = get_object_or_404(Category.objects.active(), slug=self.kwargs.get("slug"))
-        return category.blogs.publish()
+        return BlogsListSerializer.setup_eager_loading(self.get_blogs())
 
+    def get_cache_generations(self):
+        return ["blogs", "categories"]
 
-class CategoryList(ListAPIView):
+    def get_validators(self):
+        queryset = self.filter_queryset(self.get_blogs().only(*VALIDATOR_FIELDS))
+        return self.pagination_class().get_page_validators(queryset, self.request, self)
+
+
+class CategoryList(ResponseCacheMixin, ListAPIView):
     """
-    get: Returns a list of all existing category. parameters = [slug]
+    get: Returns the tree of all active categories, each category followed by its subcategories.
     """
 
-    queryset = Category.objects.active()
+    queryset = Category.objects.active().select_related("parent").only(
+        "title", "slug", "depth", "parent__title"
+    ).order_by("path")
     serializer_class = CategoryListSerializer
     lookup_field = 'slug'
+
+    def get_cache_generations(self):
+        return ["categories"]
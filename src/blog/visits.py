@@ -0,0 +1,105 @@
+from collections import Counter
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, F, When, Value
+from extensions.writebehind import WriteBehind
+
+
+class VisitBuffer(WriteBehind):
+    """
+    Counts blog visits in the shared "visits" cache with atomic incr(), merged per blog, and writes them
+    behind to Blog.visits. Every worker sees the counts and a killed worker loses none of them.
+    Counts go to the current bucket, which lists the blogs visited in it. A daemon thread of each worker
+    flushes every BLOG_VISITS_FLUSH_INTERVAL seconds, one worker at a time under a lock: it opens a new
+    bucket, subtracts the counts it reads and writes them to the rows, and deletes the buckets closed by
+    the previous flush, which no request writes to anymore.
+    """
+
+    name = "blog-visits-flush"
+    description = "blog visits"
+    interval_setting = "BLOG_VISITS_FLUSH_INTERVAL"
+    batch_size = 500
+    cache_alias = "visits"
+    # Seconds after which the lock of a killed flush expires.
+    lock_timeout = 60
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def incr(self, key: str, delta: int = 1) -> int:
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            if self.cache.add(key, delta, None):
+                return delta
+            return self.cache.incr(key, delta)
+
+    def add(self, blog_id: int, count: int = 1):
+        bucket = self.cache.get("visits:bucket", 0)
+        if self.cache.add(f"visits:{bucket}:{blog_id}", count, None):
+            # First visit of the blog in the bucket, list it for the flush.
+            slot = self.incr(f"visits:{bucket}:size")
+            self.cache.set(f"visits:{bucket}:id:{slot}", blog_id, None)
+        else:
+            self.cache.incr(f"visits:{bucket}:{blog_id}", count)
+        self.start()
+
+    def pending(self, blog_id: int) -> int:
+        """
+        Returns the visits of a blog that have not been written to the database yet.
+        """
+        state = self.cache.get_many(["visits:bucket", "visits:flushed"])
+        buckets = range(state.get("visits:flushed", -1) + 1, state.get("visits:bucket", 0) + 1)
+        return sum(self.cache.get_many([f"visits:{bucket}:{blog_id}" for bucket in buckets]).values())
+
+    def flush(self) -> int:
+        """
+        Writes the counted visits with one UPDATE per batch of blogs. Returns the number of blogs updated,
+        0 while another worker flushes.
+        """
+        from blog.models import Blog
+
+        cache = self.cache
+        if not cache.add("visits:lock", 1, self.lock_timeout):
+            return 0
+        try:
+            current = self.incr("visits:bucket") - 1
+            buckets = range(cache.get("visits:flushed", -1) + 1, current + 1)
+            keys, bucket_keys = {}, {}
+            for bucket in buckets:
+                slots = [f"visits:{bucket}:id:{slot}" for slot in range(1, cache.get(f"visits:{bucket}:size", 0) + 1)]
+                counters = {f"visits:{bucket}:{blog_id}": blog_id for blog_id in cache.get_many(slots).values()}
+                keys.update(counters)
+                bucket_keys[bucket] = [*counters, *slots, f"visits:{bucket}:size"]
+            taken = {key: count for key, count in cache.get_many(keys).items() if count}
+            pending = Counter()
+            for key, count in taken.items():
+                cache.incr(key, -count)
+                pending[keys[key]] += count
+            items = list(pending.items())
+            try:
+                with transaction.atomic():
+                    for start in range(0, len(items), self.batch_size):
+                        batch = items[start:start + self.batch_size]
+                        delta = Case(*[When(pk=blog_id, then=Value(count)) for blog_id, count in batch],
+                                     default=Value(0))
+                        Blog.objects.filter(pk__in=[blog_id for blog_id, _ in batch]).update(
+                            visits=F("visits") + delta
+                        )
+            except Exception:
+                # Put the visits back for the next flush instead of dropping them.
+                for key, count in taken.items():
+                    self.incr(key, count)
+                raise
+            # The bucket closed now may still take the visits of requests in flight, it is deleted next time.
+            closed = buckets[:-1]
+            if closed:
+                cache.delete_many([key for bucket in closed for key in bucket_keys[bucket]])
+                cache.set("visits:flushed", closed[-1], None)
+        finally:
+            cache.delete("visits:lock")
+        return len(items)
+
+
+visit_buffer = VisitBuffer()
@@ -5,3 +5,6 @@ class CommentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'comment'
     verbose_name = "Comments"
+
+    def ready(self):
+        import comment.signals
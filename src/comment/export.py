@@ -0,0 +1,10 @@
+from extensions.export import Exporter
+from .models import Comment
+
+
+class CommentExporter(Exporter):
+    def get_queryset(self):
+        return Comment.objects.values(
+            "id", "user_id", "name", "content_type__app_label", "content_type__model", "object_id", "parent_id",
+            "root_id", "body", "create", "updated"
+        )
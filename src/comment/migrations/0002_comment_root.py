@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_comment_root(apps, schema_editor):
+    Comment = apps.get_model("comment", "Comment")
+    parents = dict(Comment.objects.values_list("id", "parent_id"))
+    comments = []
+    for comment_id, parent_id in parents.items():
+        if parent_id is None:
+            continue
+        root_id = parent_id
+        while parents.get(root_id) is not None:
+            root_id = parents[root_id]
+        comments.append(Comment(id=comment_id, root_id=root_id))
+    Comment.objects.bulk_update(comments, ["root"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='root',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Top-level comment of the thread', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread', to='comment.comment', verbose_name='root'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('parent__isnull', True)), fields=['content_type', 'object_id', '-create', '-id'], name='comment_thread_idx'),
+        ),
+        migrations.RunPython(populate_comment_root, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 
 user = get_user_model()
@@ -20,16 +21,27 @@ class Comment(models.Model):
     content_object = GenericForeignKey("content_type", "object_id")
     parent = models.ForeignKey("self", on_delete=models.CASCADE, related_name="children", null=True, blank=True,
                                verbose_name=_("parent"))
+    root = models.ForeignKey("self", on_delete=models.CASCADE, related_name="thread", null=True, blank=True,
+                             editable=False, verbose_name=_("root"), help_text=_("Top-level comment of the thread"))
     body = models.TextField(verbose_name=_("Body"))
     create = models.DateTimeField(auto_now_add=True, verbose_name=_("Create time"))
     updated = models.DateTimeField(auto_now=True, verbose_name=_("Update time"))
 
     class Meta:
         ordering = ["-create", "-id"]
+        indexes = [
+            models.Index(fields=["content_type", "object_id", "-create", "-id"], condition=Q(parent__isnull=True),
+                         name="comment_thread_idx"),
+        ]
         verbose_name = _("Comment")
         verbose_name_plural = _("Comments")
 
     def __str__(self):
         return self.user.phone
 
+    def save(self, *args, **kwargs):
+        if self.parent_id is not None and self.root_id is None:
+            self.root_id = Comment.objects.values_list("root_id", flat=True).get(pk=self.parent_id) or self.parent_id
+        super().save(*args, **kwargs)
+
     objects = CommentManager()
@@ -0,0 +1,11 @@
+from blog.pagination import BlogCursorPagination
+
+
+class CommentThreadCursorPagination(BlogCursorPagination):
+    """
+    Keyset pagination over the top-level comments of a post, newest thread first.
+    """
+
+    page_size = 20
+    ordering = ("-create", "-id")
+    keyset_orderings = (("-create", "-id"),)
@@ -10,7 +10,23 @@ class CommentListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Comment
-        fields = ["user", "name", "parent", "body", "create", "object_id"]
+        fields = ["id", "user", "name", "parent", "body", "create", "object_id"]
+
+
+def build_comment_tree(threads, replies) -> list:
+    """
+    Serializes the top-level comments and nests every reply under its parent in one pass.
+    Replies must be ordered so that a parent comes before its replies.
+    """
+    nodes, tree = {}, []
+    for comment in CommentListSerializer(threads, many=True).data:
+        comment["replies"] = nodes[comment["id"]] = []
+        tree.append(comment)
+    for reply in CommentListSerializer(replies, many=True).data:
+        reply["replies"] = nodes[reply["id"]] = []
+        if reply["parent"] in nodes:
+            nodes[reply["parent"]].append(reply)
+    return tree
 
 
 class CommentUpdateCreateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,30 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from blog.cache import invalidate_blogs
+from blog.models import Blog
+from .models import Comment
+
+
+def update_comment_count(comment, delta: int):
+    # get_for_model is served from the ContentType cache after the first call.
+    if comment.content_type_id != ContentType.objects.get_for_model(Blog).id:
+        return
+    blogs = Blog.objects.filter(pk=comment.object_id)
+    blogs.update(comment_count=F("comment_count") + delta)
+    invalidate_blogs(*blogs.values_list("slug", flat=True))
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, raw=False, *args, **kwargs):
+    if created and not raw:
+        update_comment_count(instance, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, *args, **kwargs):
+    """
+    Runs for every comment deleted, including the replies removed by the cascade of their parent.
+    """
+    update_comment_count(instance, -1)
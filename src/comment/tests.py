@@ -1,3 +1,122 @@
-from django.test import TestCase
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from blog.models import Blog
+from blog.visits import visit_buffer
+from comment.models import Comment
 
-# Create your tests here.
+user = get_user_model()
+
+
+class CommentThreadTest(APITestCase):
+    """
+    Comment threads are paginated by cursor and nested with their replies in a fixed number of queries.
+    """
+
+    def setUp(self):
+        self.user = user.objects.create_user(phone="989120000010", first_name="first")
+        self.blog = Blog.objects.create(author=self.user, title="title", body="body", summary="summary",
+                                        image="blogs/image.jpg", status="p")
+        self.url = reverse("comment-api:list", kwargs={"pk": self.blog.pk})
+        self.content_type = ContentType.objects.get_for_model(Blog)
+
+    def comment(self, parent=None, body="body"):
+        return Comment.objects.create(user=self.user, content_type=self.content_type, object_id=self.blog.pk,
+                                      parent=parent, body=body)
+
+    def test_replies_are_nested_under_their_parent(self):
+        thread = self.comment(body="thread")
+        reply = self.comment(parent=thread, body="reply")
+        nested = self.comment(parent=reply, body="nested")
+        self.assertEqual((reply.root_id, nested.root_id), (thread.pk, thread.pk))
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 1)
+        tree = response.data["results"][0]
+        self.assertEqual(tree["replies"][0]["body"], "reply")
+        self.assertEqual(tree["replies"][0]["replies"][0]["body"], "nested")
+        self.assertEqual(tree["user"], {"name": "first"})
+
+    def test_page_takes_constant_queries(self):
+        for _ in range(25):
+            thread = self.comment()
+            self.comment(parent=self.comment(parent=thread))
+        # blog, threads, replies
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 20)
+        next_page = self.client.get(response.data["next"])
+        self.assertEqual(len(next_page.data["results"]), 5)
+
+    def test_parent_must_belong_to_the_post(self):
+        other = Blog.objects.create(author=self.user, title="other", body="body", summary="summary",
+                                    image="blogs/image.jpg", status="p")
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse("comment-api:create"),
+                                    {"object_id": other.pk, "parent": self.comment().pk, "body": "body"})
+        self.assertEqual(response.status_code, 400)
+
+
+class CommentCountTest(APITestCase):
+    """
+    Blog.comment_count follows comments created and deleted, and is exposed by the blog list and detail.
+    """
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        self.user = user.objects.create_user(phone="989120000011", first_name="first")
+        self.blog = Blog.objects.create(author=self.user, title="title", body="body", summary="summary",
+                                        image="blogs/image.jpg", status="p")
+        self.content_type = ContentType.objects.get_for_model(Blog)
+        self.addCleanup(visit_buffer.flush)
+
+    def comment(self, parent=None):
+        return Comment.objects.create(user=self.user, content_type=self.content_type, object_id=self.blog.pk,
+                                      parent=parent, body="body")
+
+    def count(self):
+        return Blog.objects.values_list("comment_count", flat=True).get(pk=self.blog.pk)
+
+    def test_create_and_delete_update_the_count(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse("comment-api:create"), {"object_id": self.blog.pk, "body": "body"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.count(), 1)
+        comment = Comment.objects.get()
+        self.client.delete(reverse("comment-api:update-delete", kwargs={"pk": comment.pk}))
+        self.assertEqual(self.count(), 0)
+
+    def test_deleting_a_thread_discounts_its_replies(self):
+        thread = self.comment()
+        self.comment(parent=self.comment(parent=thread))
+        self.comment()
+        self.assertEqual(self.count(), 4)
+        thread.delete()
+        self.assertEqual(self.count(), 1)
+
+    def test_list_and_detail_expose_the_count(self):
+        self.comment()
+        self.comment()
+        response = self.client.get(reverse("blog-api:list"))
+        self.assertEqual(response.data["results"][0]["comment_count"], 2)
+        response = self.client.get(reverse("blog-api:detail", kwargs={"slug": self.blog.slug}))
+        self.assertEqual(response.data["comment_count"], 2)
+
+    def test_new_comment_changes_the_etag(self):
+        url = reverse("blog-api:detail", kwargs={"slug": self.blog.slug})
+        with self.captureOnCommitCallbacks(execute=True):
+            etag = self.client.get(url)["ETag"]
+            self.comment()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["comment_count"], 1)
+
+    def test_recount_repairs_drift(self):
+        self.comment()
+        Blog.objects.filter(pk=self.blog.pk).update(comment_count=7, like_count=3)
+        call_command("recount_blog_counters", stdout=StringIO())
+        self.assertEqual(Blog.objects.values_list("comment_count", "like_count").get(pk=self.blog.pk), (1, 0))
@@ -1,9 +1,11 @@
 from django.urls import path
+from extensions.export import ExportView
 from .views import CommentsList, CommentCreate, CommentUpdateDelete
 
 app_name = "comment-api"
 
 urlpatterns = [
+    path("export/", ExportView.as_view(exporter_name="comments"), name="export"),
     path("<int:pk>/", CommentsList.as_view(), name="list"),
     path("create/", CommentCreate.as_view(), name="create"),
     path("update-delete/<int:pk>/", CommentUpdateDelete.as_view(), name="update-delete"),
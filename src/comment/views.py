@@ -1,24 +1,33 @@
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from blog.models import Blog
-from .serializers import CommentListSerializer, CommentUpdateCreateSerializer
+from .pagination import CommentThreadCursorPagination
+from .serializers import CommentUpdateCreateSerializer, build_comment_tree
 from comment.models import Comment
 
 
 class CommentsList(APIView):
     """
-    get: Returns the list of comments on a particular post. parameters = [pk]
+    get: Returns the comment threads of a particular post, newest first, with their replies nested.
+    parameters = [pk, cursor]
     """
 
+    pagination_class = CommentThreadCursorPagination
+    fields = ("id", "user__first_name", "name", "parent_id", "body", "create", "object_id")
+
     def get(self, request, pk):
-        blog = get_object_or_404(Blog, id=pk, status="p")
-        query = Comment.objects.filter_by_instance(blog)
-        serializer = CommentListSerializer(query, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        blog = get_object_or_404(Blog.objects.only("id"), id=pk, status="p")
+        threads = Comment.objects.filter_by_instance(blog).filter(parent__isnull=True)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(threads.select_related("user").only(*self.fields), request, view=self)
+        replies = Comment.objects.filter(root__in=[comment.id for comment in page]).select_related("user")
+        replies = replies.only(*self.fields).order_by("create", "id")
+        return paginator.get_paginated_response(build_comment_tree(page, replies))
 
 
 class CommentCreate(APIView):
@@ -33,9 +42,14 @@ class CommentCreate(APIView):
         if serializer.is_valid():
             blog = get_object_or_404(Blog, pk=serializer.validated_data.get('object_id'), status='p')
             comment_for_model = ContentType.objects.get_for_model(blog)
-            Comment.objects.create(user=request.user, name=serializer.data.get('name'), content_type=comment_for_model,
-                                   object_id=blog.id, parent_id=serializer.data.get('parent'),
-                                   body=serializer.data.get('body'))
+            parent = serializer.validated_data.get('parent')
+            if parent is not None and (parent.content_type_id, parent.object_id) != (comment_for_model.id, blog.id):
+                return Response({"parent": ["The parent comment belongs to another post."]},
+                                status=status.HTTP_400_BAD_REQUEST)
+            with transaction.atomic():
+                Comment.objects.create(user=request.user, name=serializer.data.get('name'),
+                                       content_type=comment_for_model, object_id=blog.id,
+                                       parent_id=serializer.data.get('parent'), body=serializer.data.get('body'))
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -53,14 +67,16 @@ class CommentUpdateDelete(APIView):
         comment = get_object_or_404(Comment, pk=pk, user=request.user)
         serializer = CommentUpdateCreateSerializer(comment, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            # A comment stays in its thread, moving it would leave the root of its replies behind.
+            serializer.save(parent=comment.parent, object_id=comment.object_id)
             return Response(serializer.data, status=status.HTTP_200_OK)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, pk):
         try:
-            get_object_or_404(Comment, pk=pk, user=request.user).delete()
+            with transaction.atomic():
+                get_object_or_404(Comment, pk=pk, user=request.user).delete()
         except Exception as e:
             return Response(e, status=status.HTTP_404_NOT_FOUND)
         return Response(status.HTTP_204_NO_CONTENT)
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 import os
 from decouple import config
 from pathlib import Path
+from tempfile import gettempdir
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -54,12 +55,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'extensions.ratelimit.RateLimitMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'extensions.db.middleware.PoolTimeoutMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -87,22 +90,38 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Connections of each worker process, kept open between requests by the engines of extensions.db:
+# at least MIN_SIZE once the worker starts and at most MAX_SIZE, so workers times MAX_SIZE must stay below
+# max_connections of PostgreSQL. Requests wait TIMEOUT seconds for a connection, then get a 503.
+# Connections idle for HEALTH_CHECK_AFTER seconds are pinged before use, and are closed MAX_LIFETIME
+# seconds after they were opened, or MAX_IDLE seconds after their last use past MIN_SIZE.
+DATABASE_POOL = {
+    "MIN_SIZE": config("DB_POOL_MIN_SIZE", default=2, cast=int),
+    "MAX_SIZE": config("DB_POOL_MAX_SIZE", default=10, cast=int),
+    "TIMEOUT": config("DB_POOL_TIMEOUT", default=2, cast=float),
+    "HEALTH_CHECK_AFTER": config("DB_POOL_HEALTH_CHECK_AFTER", default=1, cast=float),
+    "MAX_LIFETIME": config("DB_POOL_MAX_LIFETIME", default=30 * 60, cast=int),
+    "MAX_IDLE": config("DB_POOL_MAX_IDLE", default=10 * 60, cast=int),
+}
+
 if config("DEBUG", cast=bool):
     DATABASES = {
         "default": {
-            "ENGINE": "django.db.backends.sqlite3",
+            "ENGINE": "extensions.db.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            "POOL": DATABASE_POOL,
         }
     }
 else:
     DATABASES = {
         "default": {
-            "ENGINE": config("ENGINE"),
+            "ENGINE": config("ENGINE", default="extensions.db.postgresql"),
             "NAME": config("NAME"),
             "USER": config("USER"),
             "PASSWORD": config("PASSWORD", default="1234"),
             "HOST": "db",
             "PORT": config("PORT"),
+            "POOL": DATABASE_POOL,
         }
     }
 
@@ -171,11 +190,147 @@ EMAIL_HOST_USER = config("EMAIL_HOST_USER", default="")
 EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD", default="")
 
 
+# blog
+
+# Seconds between write-behind flushes of buffered blog visits. 0 disables the background flush.
+BLOG_VISITS_FLUSH_INTERVAL = config("BLOG_VISITS_FLUSH_INTERVAL", default=10, cast=int)
+
+# Seconds a cached response of the public blog endpoints lives at most. Writes invalidate them earlier.
+RESPONSE_CACHE_TIMEOUT = config("RESPONSE_CACHE_TIMEOUT", default=300, cast=int)
+# Seconds between flushes of the hit and miss counts of each worker, shown by response_cache_stats.
+RESPONSE_CACHE_STATS_FLUSH_INTERVAL = config("RESPONSE_CACHE_STATS_FLUSH_INTERVAL", default=10, cast=int)
+
+# Full-text search backend for blogs. None picks the backend matching the database vendor.
+BLOG_SEARCH_BACKEND = None
+
+# Widths of the resized variants rendered from Blog.image, and the processes rendering them.
+# 0 workers renders in the web process after the blog is committed.
+BLOG_IMAGE_RENDITION_WIDTHS = (320, 640, 1024, 1600)
+BLOG_IMAGE_RENDITION_WORKERS = config("BLOG_IMAGE_RENDITION_WORKERS", default=2, cast=int)
+
+# Most rows the import endpoint takes in one request, larger files go through the import_blogs command.
+BLOG_IMPORT_MAX_ROWS = config("BLOG_IMPORT_MAX_ROWS", default=5000, cast=int)
+
+# Seconds between background sweeps of deleted media files, which also run right after a commit
+# that deletes files. 0 deletes them in the committing thread.
+MEDIA_GC_INTERVAL = config("MEDIA_GC_INTERVAL", default=60, cast=int)
+
+# Largest image accepted by the chunked upload endpoint, the client_max_body_size of nginx, and
+# seconds after which unfinished or unused uploads are cleared.
+BLOG_UPLOAD_MAX_SIZE = 30 * 1024 * 1024
+BLOG_UPLOAD_EXPIRY = 24 * 60 * 60
+
+
+# otp
+
+# Seconds a code lives, and codes a phone may request per sliding window of OTP_REQUEST_WINDOW seconds.
+OTP_TIMEOUT = 300
+OTP_REQUEST_LIMIT = config("OTP_REQUEST_LIMIT", default=3, cast=int)
+OTP_REQUEST_WINDOW = config("OTP_REQUEST_WINDOW", default=60 * 60, cast=int)
+# Wrong codes after which the live code of a phone is dropped.
+OTP_VERIFY_ATTEMPTS = 5
+
+# Write-behind audit log of OTP requests in PhoneOtp, flushed every OTP_AUDIT_FLUSH_INTERVAL seconds.
+OTP_AUDIT_LOG = config("OTP_AUDIT_LOG", default=True, cast=bool)
+OTP_AUDIT_FLUSH_INTERVAL = config("OTP_AUDIT_FLUSH_INTERVAL", default=10, cast=int)
+
+# Bloom filter of registered phones answering "not registered" without a query, sized for PHONE_FILTER_CAPACITY
+# phones at PHONE_FILTER_ERROR_RATE false positives, about 1.8 MB per million at 0.1%. PHONE_FILTER_SHARED
+# passes the phones saved by one worker to the others through the default cache, for PHONE_FILTER_SYNC_TIMEOUT
+# seconds, after which a worker that has not caught up rebuilds. Only turn it off with a single process.
+PHONE_FILTER_CAPACITY = config("PHONE_FILTER_CAPACITY", default=1000000, cast=int)
+PHONE_FILTER_ERROR_RATE = config("PHONE_FILTER_ERROR_RATE", default=0.001, cast=float)
+PHONE_FILTER_SHARED = True
+PHONE_FILTER_SYNC_TIMEOUT = 24 * 60 * 60
+
+# Gateway the run_sms_worker processes send the SMS outbox through, and the options it is built with.
+SMS_PROVIDER = config("SMS_PROVIDER", default="account.sms.ConsoleSmsProvider")
+SMS_PROVIDER_OPTIONS = {}
+# Messages a worker claims at once, and seconds they stay leased to it before another worker may retry them.
+SMS_BATCH_SIZE = config("SMS_BATCH_SIZE", default=100, cast=int)
+SMS_LEASE = 60
+# Attempts before a message is dead-lettered, retried after about SMS_RETRY_BACKOFF ** attempts seconds.
+SMS_MAX_ATTEMPTS = 5
+SMS_RETRY_BACKOFF = 2
+SMS_RETRY_MAX_DELAY = 300
+# Seconds an idle worker waits before polling the outbox again.
+SMS_POLL_INTERVAL = 1
+# Seconds sent and dead messages are kept for the admin before the workers delete them.
+SMS_RETENTION = config("SMS_RETENTION", default=7 * 24 * 60 * 60, cast=int)
+
+
+# cache
+
+# Shared tier every gunicorn worker sees, split in namespaces that are cleared and evicted on their own.
+# With CACHE_REDIS_URL each namespace is a redis database, give it a maxmemory-policy there. Without it each
+# namespace is a SQLite file in CACHE_SQLITE_DIR, shared by the workers of one host, culled past MAX_ENTRIES.
+CACHE_REDIS_URL = config("CACHE_REDIS_URL", default="")
+CACHE_SQLITE_DIR = config("CACHE_SQLITE_DIR", default=os.path.join(gettempdir(), "blog-cache"))
+
+
+def shared_cache(database: int, name: str, max_entries: int, cull_frequency: int = 3) -> dict:
+    if CACHE_REDIS_URL:
+        return {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": f"{CACHE_REDIS_URL.rstrip('/')}/{database}",
+        }
+    return {
+        "BACKEND": "extensions.cache.SQLiteCache",
+        "LOCATION": os.path.join(CACHE_SQLITE_DIR, f"{name}.sqlite3"),
+        "OPTIONS": {"MAX_ENTRIES": max_entries, "CULL_FREQUENCY": cull_frequency},
+    }
+
+
+CACHES = {
+    # Metrics and everything without a namespace of its own.
+    "default": shared_cache(0, "default", max_entries=10000),
+    # OTP challenges and counters. Live challenges must not be evicted, keep it far from full.
+    "otp": shared_cache(1, "otp", max_entries=1000000),
+    # Token buckets, short lived and cheap to lose.
+    "ratelimit": shared_cache(2, "ratelimit", max_entries=100000, cull_frequency=2),
+    "response-shared": shared_cache(3, "response", max_entries=10000),
+    # Blog visits not yet written to the rows, see VisitBuffer. Keep it far from full, evicted counts are lost.
+    "visits": shared_cache(4, "visits", max_entries=1000000),
+    # Cached responses and their generations, read through a per process LRU of MAX_ENTRIES entries that
+    # drops what another worker invalidated within VERSION_CHECK_INTERVAL seconds.
+    "response": {
+        "BACKEND": "extensions.cache.TwoTierCache",
+        "LOCATION": "response-shared",
+        "OPTIONS": {"MAX_ENTRIES": 1000, "LOCAL_TIMEOUT": 30, "VERSION_CHECK_INTERVAL": 1},
+    },
+}
+
+
+# export
+
+# Exporters streamed by the admin export endpoints and the export_ndjson command.
+DATA_EXPORTERS = {
+    "blogs": "blog.export.BlogExporter",
+    "comments": "comment.export.CommentExporter",
+    "users": "account.export.UserExporter",
+}
+
+
 # api
 
+# Token buckets kept in the shared cache. RateLimitMiddleware limits the named routes per client address
+# before the session or the database is touched, the DRF throttles add the per phone buckets.
+RATELIMIT_ENABLED = config("RATELIMIT_ENABLED", default=True, cast=bool)
+RATELIMIT_ROUTES = {
+    "account-api:login": "30/min",
+    "account-api:register": "30/min",
+    "account-api:verify-otp": "60/min",
+}
+
+# Users resolved from access tokens are kept per process for AUTH_USER_CACHE_TIMEOUT seconds, at most
+# AUTH_USER_CACHE_SIZE of them, and in the default cache for AUTH_USER_CACHE_SHARED_TIMEOUT seconds.
+AUTH_USER_CACHE_SIZE = 1000
+AUTH_USER_CACHE_TIMEOUT = 30
+AUTH_USER_CACHE_SHARED_TIMEOUT = 300
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
-        'permissions.IsSuperUserOrReadOnly',
+        'extensions.permissions.IsSuperUserOrReadOnly',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -184,9 +339,23 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'account.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Proxies in front of the app, nginx only. Client addresses are read from that many entries from the end
+    # of X-Forwarded-For, so the entries a client sends itself never pick its rate limit bucket.
+    'NUM_PROXIES': config("NUM_PROXIES", default=1, cast=int),
+    'DEFAULT_THROTTLE_CLASSES': [
+        'extensions.ratelimit.IpTokenBucketThrottle',
+        'extensions.ratelimit.PhoneTokenBucketThrottle',
+    ],
+    # Token buckets of the views with a throttle_scope, "<scope>-ip" and "<scope>-phone".
+    'DEFAULT_THROTTLE_RATES': {
+        'otp-ip': config("RATELIMIT_OTP_IP", default="20/min"),
+        'otp-phone': config("RATELIMIT_OTP_PHONE", default="3/min"),
+        'verify-otp-ip': config("RATELIMIT_VERIFY_OTP_IP", default="30/min"),
+        'verify-otp-phone': config("RATELIMIT_VERIFY_OTP_PHONE", default="5/min"),
+    },
 }
 
 SPECTACULAR_SETTINGS = {
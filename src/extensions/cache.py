@@ -0,0 +1,330 @@
+import os
+import pickle
+import sqlite3
+from collections import OrderedDict
+from threading import Lock, local
+from time import monotonic, time
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MISSING = object()
+
+
+class SQLiteCache(BaseCache):
+    """
+    Cache in a SQLite file, a stand-in for redis when every worker runs on one host: all processes and
+    threads opening the file share it, each thread through a connection of its own. add() and touch()
+    are single statements and incr() runs under the write lock, so they are as atomic across processes
+    and threads as on redis. Integers are stored as such for incr(), other values are pickled.
+    Past MAX_ENTRIES the expired entries are dropped, then 1 / CULL_FREQUENCY of the entries closest to
+    expiring, the ones without a timeout last.
+    """
+
+    cull_every = 64
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = local()
+        self._writes = 0
+
+    @property
+    def connection(self):
+        # One connection per thread, as transactions of threads sharing one would interleave, and a new
+        # one in forked workers, a SQLite connection must not cross a fork.
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self._path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value, expires REAL) WITHOUT ROWID"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    @staticmethod
+    def encode(value):
+        return value if type(value) is int else pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def decode(value):
+        return value if isinstance(value, int) else pickle.loads(value)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection.execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time())
+        ).fetchone()
+        return default if row is None else self.decode(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not keys:
+            return {}
+        rows = self.connection.execute(
+            f"SELECT key, value FROM cache WHERE key IN ({', '.join('?' * len(keys))}) "
+            "AND (expires IS NULL OR expires > ?)", (*keys, time())
+        )
+        return {keys[key]: self.decode(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, self.encode(value), self.get_backend_timeout(timeout)),
+        )
+        self._written()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [(self.make_and_validate_key(key, version=version), self.encode(value), expires)
+                for key, value in data.items()]
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)", rows)
+        self._written()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self.connection.execute(
+            "INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE "
+            "SET value = excluded.value, expires = excluded.expires WHERE cache.expires <= ?",
+            (key, self.encode(value), self.get_backend_timeout(timeout), time()),
+        )
+        self._written()
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        validated = self.make_and_validate_key(key, version=version)
+        # BEGIN IMMEDIATE holds the write lock until the value is read back, older SQLite has no RETURNING.
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            updated = self.connection.execute(
+                "UPDATE cache SET value = value + ? WHERE key = ? AND typeof(value) = 'integer' "
+                "AND (expires IS NULL OR expires > ?)", (delta, validated, time())
+            ).rowcount
+            if updated:
+                return self.connection.execute("SELECT value FROM cache WHERE key = ?", (validated,)).fetchone()[0]
+        # Not stored as an integer, fall back to get and set.
+        return super().incr(key, delta, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self.connection.execute(
+            "UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (self.get_backend_timeout(timeout), key, time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.connection.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            self.connection.execute(f"DELETE FROM cache WHERE key IN ({', '.join('?' * len(keys))})", keys)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.connection.execute(
+            "SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time())
+        ).fetchone() is not None
+
+    def clear(self):
+        self.connection.execute("DELETE FROM cache")
+
+    def close(self, **kwargs):
+        # The connection is kept for the next request, like the in-memory caches keep their data.
+        pass
+
+    def _written(self):
+        self._writes += 1
+        if self._writes % self.cull_every == 0:
+            self._cull()
+
+    def _cull(self):
+        connection = self.connection
+        if connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0] <= self._max_entries:
+            return
+        connection.execute("DELETE FROM cache WHERE expires <= ?", (time(),))
+        count = connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self._max_entries:
+            connection.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)",
+                (count // self._cull_frequency,),
+            )
+
+
+class LocalTier:
+    """
+    Bounded LRU of pickled values with a time to live, shared by the threads of a process.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.version = None
+        self.checked = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires = entry
+            if expires <= monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout: float):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._entries[key] = (value, monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_tiers = {}
+local_tiers_lock = Lock()
+
+
+class TwoTierCache(BaseCache):
+    """
+    A small in-process LRU (L1) in front of a shared cache alias, named by LOCATION.
+    Reads are served from L1 for at most LOCAL_TIMEOUT seconds, writes go through to the shared cache.
+    delete(), incr(), decr() and clear() bump a version key in the shared cache, and every process drops
+    its L1 once it sees a new version, checked at most every VERSION_CHECK_INTERVAL seconds. So a value
+    changed by another worker is stale for at most that long, and set() over an existing key for at most
+    LOCAL_TIMEOUT. Suited to entries whose keys carry their own version, such as the response cache.
+    """
+
+    version_key = "l1-version"
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._alias = location
+        self._local_timeout = options.get("LOCAL_TIMEOUT", 30)
+        self._check_interval = options.get("VERSION_CHECK_INTERVAL", 1)
+        with local_tiers_lock:
+            self._local = local_tiers.setdefault(location, LocalTier(self._max_entries))
+
+    @property
+    def shared(self) -> BaseCache:
+        return caches[self._alias]
+
+    def local_key(self, key, version=None) -> str:
+        return self.shared.make_and_validate_key(key, version=version)
+
+    def local_timeout(self, timeout) -> float:
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self._local_timeout
+        return min(timeout, self._local_timeout)
+
+    def sync(self):
+        """
+        Drops L1 if another process bumped the version since the last check.
+        """
+        now = monotonic()
+        if now - self._local.checked < self._check_interval:
+            return
+        self._local.checked = now
+        version = self.shared.get(self.version_key)
+        if version != self._local.version:
+            self._local.clear()
+            self._local.version = version
+
+    def broadcast(self):
+        try:
+            version = self.shared.incr(self.version_key)
+        except ValueError:
+            self.shared.add(self.version_key, 1, None)
+            version = self.shared.get(self.version_key)
+        if self._local.version is None or version != self._local.version + 1:
+            # Another process bumped it too, its changes may be in L1.
+            self._local.clear()
+        self._local.version = version
+
+    def get(self, key, default=None, version=None):
+        self.sync()
+        local_key = self.local_key(key, version)
+        value = self._local.get(local_key)
+        if value is not MISSING:
+            return value
+        value = self.shared.get(key, MISSING, version)
+        if value is MISSING:
+            return default
+        self._local.set(local_key, value, self._local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        self.sync()
+        values, missing = {}, []
+        for key in keys:
+            value = self._local.get(self.local_key(key, version))
+            if value is MISSING:
+                missing.append(key)
+            else:
+                values[key] = value
+        if missing:
+            fetched = self.shared.get_many(missing, version)
+            for key, value in fetched.items():
+                self._local.set(self.local_key(key, version), value, self._local_timeout)
+            values.update(fetched)
+        return values
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None and timeout <= 0:
+            self._local.delete(self.local_key(key, version))
+        else:
+            self._local.set(self.local_key(key, version), value, self.local_timeout(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self._local.set(self.local_key(key, version), value, self.local_timeout(timeout))
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version)
+        self.broadcast()
+        self._local.set(self.local_key(key, version), value, self._local_timeout)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        deleted = self.shared.delete(key, version)
+        self._local.delete(self.local_key(key, version))
+        self.broadcast()
+        return deleted
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def clear(self):
+        self.shared.clear()
+        self._local.clear()
+        self.broadcast()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
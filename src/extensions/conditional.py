@@ -0,0 +1,77 @@
+from hashlib import md5
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+
+def make_etag(*parts) -> str:
+    """
+    Returns a strong ETag built from the given parts.
+    """
+    return f'"{md5(":".join(map(str, parts)).encode()).hexdigest()}"'
+
+
+def get_conditional_response_from_headers(request, headers: dict):
+    """
+    Evaluates the preconditions of the request against the ETag and Last-Modified headers of a stored response.
+    """
+    last_modified = headers.get("Last-Modified")
+    return get_conditional_response(
+        request._request, etag=headers.get("ETag"),
+        last_modified=parse_http_date_safe(last_modified) if last_modified else None
+    )
+
+
+class ConditionalGetMixin:
+    """
+    Answers If-None-Match / If-Modified-Since with 304 and If-Match / If-Unmodified-Since with 412,
+    using validators from get_validators, which must be computed without serializing the response.
+    """
+
+    def get_validators(self):
+        """
+        Returns (etag, last_modified datetime), or None if the resource does not exist.
+        """
+        raise NotImplementedError
+
+    def evaluate_preconditions(self, request):
+        """
+        Returns a 304/412 response if a precondition of the request decides it, else None.
+        """
+        self.validators = self.get_validators()
+        if self.validators is None:
+            return None
+        etag, last_modified = self.validators
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+        response = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+        if response is not None and response.status_code == 304:
+            self.set_validators(response)
+        return response
+
+    def set_validators(self, response):
+        if self.validators is None:
+            return response
+        etag, last_modified = self.validators
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+        return response
+
+    def get(self, request, *args, **kwargs):
+        response = self.evaluate_preconditions(request)
+        if response is not None:
+            return response
+        return self.set_validators(super().get(request, *args, **kwargs))
+
+    def update(self, request, *args, **kwargs):
+        response = self.evaluate_preconditions(request)
+        if response is not None:
+            return response
+        response = super().update(request, *args, **kwargs)
+        self.validators = self.get_validators()
+        return self.set_validators(response)
+
+    def destroy(self, request, *args, **kwargs):
+        response = self.evaluate_preconditions(request)
+        if response is not None:
+            return response
+        return super().destroy(request, *args, **kwargs)
@@ -0,0 +1,19 @@
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+from extensions.db.pool import PoolTimeout
+
+
+class PoolTimeoutMiddleware(MiddlewareMixin):
+    """
+    Answers 503 with Retry-After when no pooled database connection came free in time, so clients back off
+    rather than the request queueing behind the others.
+    """
+
+    retry_after = 1
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, PoolTimeout):
+            response = JsonResponse({"detail": "The service is busy, try again shortly."}, status=503)
+            response.headers["Retry-After"] = str(self.retry_after)
+            return response
+        return None
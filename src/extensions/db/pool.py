@@ -0,0 +1,336 @@
+import logging
+import os
+from collections import Counter, deque
+from contextlib import closing
+from functools import partial
+from threading import Condition, Lock
+from time import monotonic
+from django.core.cache import caches
+from django.db.utils import OperationalError
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(OperationalError):
+    """
+    No connection came free within the timeout of the pool.
+    """
+
+
+class ConnectionPool:
+    """
+    Database connections of one process, opened up to max_size and handed out to one thread at a time.
+    A checkout takes the connection returned last, health checked with SELECT 1 if it was idle for
+    health_check_after seconds or more, and waits at most timeout seconds for one to be returned once
+    max_size are out, then raises PoolTimeout. Connections older than max_lifetime are closed instead
+    of handed out or taken back, idle ones past min_size after max_idle seconds.
+    Connections inherited through a fork belong to the parent, the child drops them without closing them.
+    """
+
+    counters = ("opened", "closed", "recycled", "health_check_failures", "checkouts", "returns", "waits",
+                "wait_microseconds", "timeouts")
+    metrics_prefix = "db-pool"
+    # Seconds between flushes of the counters to the default cache.
+    metrics_interval = 1
+
+    def __init__(self, name: str, min_size: int = 0, max_size: int = 10, max_lifetime: float = 30 * 60,
+                 max_idle: float = 10 * 60, timeout: float = 2, health_check_after: float = 1):
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._condition = Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        # (connection, opened, returned), the most recently returned last.
+        self._idle = deque()
+        self._opened = {}
+        self._size = 0
+        self._stats = Counter()
+        self._flushed = Counter()
+        self._flushed_at = monotonic()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def acquire(self, connect):
+        """
+        Returns a connection from the pool, or one opened by connect() if none is idle and the pool is not full.
+        """
+        start = monotonic()
+        while True:
+            entry = self._take(start + self.timeout)
+            if entry is None:
+                try:
+                    connection = connect()
+                except BaseException:
+                    self._discard(None)
+                    raise
+                with self._condition:
+                    self._opened[id(connection)] = monotonic()
+                    self._stats["opened"] += 1
+                break
+            connection, opened, returned = entry
+            now = monotonic()
+            if now - opened > self.max_lifetime:
+                self._discard(connection, "recycled")
+            elif now - returned >= self.health_check_after and not self.check(connection):
+                self._discard(connection, "health_check_failures")
+            else:
+                break
+        waited = monotonic() - start
+        with self._condition:
+            self._stats["checkouts"] += 1
+            self._stats["wait_microseconds"] += int(waited * 1_000_000)
+        return connection
+
+    def _take(self, deadline: float):
+        """
+        Returns an idle entry, or None with a slot reserved for a new connection.
+        """
+        waited, expired = False, []
+        try:
+            with self._condition:
+                self._check_fork()
+                while True:
+                    expired += self._trim()
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None
+                    if not waited:
+                        waited = True
+                        self._stats["waits"] += 1
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"No connection of the {self.name} pool came free within {self.timeout} seconds, "
+                            f"all {self.max_size} are in use."
+                        )
+                    self._condition.wait(remaining)
+        finally:
+            for connection in expired:
+                self._close(connection)
+
+    def _trim(self) -> list:
+        """
+        Takes out the idle connections past min_size idle for max_idle seconds, the lock must be held.
+        """
+        expired, now = [], monotonic()
+        while self._idle and self._size - len(expired) > self.min_size and now - self._idle[0][2] > self.max_idle:
+            connection, _, _ = self._idle.popleft()
+            expired.append(connection)
+        if expired:
+            self._size -= len(expired)
+            self._stats["closed"] += len(expired)
+            for connection in expired:
+                self._opened.pop(id(connection), None)
+            self._condition.notify(len(expired))
+        return expired
+
+    def release(self, connection, discard: bool = False):
+        """
+        Takes back a connection, rolling back anything left open on it, or closes it if discard is set,
+        the rollback fails or it outlived max_lifetime.
+        """
+        if not discard:
+            try:
+                connection.rollback()
+            except Exception:
+                discard = True
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+            opened = self._opened.get(id(connection))
+            if opened is None:
+                # Not opened by this pool.
+                discard, recycled, flush = True, False, False
+            else:
+                recycled = monotonic() - opened > self.max_lifetime
+                flush = monotonic() - self._flushed_at >= self.metrics_interval
+            if not discard and not recycled:
+                self._idle.append((connection, opened, monotonic()))
+                self._stats["returns"] += 1
+                self._condition.notify()
+        if opened is None:
+            self._close(connection)
+        elif discard or recycled:
+            self._discard(connection, "recycled" if recycled else None, returned=True)
+        if flush:
+            self.flush_metrics()
+
+    def _discard(self, connection, reason: str = None, returned: bool = False):
+        """
+        Frees the slot of a connection, or of one that failed to open, and closes it.
+        """
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+            self._size -= 1
+            if reason:
+                self._stats[reason] += 1
+            if returned:
+                self._stats["returns"] += 1
+            if connection is not None:
+                self._opened.pop(id(connection), None)
+                self._stats["closed"] += 1
+            self._condition.notify()
+        if connection is not None:
+            self._close(connection)
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            logger.debug("Closing a pooled connection failed.", exc_info=True)
+
+    @staticmethod
+    def check(connection) -> bool:
+        try:
+            with closing(connection.cursor()) as cursor:
+                cursor.execute("SELECT 1")
+            # Ends the transaction the query opened outside autocommit.
+            connection.rollback()
+        except Exception:
+            return False
+        return True
+
+    def fill(self, connect):
+        """
+        Opens connections until the pool holds min_size, for workers to connect before their first request.
+        """
+        with self._condition:
+            self._check_fork()
+            missing = max(0, self.min_size - self._size)
+            self._size += missing
+        opened = []
+        try:
+            for _ in range(missing):
+                opened.append(connect())
+        finally:
+            with self._condition:
+                now = monotonic()
+                self._size -= missing - len(opened)
+                for connection in opened:
+                    self._opened[id(connection)] = now
+                    self._idle.appendleft((connection, now, now))
+                self._stats["opened"] += len(opened)
+                self._condition.notify(missing)
+
+    def close_all(self):
+        with self._condition:
+            idle = [connection for connection, _, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._stats["closed"] += len(idle)
+            for connection in idle:
+                self._opened.pop(id(connection), None)
+        for connection in idle:
+            self._close(connection)
+
+    def get_stats(self) -> dict:
+        """
+        Returns the gauges and counters of this process.
+        """
+        with self._condition:
+            self._check_fork()
+            stats = {name: self._stats[name] for name in self.counters}
+            stats.update(size=self._size, idle=len(self._idle), in_use=self._size - len(self._idle),
+                         min_size=self.min_size, max_size=self.max_size)
+        return stats
+
+    def flush_metrics(self):
+        """
+        Adds the counters since the last flush to the totals of every worker in the default cache.
+        """
+        with self._condition:
+            delta = self._stats - self._flushed
+            self._flushed = self._stats.copy()
+            self._flushed_at = monotonic()
+        cache = caches["default"]
+        try:
+            for name, value in delta.items():
+                key = f"{self.metrics_prefix}:{self.name}:{name}"
+                cache.add(key, 0, None)
+                cache.incr(key, value)
+        except Exception:
+            logger.warning("Could not record the metrics of the %s connection pool.", self.name, exc_info=True)
+
+    @classmethod
+    def get_metrics(cls, name: str) -> dict:
+        """
+        Returns the counters flushed by every worker to the pool of the database alias, with the
+        connections open and checked out across them derived from those.
+        """
+        keys = {f"{cls.metrics_prefix}:{name}:{counter}": counter for counter in cls.counters}
+        values = caches["default"].get_many(keys)
+        metrics = {counter: values.get(key, 0) for key, counter in keys.items()}
+        metrics["open"] = metrics["opened"] - metrics["closed"]
+        metrics["in_use"] = metrics["checkouts"] - metrics["returns"]
+        return metrics
+
+
+pools = {}
+pools_lock = Lock()
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Takes the connections of a DatabaseWrapper from a ConnectionPool of the process and gives them back
+    on close(), configured by the POOL dict of the database settings:
+    MIN_SIZE, MAX_SIZE, MAX_LIFETIME, MAX_IDLE, TIMEOUT and HEALTH_CHECK_AFTER, see ConnectionPool.
+    Without POOL every connection is opened and closed as usual. Keep CONN_MAX_AGE at 0, so Django
+    closes, and so returns, the connection of a thread at the end of each request.
+    """
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get("POOL")
+        if not options:
+            return None
+        key = (self.alias, str(self.settings_dict["NAME"]), self.settings_dict.get("HOST"),
+               self.settings_dict.get("PORT"))
+        pool = pools.get(key)
+        if pool is None:
+            with pools_lock:
+                pool = pools.setdefault(key, ConnectionPool(
+                    self.alias,
+                    min_size=options.get("MIN_SIZE", 0),
+                    max_size=options.get("MAX_SIZE", 10),
+                    max_lifetime=options.get("MAX_LIFETIME", 30 * 60),
+                    max_idle=options.get("MAX_IDLE", 10 * 60),
+                    timeout=options.get("TIMEOUT", 2),
+                    health_check_after=options.get("HEALTH_CHECK_AFTER", 1),
+                ))
+        return pool
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        return pool.acquire(partial(super().get_new_connection, conn_params))
+
+    def fill_pool(self):
+        pool = self.pool
+        if pool is not None:
+            pool.fill(partial(super().get_new_connection, self.get_connection_params()))
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Closed inside atomic(), the wrapper keeps the connection until the rollback, it must not be handed out.
+        pool.release(self.connection, discard=self.in_atomic_block)
@@ -0,0 +1,9 @@
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from extensions.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, SQLiteDatabaseWrapper):
+    @property
+    def pool(self):
+        # An in-memory database lives as long as its connections, Django never closes them.
+        return None if self.is_in_memory_db() else super().pool
@@ -0,0 +1,130 @@
+from json import dumps
+from zlib import compressobj
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.views import APIView
+from extensions.permissions import IsSuperUser
+
+
+class Exporter:
+    """
+    Yields the rows of a model as dicts, reading the table in chunks of chunk_size rows so memory
+    stays flat whatever its size. On PostgreSQL the chunks come from a server-side cursor.
+    """
+
+    chunk_size = 2000
+    updated_field = "updated"
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def to_dict(self, obj) -> dict:
+        """
+        Turns an object of the queryset into a row. Querysets of values() rows are exported as they are.
+        """
+        return obj
+
+    def rows(self, updated_since=None):
+        queryset = self.get_queryset().order_by("pk")
+        if updated_since is not None:
+            queryset = queryset.filter(**{f"{self.updated_field}__gte": updated_since})
+        for obj in queryset.iterator(chunk_size=self.chunk_size):
+            yield self.to_dict(obj)
+
+
+def get_exporter(name: str) -> Exporter:
+    exporters = getattr(settings, "DATA_EXPORTERS", {})
+    if name not in exporters:
+        raise KeyError(name)
+    return import_string(exporters[name])()
+
+
+def parse_updated_since(value: str):
+    """
+    Parses an ISO 8601 date and time, in the current time zone if it has none.
+    """
+    try:
+        updated_since = parse_datetime(value)
+    except ValueError:
+        updated_since = None
+    if updated_since is None:
+        raise ValueError("Enter a valid ISO 8601 date and time.")
+    if timezone.is_naive(updated_since):
+        updated_since = timezone.make_aware(updated_since)
+    return updated_since
+
+
+def stream_ndjson(rows, compress: bool = False, block_size: int = 64 * 1024):
+    """
+    Encodes rows as NDJSON, optionally gzip compressed, and yields it in blocks of about block_size bytes.
+    """
+    compressor = compressobj(wbits=31) if compress else None
+    block, size = [], 0
+    for row in rows:
+        line = dumps(row, cls=DjangoJSONEncoder, separators=(",", ":"), ensure_ascii=False).encode() + b"\n"
+        block.append(line)
+        size += len(line)
+        if size >= block_size:
+            data = b"".join(block)
+            block, size = [], 0
+            data = compressor.compress(data) if compressor else data
+            if data:
+                yield data
+    data = b"".join(block)
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+async def iterate_in_thread(blocks):
+    """
+    Yields the blocks of a sync iterator from an async generator, pulling each one in the thread the sync
+    code of the request runs in. Under ASGI Django reads a sync iterator of a streaming response into
+    memory before sending it, an async one is sent block by block.
+    """
+    next_block = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (block := await next_block(blocks, None)) is not None:
+            yield block
+    finally:
+        await sync_to_async(blocks.close, thread_sensitive=True)()
+
+
+class ExportView(APIView):
+    """
+    get: Streams every row of a model as NDJSON. parameters: [updated_since (ISO 8601), gzip (true/false)]
+    """
+
+    permission_classes = [IsSuperUser]
+    exporter_name = None
+
+    def get(self, request, *args, **kwargs):
+        try:
+            exporter = get_exporter(self.exporter_name)
+        except KeyError:
+            raise NotFound(f"No exporter named {self.exporter_name}.")
+        updated_since = request.query_params.get("updated_since")
+        if updated_since is not None:
+            try:
+                updated_since = parse_updated_since(updated_since)
+            except ValueError as error:
+                raise ValidationError({"updated_since": [str(error)]})
+        compress = request.query_params.get("gzip", "").lower() in ("1", "true")
+        blocks = stream_ndjson(exporter.rows(updated_since), compress)
+        if isinstance(request._request, ASGIRequest):
+            blocks = iterate_in_thread(blocks)
+        response = StreamingHttpResponse(
+            blocks,
+            content_type="application/gzip" if compress else "application/x-ndjson"
+        )
+        filename = f"{self.exporter_name}.ndjson{'.gz' if compress else ''}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from extensions.db.pool import ConnectionPool
+
+
+class Command(BaseCommand):
+    help = ("Shows the connections opened, recycled and checked out by the database connection pools of every "
+            "worker, as flushed to the default cache.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("aliases", nargs="*", help="Database aliases, all of those with a POOL by default.")
+
+    def handle(self, *args, **options):
+        aliases = options["aliases"] or [alias for alias, database in settings.DATABASES.items() if database.get("POOL")]
+        for alias in aliases:
+            metrics = ConnectionPool.get_metrics(alias)
+            checkouts = metrics["checkouts"]
+            mean_wait = metrics["wait_microseconds"] / checkouts / 1000 if checkouts else 0
+            self.stdout.write(f"{alias}:")
+            for name, value in metrics.items():
+                self.stdout.write(f"  {name}: {value}")
+            self.stdout.write(f"  mean_wait_ms: {mean_wait:.3f}")
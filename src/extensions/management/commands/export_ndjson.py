@@ -0,0 +1,27 @@
+import sys
+from contextlib import nullcontext
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from extensions.export import get_exporter, parse_updated_since, stream_ndjson
+
+
+class Command(BaseCommand):
+    help = "Streams every row of a model as NDJSON to a file or to stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(getattr(settings, "DATA_EXPORTERS", {})))
+        parser.add_argument("--updated-since", help="Only rows updated at or after this ISO 8601 date and time.")
+        parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip.")
+        parser.add_argument("--output", "-o", help="File to write to, stdout by default.")
+
+    def handle(self, *args, **options):
+        updated_since = None
+        if options["updated_since"]:
+            try:
+                updated_since = parse_updated_since(options["updated_since"])
+            except ValueError as error:
+                raise CommandError(error)
+        blocks = stream_ndjson(get_exporter(options["name"]).rows(updated_since), options["gzip"])
+        with open(options["output"], "wb") if options["output"] else nullcontext(sys.stdout.buffer) as output:
+            for block in blocks:
+                output.write(block)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from extensions.response_cache import get_cache_stats
+
+VIEWS = ["BlogsList", "CategoryBlog", "CategoryList", "BlogDetailUpdateDelete"]
+
+
+class Command(BaseCommand):
+    help = ("Shows the hit and miss counts of the response cache, as flushed by every worker within "
+            "RESPONSE_CACHE_STATS_FLUSH_INTERVAL seconds.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("views", nargs="*", default=VIEWS, help="View class names to report.")
+
+    def handle(self, *args, **options):
+        for name, stats in get_cache_stats(options["views"]).items():
+            total = stats["hits"] + stats["misses"]
+            ratio = stats["hits"] / total * 100 if total else 0
+            self.stdout.write(f"{name:>24}: {stats['hits']:>8} hits {stats['misses']:>8} misses {ratio:6.1f}%")
@@ -0,0 +1,224 @@
+from asyncio import iscoroutinefunction
+from math import ceil
+from time import time
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+def parse_rate(rate: str):
+    """
+    Parses a DRF style rate such as "5/min" into (capacity, seconds per token).
+    """
+    count, period = rate.split("/")
+    return int(count), PERIODS[period[0]] / int(count)
+
+
+class Result:
+    def __init__(self, allowed: bool, limit: int, remaining: int, reset: float):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+
+    @property
+    def headers(self) -> dict:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(ceil(self.reset)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(ceil(self.reset))
+        return headers
+
+
+class TokenBucket:
+    """
+    Token buckets in the shared "ratelimit" cache, so a limit holds across every worker process.
+    A bucket is kept as its theoretical arrival time in milliseconds, the time it will be full again
+    plus one token (GCRA), and changes only through add() and incr(), which are atomic on memcached,
+    redis and the database cache. Taking a token moves it one interval ahead, a request is allowed
+    while it stays within capacity intervals of now. Rejected requests put their token back. An idle
+    bucket expires from the cache, which is the same as a full one.
+    """
+
+    prefix = "ratelimit"
+    cache_alias = "ratelimit"
+
+    def __init__(self, rate: str):
+        self.capacity, interval = parse_rate(rate)
+        self.interval = max(1, round(interval * 1000))
+        self.burst = self.capacity * self.interval
+        self.timeout = ceil(self.burst / 1000) + 1
+
+    def key(self, *parts) -> str:
+        return ":".join((self.prefix, *map(str, parts)))
+
+    def consume(self, *parts) -> Result:
+        cache = caches[self.cache_alias]
+        key = self.key(*parts)
+        now = int(time() * 1000)
+        if cache.add(key, now + self.interval, self.timeout):
+            arrival = now + self.interval
+        else:
+            try:
+                arrival = cache.incr(key, self.interval)
+            except ValueError:
+                # Expired between add and incr.
+                cache.add(key, now + self.interval, self.timeout)
+                arrival = now + self.interval
+            if arrival - self.interval < now:
+                # The bucket filled up while idle, one request moves it to now. The others already
+                # count from now below, so a lost race only costs the caught up difference once.
+                if cache.add(f"{key}:sync", 1, 1):
+                    cache.incr(key, now - (arrival - self.interval))
+                arrival = now + self.interval
+        allowed = arrival - now <= self.burst
+        if allowed:
+            cache.touch(key, self.timeout)
+        else:
+            try:
+                cache.decr(key, self.interval)
+            except ValueError:
+                pass
+            arrival -= self.interval
+        remaining = max(0, (self.burst - (arrival - now)) // self.interval)
+        reset = (arrival - self.burst + self.interval - now) / 1000 if not allowed else (arrival - now) / 1000
+        return Result(allowed, self.capacity, remaining, max(reset, 0))
+
+
+def record(request, result: Result):
+    """
+    Keeps the most restrictive result of the request for RateLimitMiddleware to send as headers.
+    """
+    request = getattr(request, "_request", request)
+    current = getattr(request, "ratelimit", None)
+    if current is None or not result.allowed or current.allowed and result.remaining < current.remaining:
+        request.ratelimit = result
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttles a view with a token bucket per route and ident. The rate is looked up by the throttle_scope
+    of the view in DEFAULT_THROTTLE_RATES. Views without a scope or rate are not throttled.
+    """
+
+    name = None
+
+    def __init__(self):
+        self.result = None
+
+    def get_ident_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f"{scope}-{self.name}") if scope else None
+        if rate is None or not getattr(settings, "RATELIMIT_ENABLED", True):
+            return True
+        ident = self.get_ident_key(request, view)
+        if ident is None:
+            return True
+        self.result = TokenBucket(rate).consume(scope, self.name, ident)
+        record(request, self.result)
+        return self.result.allowed
+
+    def wait(self):
+        return self.result.reset if self.result is not None else None
+
+
+class IpTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Rate "<scope>-ip", keyed by the client address, NUM_PROXIES is honoured.
+    """
+
+    name = "ip"
+
+    def get_ident_key(self, request, view):
+        return self.get_ident(request)
+
+
+class PhoneTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Rate "<scope>-phone", keyed by the phone, or the OTP challenge, in the request body.
+    Requests without either are left to the other throttles.
+    """
+
+    name = "phone"
+    fields = ("phone", "challenge")
+
+    def get_ident_key(self, request, view):
+        for field in self.fields:
+            value = request.data.get(field)
+            if value:
+                return f"{field}:{str(value)[:64]}"
+        return None
+
+
+class RateLimitMiddleware:
+    """
+    Limits the routes named in RATELIMIT_ROUTES per client address before the request reaches any other
+    middleware or view, so rejected requests never touch the session or the database, and adds the
+    X-RateLimit headers of the most restrictive bucket, here or in the DRF throttles, to the response.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.limit(request)
+        if response is None:
+            response = self.get_response(request)
+        return self.add_headers(request, response)
+
+    async def __acall__(self, request):
+        response = await sync_to_async(self.limit)(request)
+        if response is None:
+            response = await self.get_response(request)
+        return self.add_headers(request, response)
+
+    def limit(self, request):
+        """
+        Returns the 429 response of a rejected request, or None.
+        """
+        name, rate = self.get_rate(request) if getattr(settings, "RATELIMIT_ENABLED", True) else (None, None)
+        if rate is None:
+            return None
+        result = TokenBucket(rate).consume("route", name, BaseThrottle().get_ident(request))
+        record(request, result)
+        if not result.allowed:
+            return JsonResponse({"detail": "Request was throttled."}, status=429)
+        return None
+
+    @staticmethod
+    def get_rate(request):
+        routes = getattr(settings, "RATELIMIT_ROUTES", {})
+        if not routes:
+            return None, None
+        try:
+            name = resolve(request.path_info).view_name
+        except Resolver404:
+            return None, None
+        return name, routes.get(name)
+
+    @staticmethod
+    def add_headers(request, response):
+        result = getattr(request, "ratelimit", None)
+        if result is not None:
+            for header, value in result.headers.items():
+                response.headers.setdefault(header, value)
+        return response
@@ -0,0 +1,171 @@
+from collections import Counter
+from hashlib import md5
+from time import time_ns
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils.http import urlencode
+from rest_framework.response import Response
+from extensions.conditional import get_conditional_response_from_headers
+from extensions.writebehind import WriteBehind
+
+
+def get_permission_tier(user) -> str:
+    if not user.is_authenticated:
+        return "anon"
+    if user.is_superuser:
+        return "superuser"
+    if user.author:
+        return "author"
+    return "user"
+
+
+class Generations:
+    """
+    Generation counters that versioned cache keys are built from. Bumping a generation makes every
+    entry built from its old value unreachable, so a write drops only the entries depending on it.
+    Counters start from the clock, so a counter that was evicted never comes back to an old value.
+    The cache alias must be shared by every worker, as the "response" one is, or a bump in one
+    worker never reaches the entries the others serve.
+    """
+
+    prefix = "generation"
+    cache_alias = "response"
+
+    def __init__(self, cache_alias: str = None, timeout: int = None):
+        self.cache_alias = cache_alias or self.cache_alias
+        # Seconds a counter lives, None for ever. Expiring only makes it start over from the clock.
+        self.timeout = timeout
+
+    def key(self, name: str) -> str:
+        return f"{self.prefix}:{name}"
+
+    def get_many(self, names) -> list:
+        cache = caches[self.cache_alias]
+        keys = [self.key(name) for name in names]
+        values = cache.get_many(keys)
+        for key in keys:
+            if key not in values:
+                cache.add(key, time_ns(), self.timeout)
+                values[key] = cache.get(key)
+        return [values[key] for key in keys]
+
+    def bump(self, *names):
+        cache = caches[self.cache_alias]
+        for name in names:
+            try:
+                cache.incr(self.key(name))
+            except ValueError:
+                cache.add(self.key(name), time_ns(), self.timeout)
+
+
+generations = Generations()
+
+
+class ResponseCacheMixin:
+    """
+    Caches successful GET responses keyed on the path, the query params, the permission tier of the
+    user and the generations returned by get_cache_generations.
+    Sets an X-Cache header and counts hits and misses per view, see CacheStats.
+    The validator headers are stored with the data, so conditional requests on a hit need no query.
+    Responses go to the "response" cache, the hit and miss counts to the default one.
+    """
+
+    cache_alias = "response"
+    cache_tiers = None
+    cache_timeout = None
+    cache_headers = ("ETag", "Last-Modified")
+
+    def get_cache_generations(self) -> list:
+        raise NotImplementedError
+
+    def get_cache_key(self, request, tier: str) -> str:
+        names = self.get_cache_generations()
+        versions = ".".join(str(version) for version in generations.get_many(names))
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        digest = md5(f"{request.path}?{query}".encode()).hexdigest()
+        return f"response:{type(self).__name__}:{tier}:{versions}:{digest}"
+
+    def cache_hit(self, data):
+        """
+        Runs for every response served from the cache.
+        """
+
+    def get(self, request, *args, **kwargs):
+        tier = get_permission_tier(request.user)
+        if self.cache_tiers is not None and tier not in self.cache_tiers:
+            return super().get(request, *args, **kwargs)
+        key = self.get_cache_key(request, tier)
+        cached = caches[self.cache_alias].get(key)
+        if cached is not None:
+            data, headers = cached
+            record_cache_access(type(self).__name__, hit=True)
+            self.cache_hit(data)
+            response = get_conditional_response_from_headers(request, headers)
+            if response is not None:
+                for header, value in headers.items():
+                    response[header] = value
+                return response
+            return Response(data, headers={**headers, "X-Cache": "HIT"})
+        record_cache_access(type(self).__name__, hit=False)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            timeout = self.cache_timeout or getattr(settings, "RESPONSE_CACHE_TIMEOUT", 300)
+            headers = {header: response[header] for header in self.cache_headers if header in response}
+            caches[self.cache_alias].set(key, (response.data, headers), timeout)
+        response["X-Cache"] = "MISS"
+        return response
+
+
+class CacheStats(WriteBehind):
+    """
+    Hit and miss counts per view, kept in process memory and added to the totals in the default cache
+    every RESPONSE_CACHE_STATS_FLUSH_INTERVAL seconds and on exit, rather than with a cache write per request.
+    """
+
+    name = "response-stats-flush"
+    description = "response cache stats"
+    interval_setting = "RESPONSE_CACHE_STATS_FLUSH_INTERVAL"
+
+    def __init__(self):
+        super().__init__()
+        self._pending = Counter()
+
+    def record(self, view_name: str, hit: bool):
+        with self._lock:
+            self._pending[f"response-stats:{view_name}:{'hits' if hit else 'misses'}"] += 1
+        self.start()
+
+    def flush(self) -> int:
+        """
+        Adds the counts recorded since the last flush to the shared totals. Returns the number of counters written.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        try:
+            for key, count in pending.items():
+                cache.add(key, 0, None)
+                cache.incr(key, count)
+        except Exception:
+            with self._lock:
+                self._pending.update(pending)
+            raise
+        return len(pending)
+
+
+cache_stats = CacheStats()
+
+
+def record_cache_access(view_name: str, hit: bool):
+    cache_stats.record(view_name, hit)
+
+
+def get_cache_stats(view_names) -> dict:
+    """
+    Returns {view name: {"hits": n, "misses": n}} for the given views, as flushed by every worker.
+    """
+    keys = {f"response-stats:{name}:{kind}": (name, kind) for name in view_names for kind in ("hits", "misses")}
+    values = cache.get_many(keys)
+    stats = {name: {"hits": 0, "misses": 0} for name in view_names}
+    for key, (name, kind) in keys.items():
+        stats[name][kind] = values.get(key, 0)
+    return stats
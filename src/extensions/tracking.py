@@ -0,0 +1,41 @@
+from django.db.models.signals import post_init, post_save, pre_save
+
+tracked_fields = {}
+
+
+def track_changes(model, *fields):
+    """
+    Keeps the loaded values of fields on each instance of model, so post_save receivers can tell with
+    changed() whether a save wrote new values, without a query.
+    """
+    if model not in tracked_fields:
+        tracked_fields[model] = set()
+        post_init.connect(remember_values, sender=model, dispatch_uid=f"track_changes_init_{model._meta.label}")
+        pre_save.connect(find_changes, sender=model, dispatch_uid=f"track_changes_pre_{model._meta.label}")
+        post_save.connect(remember_values, sender=model, dispatch_uid=f"track_changes_post_{model._meta.label}")
+    tracked_fields[model].update(fields)
+
+
+def remember_values(sender, instance, *args, **kwargs):
+    # Deferred fields are missing from __dict__ and stay unknown, reading them here would query.
+    instance._tracked_values = {
+        field: instance.__dict__[field] for field in tracked_fields[sender] if field in instance.__dict__
+    }
+
+
+def find_changes(sender, instance, update_fields=None, *args, **kwargs):
+    values = getattr(instance, "_tracked_values", {})
+    fields = tracked_fields[sender] if update_fields is None else tracked_fields[sender] & set(update_fields)
+    instance._changed_fields = {
+        field for field in fields
+        if field in instance.__dict__ and (field not in values or values[field] != instance.__dict__[field])
+    }
+
+
+def changed(instance, *fields) -> bool:
+    """
+    True if the save in progress, or the last one, wrote a new value to any of the tracked fields.
+    Instances saved without passing pre_save count as changed.
+    """
+    changed_fields = getattr(instance, "_changed_fields", None)
+    return changed_fields is None or bool(changed_fields & set(fields))
@@ -0,0 +1,71 @@
+import atexit
+import logging
+from threading import Event, Lock, Thread
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    """
+    Work done behind the requests by a daemon thread of the process: flush() runs every interval seconds,
+    read from the interval_setting, and right away when wake() is called. The thread starts on the first
+    start() and is stopped on interpreter exit, flushing once more if flush_on_exit is set.
+    With an interval of 0 no thread is started, flush() only runs on exit or when called.
+    Subclasses implement flush(), failures are logged and left for the next interval.
+    """
+
+    name = None
+    description = None
+    interval_setting = None
+    default_interval = 10
+    flush_on_exit = True
+
+    def __init__(self):
+        self._lock = Lock()
+        self._wake = Event()
+        self._stopped = Event()
+        self._worker = None
+        self._worker_lock = Lock()
+
+    @property
+    def interval(self) -> float:
+        return getattr(settings, self.interval_setting, self.default_interval)
+
+    def flush(self):
+        raise NotImplementedError
+
+    def start(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is not None:
+                return
+            interval = self.interval
+            self._worker = Thread(target=self._run, args=(interval,), name=self.name, daemon=True)
+            atexit.register(self.stop)
+            if interval:
+                self._worker.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self.flush_on_exit:
+            self.flush()
+
+    def _run(self, interval):
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing %s failed, retrying on the next interval.", self.description)
+        close_old_connections()
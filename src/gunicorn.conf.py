@@ -0,0 +1,10 @@
+def post_worker_init(worker):
+    # Build the phone filter before the worker takes requests rather than on the first login.
+    from account.bloom import phone_filter
+    from django.db import connection
+
+    phone_filter.build()
+    # Give the connection of the build back and open the rest of the pool's MIN_SIZE.
+    connection.close()
+    if hasattr(connection, "fill_pool"):
+        connection.fill_pool()